@@ -23,40 +23,135 @@ static float color_distance(uint32_t c1, uint32_t c2) {
     return (float)(dr*dr*0.3 + dg*dg*0.59 + db*db*0.11);
 }
 
-std::vector<uint32_t> ColorQuantizer::kmeans(const std::vector<uint32_t>& colors, int k, int max_iter) {
-    if ((int)colors.size() <= k) return colors;
+// 感知加权距离中各通道的权重（与 color_distance 相同）
+static const double CHANNEL_WEIGHTS[3] = { 0.3, 0.59, 0.11 };
 
+static inline int color_channel(uint32_t color, int axis) {
+    return (color >> (16 - axis * 8)) & 0xFF;
+}
+
+CenterKdTree::CenterKdTree(const std::vector<uint32_t>& centers) : centers(centers), order(centers.size()) {
+    for (size_t i = 0; i < order.size(); ++i) order[i] = static_cast<int>(i);
+    nodes.reserve(order.size() / 2 + 1);
+    if (!order.empty()) build(0, static_cast<int>(order.size()));
+}
+
+int CenterKdTree::build(int begin, int end) {
+    const int LEAF_SIZE = 4;
+    int node_index = static_cast<int>(nodes.size());
+    nodes.push_back({ begin, end, 0, 0, -1, -1 });
+    if (end - begin <= LEAF_SIZE) return node_index;
+
+    // 按加权后跨度最大的通道切分
+    int axis = 0;
+    double max_spread = -1.0;
+    for (int a = 0; a < 3; ++a) {
+        int lo = 255, hi = 0;
+        for (int i = begin; i < end; ++i) {
+            int c = color_channel(centers[order[i]], a);
+            lo = std::min(lo, c); hi = std::max(hi, c);
+        }
+        double spread = double(hi - lo) * double(hi - lo) * CHANNEL_WEIGHTS[a];
+        if (spread > max_spread) { max_spread = spread; axis = a; }
+    }
+    int mid = (begin + end) / 2;
+    std::nth_element(order.begin() + begin, order.begin() + mid, order.begin() + end, [&](int a, int b) {
+        return color_channel(centers[a], axis) < color_channel(centers[b], axis);
+    });
+    int split = color_channel(centers[order[mid]], axis);
+    int left = build(begin, mid);
+    int right = build(mid, end);
+    nodes[node_index].axis = axis;
+    nodes[node_index].split = split;
+    nodes[node_index].left = left;
+    nodes[node_index].right = right;
+    return node_index;
+}
+
+void CenterKdTree::search(int node_index, const int channels[3], float& best_distance, int& best_index) const {
+    const Node& node = nodes[node_index];
+    if (node.left < 0) {
+        for (int i = node.begin; i < node.end; ++i) {
+            int center_index = order[i];
+            uint32_t center = centers[center_index];
+            long dr = channels[0] - color_channel(center, 0);
+            long dg = channels[1] - color_channel(center, 1);
+            long db = channels[2] - color_channel(center, 2);
+            float dist = (float)(dr*dr*0.3 + dg*dg*0.59 + db*db*0.11);
+            if (dist < best_distance || (dist == best_distance && center_index < best_index)) {
+                best_distance = dist;
+                best_index = center_index;
+            }
+        }
+        return;
+    }
+    long diff = channels[node.axis] - node.split;
+    int near_child = diff < 0 ? node.left : node.right;
+    int far_child = diff < 0 ? node.right : node.left;
+    search(near_child, channels, best_distance, best_index);
+    // 另一侧的距离下界；按 float 比较以保证不漏掉距离相同、序号更小的中心
+    float bound = (float)(diff * diff * CHANNEL_WEIGHTS[node.axis]);
+    if (bound <= best_distance) {
+        search(far_child, channels, best_distance, best_index);
+    }
+}
+
+int CenterKdTree::nearest(uint32_t color) const {
+    if (nodes.empty()) return 0;
+    int channels[3] = { color_channel(color, 0), color_channel(color, 1), color_channel(color, 2) };
+    float best_distance = FLT_MAX;
+    int best_index = 0;
+    search(0, channels, best_distance, best_index);
+    return best_index;
+}
+
+std::vector<ColorBin> ColorQuantizer::build_histogram(std::vector<uint32_t> colors) {
+    std::sort(colors.begin(), colors.end());
+    std::vector<ColorBin> histogram;
+    for (size_t i = 0; i < colors.size();) {
+        size_t j = i + 1;
+        while (j < colors.size() && colors[j] == colors[i]) ++j;
+        histogram.push_back({ colors[i], static_cast<uint32_t>(j - i) });
+        i = j;
+    }
+    return histogram;
+}
+
+std::vector<uint32_t> ColorQuantizer::kmeans(const std::vector<ColorBin>& histogram, int k, int max_iter) {
     std::vector<uint32_t> centers;
+    if ((int)histogram.size() <= k) {
+        for (const auto& bin : histogram) centers.push_back(bin.color);
+        return centers;
+    }
+
     for (int i = 0; i < k; i++) {
-        centers.push_back(colors[i * colors.size() / k]);
+        centers.push_back(histogram[i * histogram.size() / k].color);
     }
+    // 各簇的加权通道和与权重，每轮复用
+    std::vector<uint64_t> sum_r(k), sum_g(k), sum_b(k), weight(k);
     for (int iter = 0; iter < max_iter; iter++) {
-        std::vector<std::vector<uint32_t>> clusters(k);
-        for (uint32_t color : colors) {
-            float min_distance = FLT_MAX;
-            int closest_center = 0;
-            for (int j = 0; j < k; j++) {
-                float dist = color_distance(color, centers[j]);
-                if (dist < min_distance) {
-                    min_distance = dist;
-                    closest_center = j;
-                }
-            }
-            clusters[closest_center].push_back(color);
+        std::fill(sum_r.begin(), sum_r.end(), 0);
+        std::fill(sum_g.begin(), sum_g.end(), 0);
+        std::fill(sum_b.begin(), sum_b.end(), 0);
+        std::fill(weight.begin(), weight.end(), 0);
+
+        CenterKdTree tree(centers);
+        for (const auto& bin : histogram) {
+            int j = tree.nearest(bin.color);
+            unsigned char r, g, b;
+            unpack_color(bin.color, r, g, b);
+            sum_r[j] += uint64_t(r) * bin.count;
+            sum_g[j] += uint64_t(g) * bin.count;
+            sum_b[j] += uint64_t(b) * bin.count;
+            weight[j] += bin.count;
         }
         bool centers_changed = false;
         for (int j = 0; j < k; j++) {
-            if (clusters[j].empty()) continue;
-            uint64_t sum_r = 0, sum_g = 0, sum_b = 0;
-            for (uint32_t color : clusters[j]) {
-                unsigned char r, g, b;
-                unpack_color(color, r, g, b);
-                sum_r += r; sum_g += g; sum_b += b;
-            }
+            if (weight[j] == 0) continue;
             uint32_t new_center = pack_color(
-                (unsigned char)(sum_r / clusters[j].size()),
-                (unsigned char)(sum_g / clusters[j].size()),
-                (unsigned char)(sum_b / clusters[j].size())
+                (unsigned char)(sum_r[j] / weight[j]),
+                (unsigned char)(sum_g[j] / weight[j]),
+                (unsigned char)(sum_b[j] / weight[j])
             );
             if (new_center != centers[j]) {
                 centers_changed = true;
@@ -66,4 +161,13 @@ std::vector<uint32_t> ColorQuantizer::kmeans(const std::vector<uint32_t>& colors
         if (!centers_changed) break;
     }
     return centers;
-}
\ No newline at end of file
+}
+
+std::vector<int> ColorQuantizer::assign(const std::vector<ColorBin>& histogram, const std::vector<uint32_t>& centers) {
+    CenterKdTree tree(centers);
+    std::vector<int> nearest(histogram.size());
+    for (size_t i = 0; i < histogram.size(); ++i) {
+        nearest[i] = tree.nearest(histogram[i].color);
+    }
+    return nearest;
+}
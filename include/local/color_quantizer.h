@@ -8,11 +8,47 @@ static inline uint32_t pack_color(unsigned char r, unsigned char g, unsigned cha
 
 static float color_distance(uint32_t c1, uint32_t c2);
 
+// --- 新增：颜色直方图的一项（颜色及其采样次数） ---
+struct ColorBin {
+    uint32_t color;
+    uint32_t count;
+};
+
+// --- 新增：聚类中心的kd树，按感知加权距离查找最近的中心 ---
+class CenterKdTree {
+public:
+    explicit CenterKdTree(const std::vector<uint32_t>& centers);
+
+    // 返回最近中心的序号；距离相同时返回序号最小者（与逐个比较的结果一致）
+    int nearest(uint32_t color) const;
+
+private:
+    struct Node {
+        int begin, end;     // 叶子节点包含的中心：order[begin, end)
+        int axis;           // 0 = R, 1 = G, 2 = B
+        int split;          // 左子树该通道 <= split，右子树 >= split
+        int left, right;    // 子节点，叶子节点为 -1
+    };
+    int build(int begin, int end);
+    void search(int node, const int channels[3], float& best_distance, int& best_index) const;
+
+    std::vector<uint32_t> centers;
+    std::vector<int> order;
+    std::vector<Node> nodes;
+};
+
 // 支持多种量化算法，默认K-Means
 class ColorQuantizer {
 public:
-    // 输入原始颜色，输出聚类中心
-    static std::vector<uint32_t> kmeans(const std::vector<uint32_t>& colors, int k, int max_iter = 10);
+    // --- 修改：量化基于加权颜色直方图 ---
+    // 统计原始采样颜色，返回按颜色升序排列的直方图
+    static std::vector<ColorBin> build_histogram(std::vector<uint32_t> colors);
+
+    // 输入颜色直方图（升序），输出聚类中心；中心为所属颜色按采样次数加权的平均值
+    static std::vector<uint32_t> kmeans(const std::vector<ColorBin>& histogram, int k, int max_iter = 10);
+
+    // 一次性求出直方图中每个颜色最近的聚类中心序号
+    static std::vector<int> assign(const std::vector<ColorBin>& histogram, const std::vector<uint32_t>& centers);
 
     // 你可以扩展其它算法，如 median cut、均值聚类等
 };
\ No newline at end of file
@@ -3,51 +3,46 @@
 #include "logger.h"
 #include "message.h"
 
-// 命令行参数解析
-CommandLineArgs parse_command_line(int argc, char** argv) {
-    // 1. 预解析语言参数，以便正确显示帮助信息
-    std::string lang = "en";
-    for (int i = 1; i < argc; ++i) {
-        std::string arg = argv[i];
-        if ((arg == "-l" || arg == "--lang") && i + 1 < argc) {
-            lang = argv[++i];
-            break; // 找到即可
-        }
-    }
-    Message::load(lang); // 先加载语言
-
+// 定义全部命令行选项（命令行程序与动态库会话共用）
+static cxxopts::Options build_options() {
     cxxopts::Options options("polyvox", "OBJ/MTL/PNG to VOX/Teardown工具");
     options.add_options()
         ("i,input", Message::get("CMD_ARG_INPUT_DESC"), cxxopts::value<std::string>())
+        ("manifest", Message::get("CMD_ARG_MANIFEST_DESC"), cxxopts::value<std::string>()->default_value(""))
         ("t,texture", Message::get("CMD_ARG_TEXTURE_DESC"), cxxopts::value<std::string>()->default_value(""))
         ("o,output", Message::get("CMD_ARG_OUTPUT_DESC"), cxxopts::value<std::string>()->default_value(""))
         ("s,size", Message::get("CMD_ARG_SIZE_DESC"), cxxopts::value<float>()->default_value("0.1"))
         ("l,lang", Message::get("CMD_ARG_LANG_DESC"), cxxopts::value<std::string>()->default_value("en"))
         ("v,verbose", Message::get("CMD_ARG_VERBOSE_DESC"), cxxopts::value<bool>()->default_value("false"))
+        ("threads", Message::get("CMD_ARG_THREADS_DESC"), cxxopts::value<int>()->default_value("1"))
+        ("texture-cache", Message::get("CMD_ARG_TEXTURE_CACHE_DESC"), cxxopts::value<std::string>()->default_value(""))
+        ("texture-cache-size", Message::get("CMD_ARG_TEXTURE_CACHE_SIZE_DESC"), cxxopts::value<int>()->default_value("1024"))
+        ("palette", Message::get("CMD_ARG_PALETTE_DESC"), cxxopts::value<std::string>()->default_value(""))
+        ("sample-palette", Message::get("CMD_ARG_SAMPLE_PALETTE_DESC"), cxxopts::value<std::string>()->default_value(""))
         // --- 新增：在这里定义 -m/--map 参数 ---
         ("m,map", "Material to TD_note mapping (e.g. \"mat_name:$TD_wood\")", cxxopts::value<std::vector<std::string>>())
         // --- 新增：在这里定义 -p/--property 参数 ---
         ("p,property", "Material property override (e.g. \"mat_name:rough:0.8\")", cxxopts::value<std::vector<std::string>>())
         ("h,help", Message::get("CMD_ARG_HELP_DESC"));
 
-    auto result = options.parse(argc, argv);
-
-    if (result.count("help") || argc < 2) {
-        std::cout << Message::get("CMD_HELP", { {"help", options.help()} }) << std::endl;
-        exit(0);
-    }
+    return options;
+}
 
+// 从解析结果中读取参数
+static CommandLineArgs read_args(const cxxopts::ParseResult& result) {
     CommandLineArgs args;
+    args.manifest_file = result["manifest"].as<std::string>();
     if (result.count("input")) args.input_file = result["input"].as<std::string>();
-    else {
-        Logger::error(Message::get("CMD_MUST_INPUT"));
-        exit(1);
-    }
     args.texture_file = result["texture"].as<std::string>();
     args.output_file = result["output"].as<std::string>();
     args.voxel_size = result["size"].as<float>();
     args.lang = result["lang"].as<std::string>();
     args.verbose = result["verbose"].as<bool>();
+    args.threads = result["threads"].as<int>();
+    args.texture_cache_dir = result["texture-cache"].as<std::string>();
+    args.texture_cache_size_mb = result["texture-cache-size"].as<int>();
+    args.palette_file = result["palette"].as<std::string>();
+    args.sample_palette_file = result["sample-palette"].as<std::string>();
     
     // --- 新增：从解析结果中获取映射 ---
     if (result.count("map")) {
@@ -59,4 +54,40 @@ CommandLineArgs parse_command_line(int argc, char** argv) {
     }
 
     return args;
-}
\ No newline at end of file
+}
+
+// 命令行参数解析
+CommandLineArgs parse_command_line(int argc, char** argv) {
+    // 1. 预解析语言参数，以便正确显示帮助信息
+    std::string lang = "en";
+    for (int i = 1; i < argc; ++i) {
+        std::string arg = argv[i];
+        if ((arg == "-l" || arg == "--lang") && i + 1 < argc) {
+            lang = argv[++i];
+            break; // 找到即可
+        }
+    }
+    Message::load(lang); // 先加载语言
+
+    cxxopts::Options options = build_options();
+    auto result = options.parse(argc, argv);
+
+    if (result.count("help") || argc < 2) {
+        std::cout << Message::get("CMD_HELP", { {"help", options.help()} }) << std::endl;
+        exit(0);
+    }
+
+    CommandLineArgs args = read_args(result);
+    if (args.input_file.empty() && args.manifest_file.empty()) {
+        Logger::error(Message::get("CMD_MUST_INPUT"));
+        exit(1);
+    }
+    return args;
+}
+
+// 解析动态库会话的选项：不要求输入文件，也不会打印帮助或退出进程，选项无效时抛出异常
+CommandLineArgs parse_session_options(int argc, char** argv) {
+    cxxopts::Options options = build_options();
+    auto result = options.parse(argc, argv);
+    return read_args(result);
+}
@@ -5,15 +5,24 @@
 // 命令行参数结构
 struct CommandLineArgs {
     std::string input_file;
+    std::string manifest_file; // 批处理清单（JSON），指定后忽略 -i/-o
     std::string texture_file;
     std::string output_file;
     float voxel_size = 0.1f;
     std::string lang = "en";
     bool verbose = false;
+    int threads = 1; // 单个表面内部的并行线程数，<=0 表示使用全部硬件线程
+    std::string texture_cache_dir; // 已解码纹理的磁盘缓存目录，为空表示禁用
+    int texture_cache_size_mb = 1024; // 磁盘纹理缓存的容量上限（MB）
+    std::string palette_file; // 全局调色板文件（JSON），指定后不再为每个表面单独采样和量化
+    std::string sample_palette_file; // 只对输入的全部表面采样，量化一次并写出全局调色板文件，不生成模型
     std::vector<std::string> material_maps;
     // --- 新增：存储自定义材质属性 ---
     std::vector<std::string> material_properties; 
 };
 
 // 命令行参数解析
-CommandLineArgs parse_command_line(int argc, char** argv);
\ No newline at end of file
+CommandLineArgs parse_command_line(int argc, char** argv);
+
+// 动态库会话的选项解析（与命令行选项相同，但不要求输入文件、不会退出进程）
+CommandLineArgs parse_session_options(int argc, char** argv);
\ No newline at end of file
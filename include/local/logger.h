@@ -8,16 +8,24 @@ class Logger {
 public:
     static bool verbose;
 
+    // 日志回调（由动态库接口设置），设置后消息交给回调而不是输出到控制台
+    // level: 0 = info, 1 = warn, 2 = error
+    using Sink = void (*)(int level, const char* msg);
+    static Sink sink;
+
     static void info(const std::string& msg) {
-        if (verbose)
-            std::cout << msg << std::endl;
+        if (!verbose) return;
+        if (sink) sink(0, msg.c_str());
+        else std::cout << msg << std::endl;
     }
     static void warn(const std::string& msg) {
-        if (verbose)
-            std::cerr << msg << std::endl;
+        if (!verbose) return;
+        if (sink) sink(1, msg.c_str());
+        else std::cerr << msg << std::endl;
     }
     static void error(const std::string& msg) {
-        std::cerr << msg << std::endl;
+        if (sink) sink(2, msg.c_str());
+        else std::cerr << msg << std::endl;
     }
 
     // 新增：支持消息ID和参数
@@ -32,4 +40,5 @@ public:
     }
 };
 
-inline bool Logger::verbose = false;
\ No newline at end of file
+inline bool Logger::verbose = false;
+inline Logger::Sink Logger::sink = nullptr;
\ No newline at end of file
@@ -1,7 +1,11 @@
 #include <fstream>
 #include <sstream>
 #include <filesystem>
+#ifdef _WIN32
 #include <windows.h>
+#else
+#include <dlfcn.h>
+#endif
 #include "local/message.h"
 #include "local/logger.h" // 引入 Logger 以便打印调试信息
 #include "third_party/json.hpp"
@@ -9,13 +13,32 @@
 std::unordered_map<std::string, std::string> Message::messages;
 std::string Message::current_lang = "en";
 
+// 获取当前模块（可执行文件或动态库）所在目录，动态库被其他程序加载时也能找到旁边的 locale/
+static std::filesystem::path module_directory() {
+#ifdef _WIN32
+    HMODULE module = NULL;
+    GetModuleHandleExW(GET_MODULE_HANDLE_EX_FLAG_FROM_ADDRESS | GET_MODULE_HANDLE_EX_FLAG_UNCHANGED_REFCOUNT,
+                       reinterpret_cast<LPCWSTR>(&module_directory), &module);
+    wchar_t module_path_w[MAX_PATH];
+    GetModuleFileNameW(module, module_path_w, MAX_PATH);
+    return std::filesystem::path(module_path_w).parent_path();
+#else
+    std::error_code ec;
+    Dl_info info;
+    if (dladdr(reinterpret_cast<void*>(&module_directory), &info) && info.dli_fname) {
+        std::filesystem::path module_path = std::filesystem::absolute(info.dli_fname, ec);
+        if (!ec && std::filesystem::exists(module_path, ec)) return module_path.parent_path();
+    }
+    // 可执行文件通过 PATH 启动时 dladdr 可能只给出文件名
+    return std::filesystem::read_symlink("/proc/self/exe", ec).parent_path();
+#endif
+}
+
 bool Message::load(const std::string& lang) {
     current_lang = lang;
 
-    // 获取可执行文件所在目录
-    wchar_t exe_path_w[MAX_PATH];
-    GetModuleFileNameW(NULL, exe_path_w, MAX_PATH);
-    std::filesystem::path exe_dir = std::filesystem::path(exe_path_w).parent_path();
+    // 获取可执行文件（或动态库）所在目录
+    std::filesystem::path exe_dir = module_directory();
 
     std::filesystem::path locale_file_path;
 
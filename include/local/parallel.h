@@ -0,0 +1,74 @@
+#pragma once
+#include <algorithm>
+#include <atomic>
+#include <cstddef>
+#include <exception>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+// 取消标志：宿主程序可在任意线程中调用 cancel()，正在运行的体素化在下一个任务（行、瓦片、边分段）开始前停止
+class CancelFlag {
+public:
+    void cancel() { flag.store(true, std::memory_order_relaxed); }
+    bool cancelled() const { return flag.load(std::memory_order_relaxed); }
+
+private:
+    std::atomic<bool> flag{false};
+};
+
+// 体素化被取消时抛出，由动态库接口捕获后返回失败
+struct OperationCancelled : std::exception {
+    const char* what() const noexcept override { return "operation cancelled"; }
+};
+
+inline void throw_if_cancelled(const CancelFlag* cancel) {
+    if (cancel && cancel->cancelled()) throw OperationCancelled();
+}
+
+// 将线程数参数解析为实际使用的线程数（<=0 表示使用全部硬件线程）
+inline int resolve_thread_count(int requested) {
+    if (requested > 0) return requested;
+    unsigned int hw = std::thread::hardware_concurrency();
+    return hw > 0 ? static_cast<int>(hw) : 1;
+}
+
+// 并行执行 fn(0) ... fn(count - 1)
+// 任务按序号动态分配给工作线程；调用者负责把结果写入按序号索引的槽位，以保证合并顺序确定。
+// 单线程或任务数为 1 时直接在当前线程执行。任务中抛出的第一个异常会在所有线程结束后重新抛出。
+// cancel 不为空时每个任务开始前检查一次，已取消则抛出 OperationCancelled。
+template <typename Fn>
+void parallel_for(size_t count, int threads, Fn&& fn, const CancelFlag* cancel = nullptr) {
+    size_t worker_count = std::min(static_cast<size_t>(std::max(threads, 1)), count);
+    if (worker_count <= 1) {
+        for (size_t i = 0; i < count; ++i) {
+            throw_if_cancelled(cancel);
+            fn(i);
+        }
+        return;
+    }
+
+    std::atomic<size_t> next{0};
+    std::exception_ptr first_error;
+    std::mutex error_mutex;
+    auto worker = [&]() {
+        for (size_t i = next.fetch_add(1); i < count; i = next.fetch_add(1)) {
+            try {
+                throw_if_cancelled(cancel);
+                fn(i);
+            } catch (...) {
+                std::lock_guard<std::mutex> lock(error_mutex);
+                if (!first_error) first_error = std::current_exception();
+                next = count; // 停止分配新任务
+            }
+        }
+    };
+
+    std::vector<std::thread> pool;
+    pool.reserve(worker_count - 1);
+    for (size_t t = 1; t < worker_count; ++t) pool.emplace_back(worker);
+    worker(); // 当前线程也参与工作
+    for (auto& th : pool) th.join();
+
+    if (first_error) std::rethrow_exception(first_error);
+}
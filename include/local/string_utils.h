@@ -1,6 +1,7 @@
 #pragma once
 #include <string>
 #include <vector>
+#ifdef _WIN32
 #include <windows.h> // 引入Windows头文件
 
 // 将宽字符字符串 (UTF-16) 转换为 UTF-8 编码的 std::string
@@ -10,4 +11,5 @@ inline std::string wstring_to_utf8(const std::wstring& wstr) {
     std::string strTo(size_needed, 0);
     WideCharToMultiByte(CP_UTF8, 0, &wstr[0], (int)wstr.size(), &strTo[0], size_needed, NULL, NULL);
     return strTo;
-}
\ No newline at end of file
+}
+#endif
@@ -0,0 +1,221 @@
+#include "texture_cache.h"
+#include <algorithm>
+#include <chrono>
+#include <cstring>
+#include <fstream>
+#include <sstream>
+#include <thread>
+#include <vector>
+
+#ifdef _WIN32
+#include <windows.h>
+#else
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
+
+namespace {
+
+const char CACHE_MAGIC[4] = { 'P', 'V', 'T', 'C' };
+const uint32_t CACHE_VERSION = 2;
+const char* CACHE_EXTENSION = ".rgba";
+
+// 缓存文件头，像素数据紧随其后
+struct CacheHeader {
+    char magic[4];
+    uint32_t version;
+    int32_t width;
+    int32_t height;
+    uint64_t source_size;
+    uint64_t content_hash;
+};
+
+// FNV-1a 64位哈希，保证不同进程/版本之间结果一致
+uint64_t fnv1a(const unsigned char* data, size_t size, uint64_t hash = 1469598103934665603ull) {
+    for (size_t i = 0; i < size; ++i) {
+        hash ^= data[i];
+        hash *= 1099511628211ull;
+    }
+    return hash;
+}
+
+// 对整个文件内容计算哈希（读取的是压缩后的图片文件，远小于解码后的像素）
+bool hash_file(const std::filesystem::path& path, uint64_t expected_size, uint64_t& hash) {
+    std::ifstream in(path, std::ios::binary);
+    if (!in) return false;
+    std::vector<char> buffer(1 << 16);
+    uint64_t total = 0;
+    hash = 1469598103934665603ull;
+    while (in) {
+        in.read(buffer.data(), static_cast<std::streamsize>(buffer.size()));
+        std::streamsize count = in.gcount();
+        if (count <= 0) break;
+        hash = fnv1a(reinterpret_cast<const unsigned char*>(buffer.data()), static_cast<size_t>(count), hash);
+        total += static_cast<uint64_t>(count);
+    }
+    return !in.bad() && total == expected_size;
+}
+
+// 只读内存映射，析构时解除映射
+struct MappedFile {
+    const unsigned char* data = nullptr;
+    size_t size = 0;
+#ifdef _WIN32
+    ~MappedFile() { if (data) UnmapViewOfFile(data); }
+#else
+    ~MappedFile() { if (data) munmap(const_cast<unsigned char*>(data), size); }
+#endif
+};
+
+std::shared_ptr<MappedFile> map_file(const std::filesystem::path& path) {
+    auto mapped = std::make_shared<MappedFile>();
+#ifdef _WIN32
+    HANDLE file = CreateFileW(path.wstring().c_str(), GENERIC_READ, FILE_SHARE_READ | FILE_SHARE_DELETE,
+                              nullptr, OPEN_EXISTING, FILE_ATTRIBUTE_NORMAL, nullptr);
+    if (file == INVALID_HANDLE_VALUE) return nullptr;
+    LARGE_INTEGER file_size;
+    if (!GetFileSizeEx(file, &file_size) || file_size.QuadPart == 0) { CloseHandle(file); return nullptr; }
+    HANDLE mapping = CreateFileMappingW(file, nullptr, PAGE_READONLY, 0, 0, nullptr);
+    CloseHandle(file);
+    if (!mapping) return nullptr;
+    void* view = MapViewOfFile(mapping, FILE_MAP_READ, 0, 0, 0);
+    CloseHandle(mapping); // 视图会保持映射对象存活
+    if (!view) return nullptr;
+    mapped->data = static_cast<const unsigned char*>(view);
+    mapped->size = static_cast<size_t>(file_size.QuadPart);
+#else
+    int fd = open(path.c_str(), O_RDONLY);
+    if (fd < 0) return nullptr;
+    struct stat st;
+    if (fstat(fd, &st) != 0 || st.st_size == 0) { close(fd); return nullptr; }
+    void* view = mmap(nullptr, static_cast<size_t>(st.st_size), PROT_READ, MAP_PRIVATE, fd, 0);
+    close(fd);
+    if (view == MAP_FAILED) return nullptr;
+    mapped->data = static_cast<const unsigned char*>(view);
+    mapped->size = static_cast<size_t>(st.st_size);
+#endif
+    return mapped;
+}
+
+} // namespace
+
+TextureCache::TextureCache(const std::filesystem::path& dir, uint64_t max_bytes)
+    : cache_dir(dir), max_bytes(max_bytes) {
+    if (cache_dir.empty()) return;
+    std::error_code ec;
+    std::filesystem::create_directories(cache_dir, ec);
+    if (ec && !std::filesystem::is_directory(cache_dir)) cache_dir.clear(); // 无法创建目录时禁用缓存
+}
+
+bool TextureCache::describe_source(const std::filesystem::path& source, SourceInfo& info) const {
+    // 不使用路径和修改时间：暂存纹理位于每次运行新建的工作目录中，复制时也不保留修改时间
+    std::error_code ec;
+    info.size = std::filesystem::file_size(source, ec);
+    if (ec) return false;
+    if (!hash_file(source, info.size, info.content_hash)) return false;
+
+    std::ostringstream oss;
+    oss << std::hex << info.content_hash << "_" << info.size;
+    info.key = oss.str();
+    return true;
+}
+
+std::filesystem::path TextureCache::entry_path(const SourceInfo& info) const {
+    return cache_dir / (info.key + CACHE_EXTENSION);
+}
+
+std::shared_ptr<const unsigned char> TextureCache::load(const std::filesystem::path& source, int& width, int& height) const {
+    if (!enabled()) return nullptr;
+    SourceInfo info;
+    if (!describe_source(source, info)) return nullptr;
+
+    std::filesystem::path path = entry_path(info);
+    auto mapped = map_file(path);
+    if (!mapped || mapped->size < sizeof(CacheHeader)) return nullptr;
+
+    CacheHeader header;
+    std::memcpy(&header, mapped->data, sizeof(header));
+    if (std::memcmp(header.magic, CACHE_MAGIC, sizeof(CACHE_MAGIC)) != 0 || header.version != CACHE_VERSION ||
+        header.source_size != info.size || header.content_hash != info.content_hash ||
+        header.width <= 0 || header.height <= 0 ||
+        mapped->size != sizeof(CacheHeader) + static_cast<size_t>(header.width) * header.height * 4) {
+        return nullptr;
+    }
+
+    // 更新修改时间，作为淘汰时的“最近使用”依据
+    std::error_code ec;
+    std::filesystem::last_write_time(path, std::filesystem::file_time_type::clock::now(), ec);
+
+    width = header.width;
+    height = header.height;
+    // 别名构造：像素指针与映射共享生命周期
+    return std::shared_ptr<const unsigned char>(mapped, mapped->data + sizeof(CacheHeader));
+}
+
+void TextureCache::store(const std::filesystem::path& source, int width, int height, const unsigned char* rgba) const {
+    if (!enabled() || !rgba || width <= 0 || height <= 0) return;
+    SourceInfo info;
+    if (!describe_source(source, info)) return;
+
+    CacheHeader header;
+    std::memcpy(header.magic, CACHE_MAGIC, sizeof(CACHE_MAGIC));
+    header.version = CACHE_VERSION;
+    header.width = width;
+    header.height = height;
+    header.source_size = info.size;
+    header.content_hash = info.content_hash;
+
+    // 临时文件名包含线程和时间信息，避免多个进程同时写入同一缓存项时互相覆盖
+    std::ostringstream tmp_name;
+    tmp_name << info.key << ".tmp" << std::hash<std::thread::id>{}(std::this_thread::get_id())
+             << "_" << std::chrono::steady_clock::now().time_since_epoch().count();
+    std::filesystem::path tmp_path = cache_dir / tmp_name.str();
+    {
+        std::ofstream out(tmp_path, std::ios::binary | std::ios::trunc);
+        if (!out) return;
+        out.write(reinterpret_cast<const char*>(&header), sizeof(header));
+        out.write(reinterpret_cast<const char*>(rgba), static_cast<std::streamsize>(width) * height * 4);
+        if (!out) {
+            out.close();
+            std::error_code ec;
+            std::filesystem::remove(tmp_path, ec);
+            return;
+        }
+    }
+
+    std::error_code ec;
+    std::filesystem::rename(tmp_path, entry_path(info), ec);
+    if (ec) std::filesystem::remove(tmp_path, ec); // 目标正被其他进程使用时放弃写入
+    evict();
+}
+
+void TextureCache::evict() const {
+    struct Entry {
+        std::filesystem::file_time_type time;
+        uint64_t size;
+        std::filesystem::path path;
+    };
+    std::vector<Entry> entries;
+    uint64_t total = 0;
+    std::error_code ec;
+    for (const auto& item : std::filesystem::directory_iterator(cache_dir, ec)) {
+        if (item.path().extension() != CACHE_EXTENSION) continue;
+        std::error_code item_ec;
+        uint64_t size = item.file_size(item_ec);
+        if (item_ec) continue;
+        auto time = item.last_write_time(item_ec);
+        if (item_ec) continue;
+        entries.push_back({ time, size, item.path() });
+        total += size;
+    }
+    if (total <= max_bytes) return;
+
+    std::sort(entries.begin(), entries.end(), [](const Entry& a, const Entry& b) { return a.time < b.time; });
+    for (const auto& entry : entries) {
+        if (total <= max_bytes) break;
+        std::error_code remove_ec;
+        if (std::filesystem::remove(entry.path, remove_ec)) total -= entry.size;
+    }
+}
@@ -0,0 +1,36 @@
+#pragma once
+#include <cstdint>
+#include <filesystem>
+#include <memory>
+#include <string>
+
+// 已解码纹理（RGBA8）的磁盘缓存，供多个 polyvox 进程共享
+// 缓存项以源文件的 大小 + 内容哈希 为键，与文件所在路径无关：每次运行暂存到新工作目录的同一张纹理也能命中。
+// 命中时通过内存映射直接使用，不再调用 stb_image 解码。
+// 缓存目录总大小超过上限时，按最近使用时间（缓存文件的修改时间）淘汰最旧的项。
+class TextureCache {
+public:
+    // dir 为空表示禁用缓存
+    TextureCache(const std::filesystem::path& dir, uint64_t max_bytes);
+
+    bool enabled() const { return !cache_dir.empty(); }
+
+    // 查找并映射缓存的RGBA像素；未命中或缓存无效时返回空指针
+    std::shared_ptr<const unsigned char> load(const std::filesystem::path& source, int& width, int& height) const;
+
+    // 写入一张解码后的RGBA图片（先写临时文件再原子重命名），随后执行容量淘汰
+    void store(const std::filesystem::path& source, int width, int height, const unsigned char* rgba) const;
+
+private:
+    struct SourceInfo {
+        std::string key;       // 缓存文件名（不含扩展名）
+        uint64_t size = 0;
+        uint64_t content_hash = 0;
+    };
+    bool describe_source(const std::filesystem::path& source, SourceInfo& info) const;
+    std::filesystem::path entry_path(const SourceInfo& info) const;
+    void evict() const;
+
+    std::filesystem::path cache_dir;
+    uint64_t max_bytes;
+};
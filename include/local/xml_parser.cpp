@@ -15,9 +15,9 @@ static void append_xml_node(tinyxml2::XMLDocument& doc, tinyxml2::XMLElement* pa
     parent->InsertEndChild(elem);
 }
 
-bool generate_xml_from_tree(const std::string& filename, const XmlNode& root) {
+// 由节点树构建XML文档（带声明）
+static void build_xml_document(tinyxml2::XMLDocument& doc, const XmlNode& root) {
     using namespace tinyxml2;
-    XMLDocument doc;
     auto* decl = doc.NewDeclaration();
     doc.InsertFirstChild(decl);
 
@@ -32,6 +32,12 @@ bool generate_xml_from_tree(const std::string& filename, const XmlNode& root) {
         doc.InsertEndChild(realRoot->DeepClone(&doc));
         doc.DeleteChild(tempRoot);
     }
+}
+
+bool generate_xml_from_tree(const std::string& filename, const XmlNode& root) {
+    using namespace tinyxml2;
+    XMLDocument doc;
+    build_xml_document(doc, root);
 
     // --- 修改：使用Unicode安全的方式保存文件 ---
     std::filesystem::path path(filename);
@@ -52,4 +58,13 @@ bool generate_xml_from_tree(const std::string& filename, const XmlNode& root) {
     fclose(f);
 
     return err == XML_SUCCESS;
-}
\ No newline at end of file
+}
+
+std::string generate_xml_string(const XmlNode& root) {
+    tinyxml2::XMLDocument doc;
+    build_xml_document(doc, root);
+    // 与 SaveFile 使用相同的格式输出
+    tinyxml2::XMLPrinter printer;
+    doc.Print(&printer);
+    return std::string(printer.CStr(), printer.CStrSize() - 1);
+}
@@ -11,4 +11,7 @@ struct XmlNode {
 };
 
 // 通用XML生成函数
-bool generate_xml_from_tree(const std::string& filename, const XmlNode& root);
\ No newline at end of file
+bool generate_xml_from_tree(const std::string& filename, const XmlNode& root);
+
+// 生成XML文本（内容与 generate_xml_from_tree 写出的文件相同）
+std::string generate_xml_string(const XmlNode& root);
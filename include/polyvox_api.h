@@ -0,0 +1,83 @@
+#pragma once
+/*
+ * polyvox 动态库的 C 接口（polyvox_core.dll / libpolyvox_core.so）
+ * 供 Python（ctypes）等宿主程序在进程内直接体素化表面网格：
+ * 网格以数组形式传入，VOX 文件内容与 XML 文本在内存中返回，不需要启动 polyvox 进程或读写中间文件。
+ *
+ * 字符串均为 UTF-8。一个会话同一时间只能在一个线程中使用（polyvox_session_cancel 除外）；多线程并行时每个线程使用各自的会话。
+ */
+#include <stddef.h>
+#include <stdint.h>
+
+#if defined(_WIN32)
+#  if defined(POLYVOX_API_EXPORTS)
+#    define POLYVOX_API __declspec(dllexport)
+#  else
+#    define POLYVOX_API __declspec(dllimport)
+#  endif
+#else
+#  define POLYVOX_API __attribute__((visibility("default")))
+#endif
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#define POLYVOX_API_VERSION 3
+
+// 表面网格，布局与 .pvm 文件一致；数组只在 polyvox_voxelize 调用期间读取
+typedef struct PolyvoxMesh {
+    const float* positions;       // 顶点 [vertex_count*3]，已变换到XY平面
+    uint32_t vertex_count;
+    const float* uvs;             // UV [uv_count*2]
+    uint32_t uv_count;
+    const uint32_t* face_v;       // 三角形顶点索引 [face_count*3]
+    const uint32_t* face_vt;      // 三角形UV索引 [face_count*3]，0xFFFFFFFF 表示没有UV
+    const uint16_t* face_mat;     // 材质编号 [face_count]，0xFFFF 表示没有材质
+    uint32_t face_count;
+    const char* const* material_names; // 材质名 [material_count]
+    uint32_t material_count;
+    const char* mtl_path;         // MTL文件路径，可为 NULL
+    const char* texture_dir;      // 纹理查找目录
+} PolyvoxMesh;
+
+typedef struct PolyvoxSession PolyvoxSession;
+typedef struct PolyvoxResult PolyvoxResult;
+
+// 日志回调：level 0 = info，1 = warn，2 = error
+typedef void (*PolyvoxLogCallback)(int level, const char* message);
+
+POLYVOX_API int polyvox_api_version(void);
+
+// 设置日志回调（全局），传入 NULL 恢复输出到控制台
+POLYVOX_API void polyvox_set_log_callback(PolyvoxLogCallback callback);
+
+// 创建会话。options 与命令行选项相同（如 "-s" "0.1" "-l" "en" "--threads" "4"），不包含程序名和输入/输出。
+// 选项无效时返回 NULL
+POLYVOX_API PolyvoxSession* polyvox_session_create(int option_count, const char* const* options);
+POLYVOX_API void polyvox_session_destroy(PolyvoxSession* session);
+
+// 取消会话，可在任意线程中调用：正在运行的 polyvox_voxelize/polyvox_sample 在下一行/瓦片/边分段开始前失败返回，
+// 之后对该会话的调用也都失败（不输出错误日志）。销毁会话前须等待正在运行的调用返回
+POLYVOX_API void polyvox_session_cancel(PolyvoxSession* session);
+
+// 体素化一个表面。vox_name 为 XML 中引用的 VOX 文件名，group_pos/group_rot 写入 XML 根 group 节点。
+// 失败时返回 NULL（错误已通过日志输出）
+POLYVOX_API PolyvoxResult* polyvox_voxelize(PolyvoxSession* session, const PolyvoxMesh* mesh,
+                                            const char* vox_name, const char* group_pos, const char* group_rot);
+
+// 全局调色板：对一个表面执行与体素化相同的采样，样本累积在会话中。成功返回1
+POLYVOX_API int polyvox_sample(PolyvoxSession* session, const PolyvoxMesh* mesh, const char* vox_name);
+
+// 对会话中累积的所有样本量化一次，写出全局调色板文件（供 --palette 选项使用）。
+// 没有样本或材质数超过一个调色板的容量时返回0
+POLYVOX_API int polyvox_save_palette(PolyvoxSession* session, const char* palette_path);
+
+// 结果访问：VOX 文件内容与 XML 文本在 polyvox_result_free 之前有效
+POLYVOX_API const uint8_t* polyvox_result_vox(const PolyvoxResult* result, size_t* size);
+POLYVOX_API const char* polyvox_result_xml(const PolyvoxResult* result, size_t* size);
+POLYVOX_API void polyvox_result_free(PolyvoxResult* result);
+
+#ifdef __cplusplus
+}
+#endif
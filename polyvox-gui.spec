@@ -13,6 +13,7 @@ a = Analysis(['script/main_gui.py'],
              binaries=[],
              datas=[
                 ('bin/polyvox.exe', 'bin'),
+                ('bin/polyvox_core.dll', 'bin'), # 进程内体素化库，缺失时回退到 polyvox.exe 子进程
                 ('locale', 'locale'),
                 ('img', 'img'),
                 ('script/themes', 'script/themes'),
@@ -0,0 +1,86 @@
+"""
+后端对照与基准：用 native（polyvox）和 numpy 两个后端处理同一个模型，比较生成的 .vox 与 prefab XML 是否逐字节一致，并输出各自耗时。
+用法：python compare_backends.py --polyvox ../bin/polyvox [--obj ../demo/demo.obj]
+输出不一致时以非零状态退出。
+"""
+import argparse
+import filecmp
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from localization import load_translations
+from logger_config import setup_logger
+from main_workflow import BACKENDS, process_model
+
+DEFAULT_OBJ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo", "demo.obj")
+
+def list_output_files(out_dir):
+    """返回输出目录下所有文件的相对路径（排序后）。"""
+    files = []
+    for root, _, names in os.walk(out_dir):
+        for name in names:
+            files.append(os.path.relpath(os.path.join(root, name), out_dir))
+    return sorted(files)
+
+def compare_outputs(reference_dir, other_dir):
+    """逐字节比较两个输出目录，返回不一致的文件列表（只存在于一侧的文件也算不一致）。"""
+    reference_files = list_output_files(reference_dir)
+    other_files = list_output_files(other_dir)
+    mismatches = sorted(set(reference_files) ^ set(other_files))
+    for rel_path in sorted(set(reference_files) & set(other_files)):
+        if not filecmp.cmp(os.path.join(reference_dir, rel_path), os.path.join(other_dir, rel_path), shallow=False):
+            mismatches.append(rel_path)
+    return mismatches
+
+def main():
+    setup_logger()
+
+    parser = argparse.ArgumentParser(description="Compare the native and NumPy voxelization backends")
+    parser.add_argument("--polyvox", "-p", required=True, help="polyvox executable path (used by the native backend)")
+    parser.add_argument("--obj", "-o", default=DEFAULT_OBJ, help="Input OBJ model path (default: demo/demo.obj)")
+    parser.add_argument("--voxel-size", "-s", type=float, default=0.1, help="Voxel size for processing")
+    parser.add_argument("--workers", "-j", type=int, default=0, help="Number of surfaces voxelized in parallel (0 = all CPU cores)")
+    parser.add_argument("--per-surface-palette", action="store_true", help="Quantize every surface separately instead of building one model-wide palette")
+    args = parser.parse_args()
+
+    load_translations("en")
+
+    root_dir = tempfile.mkdtemp(prefix="polyvox_compare_")
+    try:
+        out_dirs, timings = {}, {}
+        for backend in BACKENDS:
+            out_dirs[backend] = os.path.join(root_dir, backend)
+            start = time.perf_counter()
+            # 关闭纹理缓存，两个后端都从图片文件解码，耗时可以直接比较
+            process_model(args.obj, out_dirs[backend], args.polyvox, args.voxel_size, "en",
+                          max_workers=args.workers, texture_cache_dir=None, backend=backend,
+                          global_palette=not args.per_surface_palette)
+            timings[backend] = time.perf_counter() - start
+
+        for backend in BACKENDS:
+            print(f"{backend:>8}: {timings[backend]:.3f} s")
+
+        reference = BACKENDS[0]
+        failed = False
+        for backend in BACKENDS[1:]:
+            mismatches = compare_outputs(out_dirs[reference], out_dirs[backend])
+            if mismatches:
+                failed = True
+                print(f"{backend} differs from {reference} in {len(mismatches)} file(s):")
+                for rel_path in mismatches:
+                    print(f"  {rel_path}")
+            else:
+                print(f"{backend} output is identical to {reference} ({len(list_output_files(out_dirs[reference]))} files)")
+        return 1 if failed else 0
+    except Exception:
+        logging.exception("Backend comparison failed")
+        return 1
+    finally:
+        shutil.rmtree(root_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
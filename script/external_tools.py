@@ -4,24 +4,55 @@ import sys
 import logging
 from localization import t
 import os
-import time # <-- 新增导入
+import json
 
-# --- 修改函数签名，增加 stop_checker 回调 ---
-def run_polyvox(polyvox_exe, obj_path, out_vox, voxel_size, lang, material_maps=None, material_properties=None, stop_checker=None):
+def build_polyvox_options(voxel_size, lang, material_maps=None, material_properties=None, threads=1, texture_cache_dir=None, palette_file=None):
     """
-    调用 polyvox.exe，并允许在执行过程中中止。
+    构造 polyvox 的公共选项（不含程序名与输入/输出），命令行与动态库会话共用。
+    threads: 单个表面内部光栅化使用的线程数。
+    texture_cache_dir: 已解码纹理的共享磁盘缓存目录，None 表示不使用。
+    palette_file: 全局调色板文件（palette.json），设置后 polyvox 不再为每个表面单独采样和量化。
     """
-    command = [polyvox_exe, "-i", obj_path, "-o", out_vox, "-s", str(voxel_size), "-l", lang, "-v"]
+    options = ["-s", str(voxel_size), "-l", lang, "-v"]
+    if threads and threads != 1:
+        options.extend(["--threads", str(threads)])
+    if texture_cache_dir:
+        options.extend(["--texture-cache", texture_cache_dir])
+    if palette_file:
+        options.extend(["--palette", palette_file])
     
     if material_maps:
         for map_string in material_maps:
-            command.extend(["-m", map_string])
+            options.extend(["-m", map_string])
     
     if material_properties:
         for mat_name, props in material_properties.items():
             for prop_name, prop_value in props.items():
-                command.extend(["-p", f"{mat_name}:{prop_name}:{prop_value}"])
+                options.extend(["-p", f"{mat_name}:{prop_name}:{prop_value}"])
+    return options
 
+def _build_polyvox_command(polyvox_exe, voxel_size, lang, material_maps=None, material_properties=None, threads=1, texture_cache_dir=None, palette_file=None):
+    """
+    构造 polyvox.exe 的公共命令行参数（不含输入/输出）。
+    """
+    return [polyvox_exe] + build_polyvox_options(voxel_size, lang, material_maps, material_properties, threads, texture_cache_dir, palette_file)
+
+def _terminate_process(process):
+    """
+    终止子进程：先发送终止信号，无法终止时强制杀死。
+    """
+    process.terminate()
+    try:
+        # 等待一小段时间确保进程已终止
+        process.wait(timeout=2)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def _execute_polyvox(polyvox_exe, command, stop_checker=None, wait_callback=None):
+    """
+    执行 polyvox 命令，并允许在执行过程中中止。
+    wait_callback: 等待进程结束期间周期性调用（约每0.1秒），其中抛出的异常会先终止子进程再向上抛出。
+    """
     logging.info(t("PY_EXECUTING_COMMAND", cmd=(' '.join(command).replace('\\','/'))))
     
     try:
@@ -42,21 +73,25 @@ def run_polyvox(polyvox_exe, obj_path, out_vox, voxel_size, lang, material_maps=
         )
 
         # --- 新增：在等待进程结束时，周期性检查中止信号 ---
-        while process.poll() is None:
+        # --- 修复：等待期间持续读取输出，避免输出超过管道缓冲区时子进程阻塞 ---
+        while True:
+            try:
+                # 超时后再次调用 communicate 不会丢失已读取的输出
+                stdout, stderr = process.communicate(timeout=0.1)
+                break
+            except subprocess.TimeoutExpired:
+                pass
             if stop_checker and stop_checker():
                 logging.warning(t("GUI_STOPPING_SUBPROCESS"))
-                process.terminate() # 发送终止信号
-                try:
-                    # 等待一小段时间确保进程已终止
-                    process.wait(timeout=2)
-                except subprocess.TimeoutExpired:
-                    process.kill() # 如果无法终止，则强制杀死
+                _terminate_process(process)
                 # 抛出异常，让上层知道是用户中止的
                 raise RuntimeError(t("GUI_USER_STOPPED"))
-            time.sleep(0.1) # 避免CPU空转
-
-        # 进程结束后，获取输出和返回码
-        stdout, stderr = process.communicate()
+            if wait_callback:
+                try:
+                    wait_callback()
+                except BaseException:
+                    _terminate_process(process)
+                    raise
         if stdout:
             for line in stdout.strip().split('\n'):
                 logging.info(line)
@@ -76,23 +111,42 @@ def run_polyvox(polyvox_exe, obj_path, out_vox, voxel_size, lang, material_maps=
         logging.error(t("PY_TOOL_POLYVOX_NOT_FOUND", path=polyvox_exe))
         raise
 
-def update_group_transform(xml_path, pos, rot):
+def run_polyvox_batch(polyvox_exe, jobs, manifest_path, voxel_size, lang, material_maps=None, material_properties=None, stop_checker=None, threads=1, texture_cache_dir=None, palette_file=None, wait_callback=None):
     """
-    更新由 PolyVox 生成的 XML 文件中的 group 节点的 pos 和 rot 属性。
+    通过清单文件让 polyvox.exe 在一个进程内处理多个表面，材质和纹理只加载一次。
+    jobs: [{"obj": 表面网格路径（.obj 或 .pvm）, "vox": 输出VOX路径, "pos": (x, y, z), "rot": (x, y, z)}, ...]
+    pos/rot 会被直接写入生成的XML的group节点。
+    wait_callback: 进程运行期间周期性调用，可用于按已写出的XML统计进度。
     """
-    try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-        if root.tag == "group":
-            root.attrib["pos"] = f"{pos[0]} {pos[1]} {pos[2]}"
-            root.attrib["rot"] = f"{rot[0]} {rot[1]} {rot[2]}"
-            tree.write(xml_path, encoding="utf-8", xml_declaration=True)
-        else:
-            logging.warning(t("PY_TOOL_XML_NO_GROUP", path=xml_path))
-    except ET.ParseError as e:
-        logging.error(t("PY_TOOL_XML_PARSE_ERROR", path=xml_path, error=e))
-    except FileNotFoundError:
-        logging.error(t("PY_TOOL_XML_NOT_FOUND", path=xml_path))
+    manifest = {"jobs": [
+        {
+            "input": job["obj"],
+            "output": job["vox"],
+            "pos": f"{job['pos'][0]} {job['pos'][1]} {job['pos'][2]}",
+            "rot": f"{job['rot'][0]} {job['rot'][1]} {job['rot'][2]}",
+        }
+        for job in jobs
+    ]}
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    command = _build_polyvox_command(polyvox_exe, voxel_size, lang, material_maps, material_properties, threads, texture_cache_dir, palette_file)
+    command.extend(["--manifest", manifest_path])
+    _execute_polyvox(polyvox_exe, command, stop_checker, wait_callback)
+
+def run_polyvox_sample_palette(polyvox_exe, mesh_paths, manifest_path, palette_path, voxel_size, lang, material_maps=None, material_properties=None, stop_checker=None, threads=1, texture_cache_dir=None):
+    """
+    让 polyvox.exe 对清单中的全部表面采样并量化一次，把全局调色板写入 palette_path，不生成模型。
+    采样与之后的体素化使用同一套纹理解码（stb_image），调色板的重映射表与体素化时的颜色完全一致。
+    返回是否写出了调色板；材质数超过调色板容量等情况下 polyvox 不写出文件。
+    """
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({"jobs": [{"input": path} for path in mesh_paths]}, f, ensure_ascii=False)
+
+    command = _build_polyvox_command(polyvox_exe, voxel_size, lang, material_maps, material_properties, threads, texture_cache_dir)
+    command.extend(["--manifest", manifest_path, "--sample-palette", palette_path])
+    _execute_polyvox(polyvox_exe, command, stop_checker)
+    return os.path.exists(palette_path)
 
 # --- 修改：函数签名增加 obj_basename 参数 ---
 def merge_xmls(xml_paths, output_xml, obj_basename, global_rotation="90 0 0", global_prop="tags=nocull"):
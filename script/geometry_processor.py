@@ -1,437 +1,596 @@
 import os
+import re
 import numpy as np
 import shutil
+import struct
+from concurrent.futures import ProcessPoolExecutor
 from scipy.spatial.transform import Rotation as R
 # --- 新增：导入 cKDTree 用于顶点焊接，以及翻译函数 ---
 from scipy.spatial import cKDTree
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.csgraph import connected_components
 from localization import t
 
 SURFACE_OFFSET_MULTIPLIER = 0.25
 
-def weld_vertices(vertices, faces, tolerance=1e-4):
+def weld_vertices(vertices, face_v, tolerance=1e-4):
     """
     顶点焊接：合并距离非常近的顶点，以消除浮点误差。
-    返回新的顶点数组、新的面列表和旧索引到新索引的映射。
+    返回新的顶点数组、新的面顶点索引数组 (F',3)，以及保留下来的面在输入中的索引。
     """
+    vertex_count = len(vertices)
+    if vertex_count == 0:
+        return vertices, face_v[:0], np.empty(0, dtype=np.int64)
+
     tree = cKDTree(vertices)
-    # 查找所有距离小于容差的点对
-    pairs = tree.query_pairs(r=tolerance)
-    
-    # 使用并查集（Disjoint Set Union）来有效地对顶点进行分组
-    parent = list(range(len(vertices)))
-    def find(i):
-        if parent[i] == i:
-            return i
-        parent[i] = find(parent[i])
-        return parent[i]
-    def union(i, j):
-        root_i = find(i)
-        root_j = find(j)
-        if root_i != root_j:
-            parent[root_j] = root_i
-
-    for i, j in pairs:
-        union(i, j)
-
-    # 为每个旧顶点找到其最终的代表顶点
-    for i in range(len(vertices)):
-        find(i)
-
-    # 创建从旧索引到新索引的映射，并计算新顶点的位置（取平均值）
-    new_vertices_map = {}
-    new_vertices_list = []
-    old_to_new_map = {}
-
-    for i, p in enumerate(parent):
-        if p not in new_vertices_map:
-            new_vertices_map[p] = len(new_vertices_list)
-            new_vertices_list.append([])
-        new_vertices_list[new_vertices_map[p]].append(vertices[i])
-        old_to_new_map[i] = new_vertices_map[p]
+    # 查找所有距离小于容差的点对（以 (N,2) 数组返回，避免构造 Python 集合）
+    pairs = tree.query_pairs(r=tolerance, output_type='ndarray')
+
+    # --- 核心修改：用稀疏图的连通分量代替 Python 并查集，对顶点进行分组 ---
+    graph = coo_matrix((np.ones(len(pairs), dtype=np.int8), (pairs[:, 0], pairs[:, 1])),
+                       shape=(vertex_count, vertex_count))
+    _, labels = connected_components(graph, directed=False)
+
+    # 新顶点按其分组中最早出现的旧顶点排序，保持与输入顺序一致
+    _, first_index, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    order = np.argsort(first_index, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    old_to_new = rank[inverse].astype(np.int32)
 
     # 计算每个焊接后顶点的新坐标（平均值）
-    welded_vertices = np.array([np.mean(v_group, axis=0) for v_group in new_vertices_list])
+    group_count = len(order)
+    counts = np.bincount(old_to_new, minlength=group_count).astype(np.float64)
+    welded_vertices = np.empty((group_count, vertices.shape[1]), dtype=np.float64)
+    for axis in range(vertices.shape[1]):
+        welded_vertices[:, axis] = np.bincount(old_to_new, weights=vertices[:, axis], minlength=group_count) / counts
 
     # 更新面索引
-    new_faces = []
-    for face in faces:
-        new_face = []
-        for v_idx, vt_idx, vn_idx in face:
-            new_v_idx = old_to_new_map[v_idx]
-            new_face.append((new_v_idx, vt_idx, vn_idx))
-        
-        # 检查焊接后是否产生退化面（例如，两个顶点合并了）
-        if len(set(v[0] for v in new_face)) >= 3:
-            new_faces.append(new_face)
-            
-    return welded_vertices, new_faces
-
-def filter_duplicate_faces(faces, face_materials):
+    new_face_v = old_to_new[face_v]
+
+    # 检查焊接后是否产生退化面（例如，两个顶点合并了）
+    non_degenerate = ((new_face_v[:, 0] != new_face_v[:, 1]) &
+                      (new_face_v[:, 1] != new_face_v[:, 2]) &
+                      (new_face_v[:, 0] != new_face_v[:, 2]))
+    kept_indices = np.flatnonzero(non_degenerate)
+
+    return welded_vertices, new_face_v[kept_indices], kept_indices
+
+def filter_duplicate_faces(face_v):
     """
     在顶点焊接后，根据面的顶点索引过滤掉完全重复的面。
     这是确保几何数据干净的最后一步。
+    返回保留下来的面的索引数组（保持原始顺序），调用方用它同时裁剪面的UV与材质数组。
     """
-    unique_faces_set = set()
-    new_faces = []
-    new_face_materials = []
-    
-    for i, face in enumerate(faces):
-        # 使用焊接后的顶点索引创建签名
-        face_signature = tuple(sorted(v[0] for v in face))
-        
-        if face_signature in unique_faces_set:
-            continue
-            
-        unique_faces_set.add(face_signature)
-        new_faces.append(face)
-        new_face_materials.append(face_materials[i])
-        
-    return new_faces, new_face_materials
-
-def parse_obj(obj_path, stop_check_callback=None):
+    if len(face_v) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # 使用焊接后排序的顶点索引作为签名，每组重复面保留第一次出现的那个
+    signatures = np.sort(face_v, axis=1)
+    _, first_index = np.unique(signatures, axis=0, return_index=True)
+    return np.sort(first_index)
+
+# --- 新增：批量OBJ解析。按大块读取文件，用正则一次提取同类行，直接生成 NumPy 数组 ---
+# 面数据以数组形式保存：
+#   face_v   (F,3) int32 顶点索引
+#   face_vt  (F,3) int32 UV索引，缺失为 -1
+#   face_mat (F,)  int32 材质编号，对应 material_names，-1 表示没有 usemtl
+OBJ_PARSE_CHUNK_BYTES = 16 * 1024 * 1024
+# 文件超过该大小时才启用多进程解析，小文件的进程启动开销得不偿失
+OBJ_PARALLEL_MIN_BYTES = 64 * 1024 * 1024
+
+_RE_VERTEX = re.compile(rb'^[ \t]*v[ \t]+(\S+)[ \t]+(\S+)[ \t]+(\S+)', re.M)
+_RE_UV = re.compile(rb'^[ \t]*vt[ \t]+(\S+)(?:[ \t]+(\S+))?', re.M)
+# 只取面定义的前3个顶点，每个顶点捕获 v 与 vt（vt 可缺失）
+_RE_FACE_CORNER = rb'(-?\d+)(?:/(-?\d*))?(?:/\S*)?'
+_RE_FACE = re.compile(rb'^[ \t]*f[ \t]+' + _RE_FACE_CORNER + rb'[ \t]+' + _RE_FACE_CORNER + rb'[ \t]+' + _RE_FACE_CORNER, re.M)
+_RE_USEMTL = re.compile(rb'^[ \t]*usemtl(?:[ \t]+([^\r\n]*?))?[ \t]*\r?$', re.M)
+_RE_MTLLIB = re.compile(rb'^[ \t]*mtllib[ \t]+([^\r\n]*?)[ \t]*\r?$', re.M)
+
+def _obj_chunk_ranges(obj_path, chunk_bytes=OBJ_PARSE_CHUNK_BYTES):
+    """将文件切分为若干以换行结尾的字节区间。"""
+    file_size = os.path.getsize(obj_path)
+    ranges = []
+    with open(obj_path, 'rb') as f:
+        start = 0
+        while start < file_size:
+            end = min(start + chunk_bytes, file_size)
+            if end < file_size:
+                f.seek(end)
+                f.readline() # 对齐到下一行的开头
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def _parse_obj_chunk(obj_path, start, end):
     """
-    解析OBJ文件，返回顶点、UV、法线、面、材质等信息。
+    解析文件中的一个字节区间（可在子进程中运行）。
+    返回 (顶点, UV, 面索引(F,6)的列表[按usemtl分段], 分段的材质名, mtllib, 是否含相对索引)。
+    第一个分段的材质名为 None，表示沿用上一块最后的材质。
+    """
+    with open(obj_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    vertices = np.array(_RE_VERTEX.findall(data), dtype=np.bytes_).astype(np.float64).reshape(-1, 3)
+    uv_rows = _RE_UV.findall(data)
+    if uv_rows:
+        uv_raw = np.array(uv_rows, dtype=np.bytes_)
+        uv_raw[uv_raw == b''] = b'0'
+        uvs = uv_raw.astype(np.float64).reshape(-1, 2)
+    else:
+        uvs = np.empty((0, 2), dtype=np.float64)
+
+    # re.split 按 usemtl 行把数据切成 [段0, 材质1, 段1, 材质2, 段2, ...]
+    pieces = _RE_USEMTL.split(data)
+    segment_faces = []
+    segment_materials = []
+    has_relative = False
+    for k in range(0, len(pieces), 2):
+        rows = _RE_FACE.findall(pieces[k])
+        if rows:
+            raw = np.array(rows, dtype=np.bytes_)
+            raw[raw == b''] = b'0' # 缺失的 vt 记为 0，减一后即为 -1
+            idx = raw.astype(np.int64)
+            has_relative = has_relative or bool((idx < 0).any())
+            face_idx = idx - 1
+        else:
+            face_idx = np.empty((0, 6), dtype=np.int64)
+        segment_faces.append(face_idx)
+        if k == 0:
+            segment_materials.append(None)
+        else:
+            name = pieces[k - 1]
+            segment_materials.append((name or b'').decode('utf-8'))
+
+    mtllibs = _RE_MTLLIB.findall(data)
+    mtllib = mtllibs[-1].decode('utf-8') if mtllibs else None
+    return vertices, uvs, segment_faces, segment_materials, mtllib, has_relative
+
+def _parse_obj_lines(obj_path, stop_check_callback=None):
+    """
+    逐行解析（兼容路径），用于包含相对（负数）索引的OBJ文件。
     """
-    vertices = []
-    uvs = []
-    # normals 列表不再需要，因为我们完全忽略文件中的法线
-    faces = []
-    face_materials = []
+    vertices, uvs, face_rows, face_mat = [], [], [], []
+    material_names, material_ids = [], {}
     mtllib = None
-    current_mtl = None
-    
-    # --- 核心修改：移除此处的 unique_faces_set，因为它必须在顶点焊接后执行 ---
-    # unique_faces_set = set()
-
+    current_mat = -1
     with open(obj_path, 'r', encoding='utf-8') as f:
-        # --- 新增：在循环中检查中止信号 ---
         for i, line in enumerate(f):
             if i % 4096 == 0: # 每处理4096行检查一次，避免性能开销过大
                 if stop_check_callback and stop_check_callback():
                     raise RuntimeError(t("GUI_USER_STOPPED"))
-            
-            # --- 修复：使用 maxsplit=1 来正确处理带空格的文件名 ---
             parts = line.strip().split(maxsplit=1)
             if not parts:
                 continue
-            
             command = parts[0]
-            if len(parts) > 1:
-                value = parts[1]
-            else:
-                value = ""
-
+            value = parts[1] if len(parts) > 1 else ""
             if command == 'mtllib':
                 mtllib = value
             elif command == 'usemtl':
-                current_mtl = value
+                if value not in material_ids:
+                    material_ids[value] = len(material_names)
+                    material_names.append(value)
+                current_mat = material_ids[value]
             elif command == 'v':
-                vertices.append([float(x) for x in value.split()])
+                vertices.append([float(x) for x in value.split()[:3]])
             elif command == 'vt':
-                uvs.append([float(x) for x in value.split()])
-            elif command == 'vn':
-                # 我们将忽略文件中的法线，因为它们可能包含硬边信息，
-                # 这会干扰我们的共面分组。我们将自己重新计算。
-                pass # 直接跳过
+                uv = [float(x) for x in value.split()[:2]]
+                uvs.append(uv + [0.0] * (2 - len(uv)))
             elif command == 'f':
-                face_v_indices = []
-                face_tuples = []
-                
-                # --- 核心修复：只取面定义的前3个顶点，以处理非标准OBJ文件 ---
-                # 有些导出器可能会在f行中产生多余的顶点引用。
-                # 通过只取前3个顶点，我们强制将每个f行都视为一个单独的三角形。
-                face_vertices_str = value.split()[:3]
-
-                # 如果顶点数少于3，则为退化面，直接跳过
-                if len(face_vertices_str) < 3:
+                corners = value.split()[:3]
+                if len(corners) < 3:
                     continue
-
-                for vert in face_vertices_str:
+                row = []
+                for vert in corners:
                     v = vert.split('/')
-                    v_idx = int(v[0]) - 1
-                    vt_idx = int(v[1]) - 1 if len(v) > 1 and v[1] else None
-                    vn_idx = None # 强制忽略文件中的法线索引
-                    
-                    face_v_indices.append(v_idx)
-                    face_tuples.append((v_idx, vt_idx, vn_idx))
-
-                # --- 核心修改：直接添加面，不再进行重复检查 ---
-                faces.append(face_tuples)
-                face_materials.append(current_mtl)
+                    v_idx = int(v[0])
+                    v_idx = v_idx - 1 if v_idx > 0 else len(vertices) + v_idx
+                    vt_idx = -1
+                    if len(v) > 1 and v[1]:
+                        vt_idx = int(v[1])
+                        vt_idx = vt_idx - 1 if vt_idx > 0 else len(uvs) + vt_idx
+                    row.extend((v_idx, vt_idx))
+                face_rows.append(row)
+                face_mat.append(current_mat)
+
+    face_idx = np.array(face_rows, dtype=np.int32).reshape(-1, 6)
+    return (np.array(vertices, dtype=np.float64).reshape(-1, 3), np.array(uvs, dtype=np.float64).reshape(-1, 2),
+            face_idx[:, 0::2].copy(), face_idx[:, 1::2].copy(), np.array(face_mat, dtype=np.int32),
+            material_names, mtllib)
+
+def parse_obj(obj_path, stop_check_callback=None, workers=None):
+    """
+    解析OBJ文件，返回顶点、UV、法线、面、材质等信息。
+    返回 (vertices, uvs, face_v, face_vt, face_mat, material_names, mtllib)。
+    文件中的法线被忽略（我们自行计算面法线），多于3个顶点的面只取前3个顶点，少于3个的面被跳过。
+    workers: 解析大文件时使用的进程数，None 表示自动，1 表示在当前进程内解析。
+    """
+    ranges = _obj_chunk_ranges(obj_path)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    use_pool = workers > 1 and len(ranges) > 1 and os.path.getsize(obj_path) >= OBJ_PARALLEL_MIN_BYTES
+
+    chunk_results = []
+    if use_pool:
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+            futures = [pool.submit(_parse_obj_chunk, obj_path, start, end) for start, end in ranges]
+            try:
+                for future in futures:
+                    if stop_check_callback and stop_check_callback():
+                        raise RuntimeError(t("GUI_USER_STOPPED"))
+                    chunk_results.append(future.result())
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+    else:
+        for start, end in ranges:
+            if stop_check_callback and stop_check_callback():
+                raise RuntimeError(t("GUI_USER_STOPPED"))
+            chunk_results.append(_parse_obj_chunk(obj_path, start, end))
 
-    # 在返回时，返回一个空的法线数组，因为我们没有使用文件中的法线
-    return np.array(vertices), np.array(uvs), np.array([]), faces, face_materials, mtllib
+    # 相对索引依赖于该行之前已定义的顶点数，分块解析无法确定，退回逐行解析
+    if any(result[5] for result in chunk_results):
+        vertices, uvs, face_v, face_vt, face_mat, material_names, mtllib = _parse_obj_lines(obj_path, stop_check_callback)
+        return vertices, uvs, face_v, face_vt, face_mat, material_names, mtllib
 
-def get_face_normals(vertices, faces, stop_check_callback=None):
+    # 按文件顺序合并各块，材质状态跨块延续
+    material_names, material_ids = [], {}
+    current_mat = -1
+    face_blocks, mat_blocks = [], []
+    mtllib = None
+    for vertices_c, uvs_c, segment_faces, segment_materials, mtllib_c, _ in chunk_results:
+        for face_idx, name in zip(segment_faces, segment_materials):
+            if name is not None:
+                if name not in material_ids:
+                    material_ids[name] = len(material_names)
+                    material_names.append(name)
+                current_mat = material_ids[name]
+            if len(face_idx):
+                face_blocks.append(face_idx)
+                mat_blocks.append(np.full(len(face_idx), current_mat, dtype=np.int32))
+        if mtllib_c is not None:
+            mtllib = mtllib_c
+
+    vertices = np.concatenate([r[0] for r in chunk_results]) if chunk_results else np.empty((0, 3))
+    uvs = np.concatenate([r[1] for r in chunk_results]) if chunk_results else np.empty((0, 2))
+    face_idx = np.concatenate(face_blocks).astype(np.int32) if face_blocks else np.empty((0, 6), dtype=np.int32)
+    face_v = np.ascontiguousarray(face_idx[:, 0::2])
+    face_vt = np.ascontiguousarray(face_idx[:, 1::2])
+    face_mat = np.concatenate(mat_blocks) if mat_blocks else np.empty(0, dtype=np.int32)
+
+    return vertices, uvs, face_v, face_vt, face_mat, material_names, mtllib
+
+# 批量计算法线时每块处理的面数，块之间检查中止信号
+FACE_NORMAL_CHUNK_SIZE = 1 << 20
+
+def get_face_normals(vertices, face_v, stop_check_callback=None):
     """
     计算每个面的法线。
+    返回有效面的单位法线数组，以及长度为面数的布尔掩码（退化三角形为 False）。
     """
-    normals = []
-    valid_indices = []
-    for i, face in enumerate(faces):
-        # --- 新增：在循环中检查中止信号 ---
-        if i % 1024 == 0: # 每处理1024个面检查一次
-            if stop_check_callback and stop_check_callback():
-                raise RuntimeError(t("GUI_USER_STOPPED"))
+    face_count = len(face_v)
+    normals = np.empty((face_count, 3), dtype=np.float64)
+    valid_mask = np.zeros(face_count, dtype=bool)
 
-        # 如果面顶点数少于3，则为退化面，跳过
-        if len(face) < 3:
-            continue
+    for start in range(0, face_count, FACE_NORMAL_CHUNK_SIZE):
+        if stop_check_callback and stop_check_callback():
+            raise RuntimeError(t("GUI_USER_STOPPED"))
+        end = min(start + FACE_NORMAL_CHUNK_SIZE, face_count)
+        chunk = face_v[start:end]
 
         # --- 核心修复：由于面已被强制三角化，改用标准叉乘计算法线 ---
         # 纽维尔方法适用于多边形，但对于已确定的三角形，标准叉乘更直接且精确。
         # 此前的纽维尔方法在处理大量狭长三角形时，浮点误差累积导致相邻面的法线偏差超出容差。
-        p0 = vertices[face[0][0]]
-        p1 = vertices[face[1][0]]
-        p2 = vertices[face[2][0]]
-        
-        v1 = np.array(p1) - np.array(p0)
-        v2 = np.array(p2) - np.array(p0)
-        
-        normal = np.cross(v1, v2)
-
-        n_norm = np.linalg.norm(normal)
-        if n_norm < 1e-10: # 避免除以零，处理退化三角形
-            continue
-            
-        normal = normal / n_norm
-        normals.append(normal)
-        valid_indices.append(i)
-        
-    return np.array(normals), valid_indices
+        p0 = vertices[chunk[:, 0]]
+        p1 = vertices[chunk[:, 1]]
+        p2 = vertices[chunk[:, 2]]
+        normal = np.cross(p1 - p0, p2 - p0)
+
+        n_norm = np.linalg.norm(normal, axis=1)
+        valid = n_norm >= 1e-10 # 避免除以零，处理退化三角形
+        valid_mask[start:end] = valid
+        normals[start:end] = normal / np.where(valid, n_norm, 1.0)[:, None]
 
-def group_coplanar_faces(vertices, faces, normals, stop_check_callback=None, angle_tol=1e-2, dist_tol=1e-3):
+    return normals[valid_mask], valid_mask
+
+# 预先检查邻接面对时每块处理的面对数量，限制临时数组的内存占用
+COPLANAR_PAIR_CHUNK_SIZE = 1 << 20
+
+def _build_face_adjacency(face_v, vertex_count):
+    """
+    通过共享边构建面邻接关系，返回 CSR 稀疏矩阵（对角线为0）。
+    """
+    face_count = len(face_v)
+    # 每个面的三条边，按排序后的 (较小顶点, 较大顶点) 编码为一个整数键
+    edges = np.sort(np.stack([face_v, np.roll(face_v, -1, axis=1)], axis=2).reshape(-1, 2), axis=1).astype(np.int64)
+    edge_keys = edges[:, 0] * vertex_count + edges[:, 1]
+    _, edge_ids = np.unique(edge_keys, return_inverse=True)
+    edge_faces = np.repeat(np.arange(face_count), 3)
+
+    # 面-边关联矩阵 E，E·Eᵀ 中非零的非对角元素即为共享边的面对
+    incidence = csr_matrix((np.ones(len(edge_ids), dtype=np.int32), (edge_faces, edge_ids.ravel())),
+                           shape=(face_count, edge_ids.max() + 1))
+    adjacency = (incidence @ incidence.T).tocsr()
+    adjacency.setdiag(0)
+    adjacency.eliminate_zeros()
+    adjacency.sort_indices()
+    return adjacency
+
+def _coplanar_with_seed(vertices, face_v, normals, seeds, candidates, angle_tol, dist_tol):
+    """
+    批量判断候选面是否与各自的种子面共面：
+    法线夹角不超过 angle_tol，且候选面所有顶点到种子平面的距离不超过 dist_tol。
+    """
+    ref_normal = normals[seeds]
+    angle = np.arccos(np.clip(np.einsum('ij,ij->i', ref_normal, normals[candidates]), -1, 1))
+    ref_point = vertices[face_v[seeds, 0]]
+    offsets = vertices[face_v[candidates]] - ref_point[:, None, :]
+    dists = np.abs(np.einsum('ijk,ik->ij', offsets, ref_normal))
+    return (angle <= angle_tol) & np.all(dists <= dist_tol, axis=1)
+
+def group_coplanar_faces(vertices, face_v, normals, stop_check_callback=None, angle_tol=1e-2, dist_tol=1e-3):
     """
     根据共面性和连通性将面分组。
+    返回分组列表，每个分组为按升序排列的面索引列表。
     """
-    visited = np.zeros(len(faces), dtype=bool)
+    face_count = len(face_v)
+    if face_count == 0:
+        return []
+
+    # --- 核心修改：用稀疏矩阵表示边邻接，代替以排序元组为键的字典 ---
+    adjacency = _build_face_adjacency(face_v, len(vertices))
+    indptr, indices = adjacency.indptr, adjacency.indices
+
+    # --- 新增：预先批量检查每个面作为种子时，是否至少有一个邻接面可以并入 ---
+    # 判断只依赖种子面，因此没有可并入邻居的面必然自成一组，无需进行扩展
+    pair_seeds = np.repeat(np.arange(face_count), np.diff(indptr))
+    has_candidate = np.zeros(face_count, dtype=bool)
+    for start in range(0, len(indices), COPLANAR_PAIR_CHUNK_SIZE):
+        if stop_check_callback and stop_check_callback():
+            raise RuntimeError(t("GUI_USER_STOPPED"))
+        seeds = pair_seeds[start:start + COPLANAR_PAIR_CHUNK_SIZE]
+        ok = _coplanar_with_seed(vertices, face_v, normals, seeds, indices[start:start + COPLANAR_PAIR_CHUNK_SIZE], angle_tol, dist_tol)
+        has_candidate[seeds[ok]] = True
+
+    visited = np.zeros(face_count, dtype=bool)
     groups = []
-    
-    # --- 核心修改：构建边到面的映射以优化邻接查找 ---
-    edge_to_faces = {}
-    for i, face in enumerate(faces):
-        for j in range(len(face)):
-            v1_idx = face[j][0]
-            v2_idx = face[(j + 1) % len(face)][0]
-            edge = tuple(sorted((v1_idx, v2_idx)))
-            if edge not in edge_to_faces:
-                edge_to_faces[edge] = []
-            edge_to_faces[edge].append(i)
-
-    for i in range(len(faces)):
-        if i % 256 == 0:
+    for i in range(face_count):
+        if i % 4096 == 0:
             if stop_check_callback and stop_check_callback():
                 raise RuntimeError(t("GUI_USER_STOPPED"))
 
         if visited[i]:
             continue
-        
-        group = []
-        stack = [i]
         visited[i] = True
-        
+        if not has_candidate[i]:
+            groups.append([i])
+            continue
+
         # --- 核心修改：实现递归共面扩展 ---
         # 使用分组中第一个“种子”面的法线和参考点作为整个分组的判断基准。
         # 这可以防止因法线微小误差累积导致的分组中断。
-        ref_normal = normals[i]
-        ref_point = vertices[faces[i][0][0]]
-        
-        while stack:
-            current_face_idx = stack.pop()
-            group.append(current_face_idx)
-            
-            # --- 核心修改：通过边映射查找邻接面，而不是遍历所有面 ---
-            face_edges = set()
-            current_face_verts = faces[current_face_idx]
-            for j in range(len(current_face_verts)):
-                v1_idx = current_face_verts[j][0]
-                v2_idx = current_face_verts[(j + 1) % len(current_face_verts)][0]
-                face_edges.add(tuple(sorted((v1_idx, v2_idx))))
-
-            neighbor_candidates = set()
-            for edge in face_edges:
-                for neighbor_idx in edge_to_faces.get(edge, []):
-                    if neighbor_idx != current_face_idx:
-                        neighbor_candidates.add(neighbor_idx)
-
-            for n in neighbor_candidates:
-                if visited[n]:
-                    continue
-                
-                # 所有邻居都与最初的 ref_normal 和 ref_point 比较
-                angle = np.arccos(np.clip(np.dot(ref_normal, normals[n]), -1, 1))
-                if angle > angle_tol:
-                    continue
-                
-                face_verts = [vertices[v[0]] for v in faces[n]]
-                dists = np.abs(np.dot(np.array(face_verts) - ref_point, ref_normal))
-                if np.any(dists > dist_tol):
-                    continue
-                
-                visited[n] = True
-                stack.append(n)
-                
-        groups.append(group)
+        # 由于判断只依赖种子面，按层批量扩展与逐面深度优先扩展得到的分组完全相同。
+        group = [np.array([i])]
+        frontier = group[0]
+        while frontier.size:
+            # 收集当前层所有面的邻接面
+            starts = indptr[frontier]
+            lengths = indptr[frontier + 1] - starts
+            offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            neighbors = np.unique(indices[np.repeat(starts, lengths) + offsets])
+            neighbors = neighbors[~visited[neighbors]]
+            if neighbors.size == 0:
+                break
+
+            # 所有邻居都与最初的 ref_normal 和 ref_point 比较
+            seeds = np.full(neighbors.size, i)
+            frontier = neighbors[_coplanar_with_seed(vertices, face_v, normals, seeds, neighbors, angle_tol, dist_tol)]
+            visited[frontier] = True
+            group.append(frontier)
+
+        groups.append(np.sort(np.concatenate(group)).tolist())
     return groups
 
 def get_plane_reference(normal):
     """
     根据法线，返回一个在与之垂直的平面内的、稳定的参考向量。
+    normal 可以是单个法线 (3,) 或一批法线 (N,3)。
     """
-    if not np.allclose(np.abs(normal), [0, 1, 0]):
-        ref_dir = np.cross(normal, [0, 1, 0])
-    else:
-        ref_dir = np.cross(normal, [0, 0, 1])
-    
-    ref_dir = ref_dir / np.linalg.norm(ref_dir)
-    ref_dir_editor = np.array([ref_dir[0], ref_dir[2], -ref_dir[1]])
+    normal = np.asarray(normal, dtype=np.float64)
+    # 与 np.allclose(np.abs(normal), [0, 1, 0]) 的判断相同，逐行计算
+    y_axis = np.array([0.0, 1.0, 0.0])
+    is_y = np.all(np.abs(np.abs(normal) - y_axis) <= 1e-8 + 1e-5 * y_axis, axis=-1)
+    ref_dir = np.where(np.expand_dims(is_y, -1), np.cross(normal, [0, 0, 1]), np.cross(normal, [0, 1, 0]))
+
+    ref_dir = ref_dir / np.linalg.norm(ref_dir, axis=-1, keepdims=True)
+    ref_dir_editor = np.stack([ref_dir[..., 0], ref_dir[..., 2], -ref_dir[..., 1]], axis=-1)
     return ref_dir, ref_dir_editor
 
-def calculate_surface_transforms(vertices, faces, normals_arr, groups, voxel_size, stop_check_callback=None):
+def calculate_surface_transforms(vertices, face_v, normals_arr, groups, voxel_size, stop_check_callback=None):
     """
     为每个表面分组计算其中心点、法线和最终的编辑器变换。
+    --- 核心修改：所有分组一次性批量计算，同时得到导出时使用的中心点与旋转到XY平面的矩阵 ---
     """
-    surfaces_info = []
-    for i, group in enumerate(groups):
-        # --- 新增：在循环中检查中止信号 ---
-        if i % 256 == 0: # 每处理256个分组检查一次
-            if stop_check_callback and stop_check_callback():
-                raise RuntimeError(t("GUI_USER_STOPPED"))
-
-        if not group:
-            continue
-        
-        all_face_vertices = [vertices[v] for idx in group for v, _, _ in faces[idx]]
-        center = np.mean(all_face_vertices, axis=0)
-
-        group_normals = [normals_arr[idx] for idx in group]
-        normal = np.mean(group_normals, axis=0)
-        normal = normal / np.linalg.norm(normal)
-
-        # === 新增：应用半个体素厚度的偏移 ===
-        # 为了让体素化后的外表面与原始模型对齐，
-        # 需要将中心点沿着法线反方向移动。
-        
-        center_offset = -normal * (voxel_size * SURFACE_OFFSET_MULTIPLIER)
-        center += center_offset
-        
-        center_editor = [center[0], center[2], -center[1]]
-        normal_editor = np.array([normal[0], normal[2], -normal[1]])
-
-        _, ref_dir_editor = get_plane_reference(normal)
-        target_normal = np.array([0, 1, 0])
-        target_ref_dir = np.array([1, 0, 0])
-        rot, _ = R.align_vectors([normal_editor, ref_dir_editor], [target_normal, target_ref_dir])
-        euler = rot.as_euler('xyz', degrees=True)
+    if stop_check_callback and stop_check_callback():
+        raise RuntimeError(t("GUI_USER_STOPPED"))
+
+    group_ids = [i for i, group in enumerate(groups) if group]
+    if not group_ids:
+        return []
+
+    # 面 -> 分组 的标签数组
+    group_sizes = np.array([len(groups[i]) for i in group_ids])
+    group_faces = np.concatenate([np.asarray(groups[i], dtype=np.int64) for i in group_ids])
+    labels = np.repeat(np.arange(len(group_ids)), group_sizes)
+
+    # 中心点：分组内所有面顶点的平均值
+    corner_sums = vertices[face_v[group_faces]].sum(axis=1)
+    centers = np.stack([np.bincount(labels, weights=corner_sums[:, k]) for k in range(3)], axis=1) / (3 * group_sizes)[:, None]
+
+    # 法线：分组内面法线的平均值
+    face_normals = normals_arr[group_faces]
+    normals = np.stack([np.bincount(labels, weights=face_normals[:, k]) for k in range(3)], axis=1) / group_sizes[:, None]
+    normals = normals / np.linalg.norm(normals, axis=1, keepdims=True)
+    ref_dirs, ref_dirs_editor = get_plane_reference(normals)
+
+    # === 新增：应用半个体素厚度的偏移 ===
+    # 为了让体素化后的外表面与原始模型对齐，
+    # 需要将中心点沿着法线反方向移动。
+    offset_centers = centers - normals * (voxel_size * SURFACE_OFFSET_MULTIPLIER)
+    centers_editor = np.stack([offset_centers[:, 0], offset_centers[:, 2], -offset_centers[:, 1]], axis=1)
+    normals_editor = np.stack([normals[:, 0], normals[:, 2], -normals[:, 1]], axis=1)
+
+    # 编辑器旋转：将 X 轴转到参考方向、Y 轴转到法线方向（两者正交，可直接写出旋转矩阵）
+    editor_matrices = np.stack([ref_dirs_editor, normals_editor, np.cross(ref_dirs_editor, normals_editor)], axis=2)
+    eulers = R.from_matrix(editor_matrices).as_euler('xyz', degrees=True)
+
+    # 导出用旋转：将法线转到 Z 轴、参考方向转到 X 轴，即把表面放到XY平面
+    to_xy_matrices = np.stack([ref_dirs, np.cross(normals, ref_dirs), normals], axis=1)
 
+    surfaces_info = []
+    for k, i in enumerate(group_ids):
         surfaces_info.append({
             "name": f"surface_{i+1}",
             "index": i+1,
-            "center": center_editor,
-            "normal_euler_deg": euler.tolist(),
-            "face_indices": group,
+            "center": centers_editor[k].tolist(),
+            "normal_euler_deg": eulers[k].tolist(),
+            "face_indices": groups[i],
+            "obj_center": centers[k],
+            "to_xy_matrix": to_xy_matrices[k],
         })
     return surfaces_info
 
-def export_single_surface_obj(vertices, uvs, normals, faces, face_materials, group_indices, out_obj, mtllib_path, obj_src_dir, input_obj_path, normals_arr, stop_check_callback=None):
+# 共享MTL文件的安全名称（不含空格/特殊字符，以供C++核心程序使用）
+SHARED_MTL_NAME = "polyvox_materials.mtl"
+
+def _link_or_copy(src, dst):
+    """
+    优先使用硬链接放置纹理，跨文件系统等无法链接的情况下退回到复制。
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
+
+def stage_shared_assets(mtllib_path, obj_src_dir, input_obj_path, asset_dir):
+    """
+    每次处理只执行一次：将原始MTL改写为共享MTL文件，并把其引用的纹理放入共享纹理子目录。
+    asset_dir 必须是导出表面OBJ的目录，C++核心相对于OBJ所在目录查找MTL与纹理。
+    返回共享MTL文件名；模型没有MTL或MTL文件不存在时返回 None。
+    """
+    if not mtllib_path:
+        return None
+    # 原始MTL文件的完整路径
+    mtl_src = os.path.join(obj_src_dir, os.path.basename(mtllib_path))
+    if not os.path.exists(mtl_src):
+        return None
+
+    # 纹理子目录以原始OBJ文件名命名，以避免冲突
+    input_obj_base = os.path.splitext(os.path.basename(input_obj_path))[0]
+    tex_subdir = os.path.join(asset_dir, input_obj_base)
+    os.makedirs(tex_subdir, exist_ok=True)
+
+    new_lines = []
+    staged_textures = set()
+    with open(mtl_src, 'r', encoding='utf-8') as mtl_file:
+        for line in mtl_file:
+            parts = line.strip().split(maxsplit=1)
+            if len(parts) > 1 and parts[0] == 'map_Kd':
+                tex_path = parts[1]
+                tex_name = os.path.basename(tex_path)
+                src_img = os.path.join(obj_src_dir, tex_path)
+                dst_img = os.path.join(tex_subdir, tex_name)
+                new_tex_path = os.path.join(os.path.basename(tex_subdir), tex_name).replace("\\", "/")
+                line = f"map_Kd {new_tex_path}\n"
+                if tex_name not in staged_textures and os.path.exists(src_img) and not os.path.exists(dst_img):
+                    _link_or_copy(src_img, dst_img)
+                staged_textures.add(tex_name)
+            new_lines.append(line)
+
+    # 将处理过的内容写入到共享的、安全的MTL文件中
+    with open(os.path.join(asset_dir, SHARED_MTL_NAME), 'w', encoding='utf-8') as mtl_file:
+        mtl_file.writelines(new_lines)
+    return SHARED_MTL_NAME
+
+def _prepare_surface_mesh(vertices, uvs, face_v, face_vt, face_mat, group_indices, obj_center, to_xy_matrix):
+    """
+    提取一个表面用到的顶点与UV并重新编号（新索引按旧索引升序分配），同时把顶点变换到XY平面。
+    返回 (变换后的顶点, UV, 面顶点索引, 面UV索引[缺失为-1], 面材质编号)。
     """
-    导出一个独立的、旋转到XY平面的表面OBJ文件，供PolyVox处理。
-    --- 核心修复：将原始MTL文件复制并重命名为不含空格/特殊字符的安全名称，以供C++核心程序使用。---
+    group_v = face_v[group_indices]
+    group_vt = face_vt[group_indices]
+    group_mat = face_mat[group_indices]
+
+    used_v, new_v = np.unique(group_v, return_inverse=True)
+    new_v = new_v.reshape(group_v.shape)
+    has_vt = group_vt >= 0
+    used_vt, new_vt_flat = np.unique(group_vt[has_vt], return_inverse=True)
+    new_vt = np.full(group_vt.shape, -1, dtype=np.int64)
+    new_vt[has_vt] = new_vt_flat.ravel()
+
+    transformed_vertices = (vertices[used_v] - obj_center) @ to_xy_matrix.T
+    return transformed_vertices, uvs[used_vt], new_v, new_vt, group_mat
+
+# --- 新增：二进制表面网格格式（.pvm），C++ 核心一次读入，省去文本格式化与解析 ---
+# 格式定义见 src/voxelizer.cpp 中的 parse_pvm_file，所有数值均为小端序
+PVM_MAGIC = b"PVM1"
+PVM_VERSION = 1
+PVM_NO_UV = 0xFFFFFFFF
+PVM_NO_MATERIAL = 0xFFFF
+
+def build_surface_mesh_arrays(vertices, uvs, face_v, face_vt, face_mat, material_names, group_indices, obj_center, to_xy_matrix):
+    """
+    构建一个旋转到XY平面的表面网格数组，布局与 .pvm 文件及 polyvox 动态库的 PolyvoxMesh 一致。
+    返回 dict：positions(float32, Nx3)、uvs(float32, Mx2)、face_v/face_vt(uint32, Fx3，无UV为 PVM_NO_UV)、
+    face_mat(uint16, 无材质为 PVM_NO_MATERIAL)、material_names(本表面用到的材质名)。数组均为C连续的小端序。
+    """
+    transformed_vertices, surface_uvs, new_v, new_vt, group_mat = _prepare_surface_mesh(
+        vertices, uvs, face_v, face_vt, face_mat, group_indices, obj_center, to_xy_matrix)
+
+    # 材质编号重映射为本表面的局部材质表
+    used_mat, local_mat = np.unique(group_mat, return_inverse=True)
+    has_mat = used_mat >= 0
+    local_names = [material_names[m] for m in used_mat[has_mat].tolist()]
+    if len(local_names) >= PVM_NO_MATERIAL:
+        raise ValueError(f"Too many materials in one surface: {len(local_names)}")
+    # 没有材质（-1）排在最前，其余编号依次前移
+    local_mat = local_mat.ravel() - (len(used_mat) - np.count_nonzero(has_mat))
+
+    return {
+        "positions": np.ascontiguousarray(transformed_vertices, dtype='<f4'),
+        "uvs": np.ascontiguousarray(surface_uvs, dtype='<f4'),
+        "face_v": np.ascontiguousarray(new_v, dtype='<u4'),
+        "face_vt": np.where(new_vt >= 0, new_vt, PVM_NO_UV).astype('<u4'),
+        "face_mat": np.where(group_mat >= 0, local_mat, PVM_NO_MATERIAL).astype('<u2'),
+        "material_names": local_names,
+    }
+
+def export_single_surface_mesh(vertices, uvs, face_v, face_vt, face_mat, material_names, group_indices, out_mesh, shared_mtl_name, obj_center, to_xy_matrix, stop_check_callback=None):
+    """
+    导出一个旋转到XY平面的表面，写为二进制 .pvm 文件，供PolyVox处理。
+    obj_center 与 to_xy_matrix 由 calculate_surface_transforms 计算，顶点先平移到中心再旋转。
+    shared_mtl_name: stage_shared_assets 返回的共享MTL文件名，None 表示不引用MTL。材质表只包含本表面用到的材质。
     """
     if not group_indices:
         return
-
-    used_v, used_vt, used_vn = set(), set(), set()
-    for idx in group_indices:
-        for v, vt, vn in faces[idx]:
-            used_v.add(v)
-            if vt is not None: used_vt.add(vt)
-            if vn is not None: used_vn.add(vn)
-
-    v_map = {old: new for new, old in enumerate(sorted(used_v))}
-    vt_map = {old: new for new, old in enumerate(sorted(used_vt))}
-    vn_map = {old: new for new, old in enumerate(sorted(used_vn))}
-
-    all_face_vertices = [vertices[v] for idx in group_indices for v, _, _ in faces[idx]]
-    center = np.mean(all_face_vertices, axis=0)
-
-    group_face_normals = [normals_arr[idx] for idx in group_indices]
-    avg_normal = np.mean(group_face_normals, axis=0)
-    avg_normal = avg_normal / np.linalg.norm(avg_normal)
-
-    ref_dir_obj, _ = get_plane_reference(avg_normal)
-    target_normal = np.array([0, 0, 1])
-    target_ref_dir = np.array([1, 0, 0])
-    rot, _ = R.align_vectors([target_normal, target_ref_dir], [avg_normal, ref_dir_obj])
-
-    transformed_vertices = []
-    for v_idx in sorted(used_v):
-        vtx = vertices[v_idx] - center
-        vtx = rot.apply(vtx)
-        transformed_vertices.append(vtx)
-
-    # --- 1. 准备安全的文件名 ---
-    surface_basename = os.path.splitext(os.path.basename(out_obj))[0]
-    safe_mtl_name = f"{surface_basename}.mtl"
-
-    with open(out_obj, 'w', encoding='utf-8') as obj:
-        if mtllib_path:
-            # --- 2. 在OBJ中写入安全、无空格的MTL文件名 ---
-            obj.write(f"mtllib {safe_mtl_name}\n")
-        
-        for vtx in transformed_vertices:
-            obj.write(f"v {' '.join(map(str, vtx))}\n")
-        for vt_idx in sorted(used_vt):
-            obj.write(f"vt {' '.join(map(str, uvs[vt_idx]))}\n")
-        for vn_idx in sorted(used_vn):
-            obj.write(f"vn {' '.join(map(str, normals[vn_idx]))}\n")
-        
-        last_mtl = None
-        for i, idx in enumerate(group_indices):
-            if i % 1024 == 0:
-                if stop_check_callback and stop_check_callback():
-                    raise RuntimeError(t("GUI_USER_STOPPED"))
-
-            mtl = face_materials[idx]
-            if mtl != last_mtl:
-                obj.write(f"usemtl {mtl}\n")
-                last_mtl = mtl
-            face = faces[idx]
-            f_str = []
-            for v, vt, vn in face:
-                s = str(v_map[v]+1)
-                s += f"/{vt_map[vt]+1}" if vt is not None else "/"
-                if vn is not None: s += f"/{vn_map[vn]+1}"
-                f_str.append(s)
-            obj.write("f " + " ".join(f_str) + "\n")
-
-    # --- 3. 复制并处理MTL文件和纹理 ---
-    if mtllib_path:
-        # 原始MTL文件的完整路径
-        mtl_src = os.path.join(obj_src_dir, os.path.basename(mtllib_path))
-        # 目标MTL文件的完整路径（使用安全名称）
-        mtl_dst = os.path.join(os.path.dirname(out_obj), safe_mtl_name)
-        
-        # 纹理子目录，现在以原始OBJ文件名命名，以避免冲突
-        input_obj_base = os.path.splitext(os.path.basename(input_obj_path))[0]
-        tex_subdir = os.path.join(os.path.dirname(out_obj), input_obj_base)
-        os.makedirs(tex_subdir, exist_ok=True)
-        
-        if os.path.exists(mtl_src):
-            new_lines = []
-            with open(mtl_src, 'r', encoding='utf-8') as mtl_file:
-                for line in mtl_file:
-                    parts = line.strip().split(maxsplit=1)
-                    if len(parts) > 1 and parts[0] == 'map_Kd':
-                        tex_path = parts[1]
-                        tex_name = os.path.basename(tex_path)
-                        src_img = os.path.join(obj_src_dir, tex_path)
-                        dst_img = os.path.join(tex_subdir, tex_name)
-                        new_tex_path = os.path.join(os.path.basename(tex_subdir), tex_name).replace("\\", "/")
-                        line = f"map_Kd {new_tex_path}\n"
-                        if os.path.exists(src_img) and not os.path.exists(dst_img):
-                            shutil.copy(src_img, dst_img)
-                    new_lines.append(line)
-            # 将处理过的内容写入到新的、安全的MTL文件中
-            with open(mtl_dst, 'w', encoding='utf-8') as mtl_file:
-                mtl_file.writelines(new_lines)
+    if stop_check_callback and stop_check_callback():
+        raise RuntimeError(t("GUI_USER_STOPPED"))
+
+    mesh = build_surface_mesh_arrays(vertices, uvs, face_v, face_vt, face_mat, material_names,
+                                     group_indices, obj_center, to_xy_matrix)
+
+    mtllib = (shared_mtl_name or "").encode('utf-8')
+    header = [PVM_MAGIC, struct.pack('<5I', PVM_VERSION, len(mesh["positions"]), len(mesh["uvs"]), len(mesh["face_v"]), len(mesh["material_names"])),
+              struct.pack('<I', len(mtllib)), mtllib]
+    for name in mesh["material_names"]:
+        encoded = name.encode('utf-8')
+        header.append(struct.pack('<I', len(encoded)))
+        header.append(encoded)
+
+    with open(out_mesh, 'wb') as out:
+        out.write(b"".join(header))
+        for key in ("positions", "uvs", "face_v", "face_vt", "face_mat"):
+            mesh[key].tofile(out)
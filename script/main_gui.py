@@ -3,6 +3,7 @@ import os
 import logging
 import traceback
 import time
+import multiprocessing
 import winreg as winreg_module # 避免与变量名冲突
 import locale # <-- 1. 导入 locale 模块
 import numpy as np
@@ -27,7 +28,7 @@ from PySide6.QtWidgets import (
     QProgressBar, QDoubleSpinBox, QComboBox, QFrame, QMessageBox,
     QSplashScreen, QListWidget, QStackedWidget, QDialog, QDialogButtonBox, QCheckBox,
     QAbstractItemView, QScrollArea, QGridLayout, QFormLayout, QTabWidget, QFontComboBox, QStyle,
-    QSlider, QAbstractSpinBox
+    QSlider, QAbstractSpinBox, QSpinBox
 )
 from PySide6.QtCore import Qt, QThread, QObject, Signal, Slot, QSettings, QTimer
 from PySide6.QtGui import (
@@ -352,7 +353,7 @@ class Worker(QObject):
     stop_signal = Signal()
 
     # --- 修复：在构造函数中接收 material_properties 和 temp_dir_path ---
-    def __init__(self, obj_path, out_dir, polyvox_exe, voxel_size, lang, material_maps=None, material_properties=None, temp_dir_path=None, angle_tol=1e-5, dist_tol=1e-4):
+    def __init__(self, obj_path, out_dir, polyvox_exe, voxel_size, lang, material_maps=None, material_properties=None, temp_dir_path=None, angle_tol=1e-5, dist_tol=1e-4, max_workers=0):
         super().__init__()
         self.obj_path = obj_path
         self.out_dir = out_dir
@@ -366,6 +367,8 @@ class Worker(QObject):
         # --- 新增：存储容差值 ---
         self.angle_tol = angle_tol
         self.dist_tol = dist_tol
+        # --- 新增：并行处理的表面数 ---
+        self.max_workers = max_workers
 
     @Slot()
     def run(self):
@@ -394,7 +397,8 @@ class Worker(QObject):
                 temp_dir_path=self.temp_dir_path, # <-- 新增
                 # --- 新增：传递容差参数 ---
                 angle_tol=self.angle_tol,
-                dist_tol=self.dist_tol
+                dist_tol=self.dist_tol,
+                max_workers=self.max_workers
             )
             
             if not self._should_stop:
@@ -612,6 +616,7 @@ class PreferencesDialog(NonClosingDialog):
         # --- 核心修复：使用新的自定义滑块加载高级设置 ---
         self.angle_tol_slider.setFloatValue(self.config.get("angle_tol", 1e-5))
         self.dist_tol_slider.setFloatValue(self.config.get("dist_tol", 1e-4))
+        self.max_workers_spinbox.setValue(int(self.config.get("max_workers", 0)))
 
     def retranslate_ui(self):
         """更新此对话框中的所有UI文本"""
@@ -668,6 +673,10 @@ class PreferencesDialog(NonClosingDialog):
         self.dist_tol_label.setText(t("PREF_ADVANCED_DIST_TOL"))
         self.angle_tol_help.setToolTip(t("PREF_ADVANCED_ANGLE_TOL_TOOLTIP_SIMPLE"))
         self.dist_tol_help.setToolTip(t("PREF_ADVANCED_DIST_TOL_TOOLTIP_SIMPLE"))
+        self.performance_label.setText(f"<b>{t('PREF_ADVANCED_PERFORMANCE')}</b>")
+        self.max_workers_label.setText(t("PREF_ADVANCED_MAX_WORKERS"))
+        self.max_workers_spinbox.setSpecialValueText(t("PREF_ADVANCED_MAX_WORKERS_AUTO"))
+        self.max_workers_help.setToolTip(t("PREF_ADVANCED_MAX_WORKERS_TOOLTIP"))
 
     def create_general_page(self):
         page = QWidget()
@@ -995,6 +1004,31 @@ class PreferencesDialog(NonClosingDialog):
         )
 
         layout.addWidget(tolerance_group)
+
+        # --- 新增：并行处理设置 ---
+        self.performance_label = QLabel(f"<b>{t('PREF_ADVANCED_PERFORMANCE')}</b>")
+        layout.addWidget(self.performance_label)
+
+        performance_group = QFrame()
+        performance_group.setProperty("frame-style", "bordered")
+        performance_group.setFrameShape(QFrame.StyledPanel)
+        performance_layout = QHBoxLayout(performance_group)
+        performance_layout.setContentsMargins(10, 15, 10, 15)
+
+        self.max_workers_label = QLabel(t("PREF_ADVANCED_MAX_WORKERS"))
+        self.max_workers_spinbox = QSpinBox()
+        self.max_workers_spinbox.setRange(0, 256) # 0 表示自动（CPU核心数）
+        self.max_workers_spinbox.setSpecialValueText(t("PREF_ADVANCED_MAX_WORKERS_AUTO"))
+        self.max_workers_spinbox.setValue(int(self.config.get("max_workers", 0)))
+        self.max_workers_help = self._create_help_icon()
+        self.max_workers_help.setToolTip(t("PREF_ADVANCED_MAX_WORKERS_TOOLTIP"))
+
+        performance_layout.addWidget(self.max_workers_label)
+        performance_layout.addStretch()
+        performance_layout.addWidget(self.max_workers_spinbox)
+        performance_layout.addWidget(self.max_workers_help)
+
+        layout.addWidget(performance_group)
         layout.addStretch()
 
         self.category_list.addItem(t("PREF_CAT_ADVANCED"))
@@ -1080,6 +1114,7 @@ class PreferencesDialog(NonClosingDialog):
         # --- 核心修复：从新的自定义滑块保存高级设置 ---
         self.config["angle_tol"] = self.angle_tol_slider.floatValue()
         self.config["dist_tol"] = self.dist_tol_slider.floatValue()
+        self.config["max_workers"] = self.max_workers_spinbox.value()
 
         super().accept()
 
@@ -1807,6 +1842,7 @@ class MainWindow(QMainWindow):
 
         self.config["manual_mapping_default"] = settings.value("manual_mapping_default", "$TD_auto")
         self.config["temp_dir_path"] = settings.value("temp_dir_path", "")
+        self.config["max_workers"] = settings.value("max_workers", 0, type=int)
 
         self.polyvox_path_edit.setText(settings.value("polyvox_exe_path", resource_path("bin/polyvox.exe")))
         self.outdir_path_edit.setText(settings.value("output_dir", ""))
@@ -2443,7 +2479,8 @@ class MainWindow(QMainWindow):
             temp_dir_path=self.config.get("temp_dir_path"), # <-- 新增
             # --- 新增：传递容差参数 ---
             angle_tol=angle_tol,
-            dist_tol=dist_tol
+            dist_tol=dist_tol,
+            max_workers=self.config.get("max_workers", 0)
         )
         self.worker.moveToThread(self.thread)
 
@@ -2627,6 +2664,8 @@ class MainWindow(QMainWindow):
         self._update_material_controls_state()
 
 if __name__ == "__main__":
+    # --- 新增：打包为可执行文件后，OBJ 并行解析的子进程需要此调用 ---
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
 
     app.setStyle("Fusion")
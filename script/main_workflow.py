@@ -2,12 +2,17 @@ import logging
 from localization import t, load_translations
 import geometry_processor as geo
 import external_tools as tools
+import polyvox_native as native
+import numpy_voxelizer
 import os
 import argparse
 import shutil
 from logger_config import setup_logger
 # --- 新增导入 ---
 import tempfile
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from contextlib import contextmanager
 
 # --- 修改：从新的核心枚举文件导入，打破循环依赖 ---
@@ -73,20 +78,81 @@ def atomic_commit(target_dir, stop_checker=None):
         msg = t("PY_COMMIT_CLEANUP")
         logging.info(msg)
 
+# --- 新增：在主线程中调用动态库时，由后台线程轮询停止请求并取消会话，正在运行的表面也能及时中止 ---
+@contextmanager
+def cancel_on_stop(session, stop_checker):
+    if not stop_checker:
+        yield session
+        return
+    finished = threading.Event()
+    def watch():
+        while not finished.wait(0.1):
+            if stop_checker():
+                session.cancel()
+                return
+    watcher = threading.Thread(target=watch, name="polyvox_cancel", daemon=True)
+    watcher.start()
+    try:
+        yield session
+    finally:
+        finished.set()
+        watcher.join()
+
+
+def resolve_worker_count(max_workers=None):
+    """
+    将用户配置的并行任务数转换为实际的线程数。None 或 <=0 表示使用全部CPU核心。
+    """
+    if not max_workers or max_workers <= 0:
+        return os.cpu_count() or 1
+    return int(max_workers)
+
+# --- 新增：单个 polyvox 进程（清单模式）最多处理的表面数，兼顾启动开销与进度反馈粒度 ---
+MAX_SURFACES_PER_BATCH = 16
+
+# --- 新增：可选的体素化后端 ---
+BACKENDS = ("native", "numpy")
+
+# --- 新增：已解码纹理的磁盘缓存目录，多个 polyvox 进程及多次运行之间共享 ---
+TEXTURE_CACHE_DIR = os.path.join(tempfile.gettempdir(), "polyvox_texture_cache")
+
+def collect_palette_samples(session, vertices, uvs, face_v, face_vt, face_mat, material_names, surfaces_info,
+                            mtl_name, texture_dir, stop_check_callback=None):
+    """
+    全局调色板的采样阶段：对所有表面执行与体素化相同的采样，样本累积在会话（NativeSession 或 NumpySession）中，
+    随后由 session.save_palette 对每个材质量化一次。
+    """
+    for surf in surfaces_info:
+        if stop_check_callback and stop_check_callback(): raise RuntimeError(t("GUI_USER_STOPPED"))
+        mesh = geo.build_surface_mesh_arrays(
+            vertices, uvs, face_v, face_vt, face_mat, material_names,
+            surf['face_indices'], surf['obj_center'], surf['to_xy_matrix']
+        )
+        session.collect_samples(mesh, mtl_name, texture_dir, f"{surf['name']}.vox")
 
 # --- 修改函数签名，增加 stop_check_callback 和新的容差参数 ---
 def process_model(obj_path, out_dir, polyvox_exe, voxel_size, lang, 
                   progress_callback=None, stage_callback=None, stop_check_callback=None, 
                   material_maps=None, material_properties=None, temp_dir_path=None,
-                  angle_tol=1e-5, dist_tol=1e-4):
+                  angle_tol=1e-5, dist_tol=1e-4, max_workers=None, texture_cache_dir=TEXTURE_CACHE_DIR,
+                  backend="native", global_palette=True):
     """
     主处理流程，编排所有步骤。
+    max_workers: 同时处理的表面批次数，None 或 <=0 表示自动（CPU核心数）。
+    polyvox 可执行文件旁边有 polyvox_core 动态库时在进程内体素化，否则为每批启动一个 polyvox 进程。
+    texture_cache_dir: 已解码纹理的磁盘缓存目录，None 表示禁用。
+    backend: "native" 使用 polyvox（动态库或可执行文件）；"numpy" 使用纯 NumPy 实现在进程内体素化，不需要 polyvox。
+    global_palette: 在体素化之前对所有表面采样并量化一次，所有表面共用同一个调色板；False 时每个表面单独量化。
     """
+    if backend not in BACKENDS:
+        raise ValueError(t("PY_UNKNOWN_BACKEND", backend=backend, choices=", ".join(BACKENDS)))
+
     # --- 修改：如果提供了自定义路径，则在该路径下创建临时目录 ---
     work_dir = tempfile.mkdtemp(prefix="polyvox_work_", dir=temp_dir_path if temp_dir_path and os.path.isdir(temp_dir_path) else None)
     msg = t("PY_CREATED_TEMP_DIR", dir=work_dir.replace("\\", "/"))
     logging.info(msg)
 
+    numpy_session = None
     try:
         def report_stage(stage, text_id, **kwargs):
             if stop_check_callback and stop_check_callback(): raise RuntimeError(t("GUI_USER_STOPPED"))
@@ -110,77 +176,259 @@ def process_model(obj_path, out_dir, polyvox_exe, voxel_size, lang,
 
         # 1. 解析OBJ
         report_stage(ProcessingStage.PREPARING, "PY_WF_STEP1_PARSE")
-        vertices, uvs, normals_from_file, faces, face_materials, mtllib = geo.parse_obj(obj_path, stop_check_callback)
+        vertices, uvs, face_v, face_vt, face_mat, material_names, mtllib = geo.parse_obj(obj_path, stop_check_callback)
         
         # --- 核心修改：调整处理顺序 ---
         # 2. 顶点焊接
         report_stage(ProcessingStage.PREPARING, "PY_WF_STEP1_WELD")
         logging.info(t("PY_WF_WELDING_VERTICES", count=len(vertices)))
-        vertices, faces = geo.weld_vertices(vertices, faces)
+        vertices, face_v, kept = geo.weld_vertices(vertices, face_v)
+        face_vt, face_mat = face_vt[kept], face_mat[kept]
         logging.info(t("PY_WF_WELDING_COMPLETE", count=len(vertices)))
 
         # 3. 过滤重复面（在焊接后！）
         report_stage(ProcessingStage.PREPARING, "PY_WF_STEP1_FILTER")
-        logging.info(t("PY_WF_FILTERING_FACES", count=len(faces)))
-        faces, face_materials = geo.filter_duplicate_faces(faces, face_materials)
-        logging.info(t("PY_WF_FILTERING_COMPLETE", count=len(faces)))
+        logging.info(t("PY_WF_FILTERING_FACES", count=len(face_v)))
+        kept = geo.filter_duplicate_faces(face_v)
+        face_v, face_vt, face_mat = face_v[kept], face_vt[kept], face_mat[kept]
+        logging.info(t("PY_WF_FILTERING_COMPLETE", count=len(face_v)))
 
         # 4. 计算法线并分组
         report_stage(ProcessingStage.PREPARING, "PY_WF_STEP1_GROUP")
-        normals_arr, valid_indices = geo.get_face_normals(vertices, faces, stop_check_callback)
+        normals_arr, valid_mask = geo.get_face_normals(vertices, face_v, stop_check_callback)
         
-        # 更新列表以匹配有效法线
-        faces = [faces[i] for i in valid_indices]
-        face_materials = [face_materials[i] for i in valid_indices]
+        # 更新面数组以匹配有效法线
+        face_v, face_vt, face_mat = face_v[valid_mask], face_vt[valid_mask], face_mat[valid_mask]
         
         # --- 核心修复：将可配置的容差传递给分组函数 ---
-        groups = geo.group_coplanar_faces(vertices, faces, normals_arr, stop_check_callback, angle_tol=angle_tol, dist_tol=dist_tol)
+        groups = geo.group_coplanar_faces(vertices, face_v, normals_arr, stop_check_callback, angle_tol=angle_tol, dist_tol=dist_tol)
 
         # 5. 计算所有表面的变换信息
         report_stage(ProcessingStage.PREPARING, "PY_WF_STEP2")
-        surfaces_info = geo.calculate_surface_transforms(vertices, faces, normals_arr, groups, voxel_size, stop_check_callback)
+        surfaces_info = geo.calculate_surface_transforms(vertices, face_v, normals_arr, groups, voxel_size, stop_check_callback)
         logging.info(t("PY_WF_FOUND_SURFACES", count=len(surfaces_info)))
 
-        # 6. 循环处理每个表面
+        # 6. 并行处理每个表面
         report_stage(ProcessingStage.PROCESSING_SURFACES, "PY_WF_STEP3")
-        xml_paths = []
         total_surfaces = len(surfaces_info)
         obj_src_dir = os.path.dirname(os.path.abspath(obj_path))
+        # --- 新增：MTL与纹理在本次处理中只准备一次，所有表面共享 ---
+        shared_mtl_name = geo.stage_shared_assets(mtllib, obj_src_dir, obj_path, temp_obj_dir)
+        worker_count = resolve_worker_count(max_workers)
+        logging.info(t("PY_WF_WORKER_POOL", workers=worker_count))
 
-        for i, surf in enumerate(surfaces_info):
-            if stop_check_callback and stop_check_callback(): raise RuntimeError(t("GUI_USER_STOPPED"))
-            logging.info(t("PY_WF_PROCESS_SURFACE", current=i+1, total=len(surfaces_info), name=surf['name']))
-            if progress_callback:
-                progress_callback(i + 1, total_surfaces)
-            
-            out_obj = os.path.join(temp_obj_dir, f"{surf['name']}.obj")
-            geo.export_single_surface_obj(
-                vertices, uvs, normals_from_file, faces, face_materials, 
-                surf['face_indices'], out_obj, mtllib, 
-                obj_src_dir, obj_path, normals_arr
-            )
+        # --- 新增：任一任务失败或用户中止时，通知所有正在运行的 polyvox 进程退出 ---
+        abort_event = threading.Event()
+        def job_stop_checker():
+            return abort_event.is_set() or bool(stop_check_callback and stop_check_callback())
+
+        # --- 新增：优先使用进程内的体素化库，网格数组直接传入，VOX与XML在内存中返回 ---
+        native_lib = native.load_library(polyvox_exe) if backend == "native" else None
+        in_process = bool(native_lib) or backend == "numpy"
+        # --- 新增：只有 polyvox 进程需要分批：每批由一个进程通过清单文件处理，材质与纹理只加载一次 ---
+        # 进程内的会话本身就在表面之间复用，每个表面单独提交，进度按表面更新
+        if in_process:
+            chunks = [[i] for i in range(total_surfaces)]
+        else:
+            chunk_size = max(1, min(MAX_SURFACES_PER_BATCH, -(-total_surfaces // worker_count)))
+            chunks = [list(range(start, min(start + chunk_size, total_surfaces)))
+                      for start in range(0, total_surfaces, chunk_size)]
+        # --- 新增：同时运行的任务数少于CPU核心数时，剩余核心分给每个任务内部的并行光栅化 ---
+        threads_per_process = max(1, (os.cpu_count() or 1) // max(1, min(worker_count, len(chunks))))
+
+        # --- 新增：每完成一个表面就更新进度（工作线程中调用，加锁保证计数与回调顺序一致） ---
+        progress_lock = threading.Lock()
+        completed = 0
+        def report_surfaces_done(count):
+            nonlocal completed
+            with progress_lock:
+                completed += count
+                if progress_callback:
+                    progress_callback(completed, total_surfaces)
+        # --- 新增：NumPy 会话可在线程间共享，材质与纹理只加载一次；采样与体素化共用，处理结束时在最外层的 finally 中关闭 ---
+        if backend == "numpy":
+            numpy_session = numpy_voxelizer.NumpySession(
+                voxel_size, material_maps=material_maps, material_properties=material_properties)
 
-            # --- 核心修改：所有 .vox 文件都直接生成在扁平的 vox_dir 中 ---
-            out_vox = os.path.join(vox_dir, f"{surf['name']}.vox")
-            tools.run_polyvox(
-                polyvox_exe, out_obj, out_vox, voxel_size, lang, 
+        manifest_dir = os.path.join(work_dir, "manifest")
+        os.makedirs(manifest_dir, exist_ok=True)
+
+        # 表面以二进制网格格式交给 polyvox 进程；全局调色板的采样阶段已导出的网格在体素化时直接复用
+        mesh_paths = [None] * total_surfaces
+        def export_surface_mesh(i):
+            if mesh_paths[i] is None:
+                surf = surfaces_info[i]
+                out_mesh = os.path.join(temp_obj_dir, f"{surf['name']}.pvm")
+                geo.export_single_surface_mesh(
+                    vertices, uvs, face_v, face_vt, face_mat, material_names,
+                    surf['face_indices'], out_mesh, shared_mtl_name,
+                    surf['obj_center'], surf['to_xy_matrix'],
+                    stop_check_callback=job_stop_checker
+                )
+                mesh_paths[i] = out_mesh
+            return mesh_paths[i]
+
+        # --- 新增：全局调色板：所有表面采样一次、每个材质量化一次，各表面只做光栅化 ---
+        # 采样总是由随后体素化的同一个后端完成（同一套纹理解码），调色板的重映射表才能与体素化时的颜色一致：
+        # 有体素化库时由 C++ 会话采样；NumPy 后端由 NumPy 会话采样；否则由一个 polyvox 进程以只采样模式完成
+        palette_file = None
+        if global_palette and total_surfaces:
+            report_stage(ProcessingStage.PREPARING, "PY_WF_STEP_PALETTE")
+            logging.info(t("PY_WF_STEP_PALETTE"))
+            palette_path = os.path.join(work_dir, "palette.json")
+            if native_lib:
+                sampler_options = tools.build_polyvox_options(
+                    voxel_size, lang, material_maps=material_maps, material_properties=material_properties,
+                    threads=os.cpu_count() or 1, texture_cache_dir=texture_cache_dir)
+                with native.NativeSession(native_lib, sampler_options) as sampler, \
+                        cancel_on_stop(sampler, stop_check_callback):
+                    collect_palette_samples(sampler, vertices, uvs, face_v, face_vt, face_mat, material_names,
+                                            surfaces_info, shared_mtl_name, temp_obj_dir, stop_check_callback)
+                    palette_built = sampler.save_palette(palette_path)
+            elif backend == "numpy":
+                collect_palette_samples(numpy_session, vertices, uvs, face_v, face_vt, face_mat, material_names,
+                                        surfaces_info, shared_mtl_name, temp_obj_dir, stop_check_callback)
+                palette_built = numpy_session.save_palette(palette_path)
+            else:
+                sample_meshes = [export_surface_mesh(i) for i in range(total_surfaces)]
+                palette_built = tools.run_polyvox_sample_palette(
+                    polyvox_exe, sample_meshes, os.path.join(manifest_dir, "palette_samples.json"), palette_path,
+                    voxel_size, lang, material_maps=material_maps, material_properties=material_properties,
+                    stop_checker=stop_check_callback, threads=os.cpu_count() or 1, texture_cache_dir=texture_cache_dir)
+            if palette_built:
+                palette_file = palette_path
+                logging.info(t("PY_WF_PALETTE_BUILT", path=palette_path.replace("\\", "/")))
+            else:
+                logging.warning(t("PY_WF_PALETTE_SKIPPED"))
+            report_stage(ProcessingStage.PROCESSING_SURFACES, "PY_WF_STEP3")
+
+        # 动态库会话每个工作线程各取一个；中止时逐个取消，正在运行的表面不必等到完成
+        sessions = queue.Queue()
+        native_sessions = []
+        if backend == "numpy":
+            logging.info(t("PY_NUMPY_BACKEND"))
+        elif native_lib:
+            logging.info(t("PY_NATIVE_BACKEND", path=native.library_path(polyvox_exe).replace("\\", "/")))
+            session_options = tools.build_polyvox_options(
+                voxel_size, lang, material_maps=material_maps, material_properties=material_properties,
+                threads=threads_per_process, texture_cache_dir=texture_cache_dir, palette_file=palette_file)
+            # 会话在主线程中创建，每个工作线程各取一个使用
+            for _ in range(min(worker_count, len(chunks))):
+                native_sessions.append(native.NativeSession(native_lib, session_options))
+                sessions.put(native_sessions[-1])
+
+        def voxelize_in_session(session, indices):
+            xml_results = []
+            for i in indices:
+                if job_stop_checker(): raise RuntimeError(t("GUI_USER_STOPPED"))
+                surf = surfaces_info[i]
+                logging.info(t("PY_WF_PROCESS_SURFACE", current=i+1, total=total_surfaces, name=surf['name']))
+
+                mesh = geo.build_surface_mesh_arrays(
+                    vertices, uvs, face_v, face_vt, face_mat, material_names,
+                    surf['face_indices'], surf['obj_center'], surf['to_xy_matrix']
+                )
+                vox_name = f"{surf['name']}.vox"
+                vox_bytes, xml_text = session.voxelize(
+                    mesh, shared_mtl_name, temp_obj_dir, vox_name, surf["center"], surf["normal_euler_deg"])
+
+                with open(os.path.join(vox_dir, vox_name), 'wb') as f:
+                    f.write(vox_bytes)
+                final_xml_path = os.path.join(xml_dir, f"{surf['name']}.xml")
+                with open(final_xml_path, 'w', encoding='utf-8') as f:
+                    f.write(xml_text)
+                xml_results.append(final_xml_path)
+                report_surfaces_done(1)
+            return xml_results
+
+        def process_chunk_in_process(chunk_index, indices):
+            if numpy_session is not None:
+                return voxelize_in_session(numpy_session, indices)
+            session = sessions.get()
+            try:
+                return voxelize_in_session(session, indices)
+            finally:
+                sessions.put(session)
+
+        def process_chunk_with_process(chunk_index, indices):
+            if job_stop_checker(): raise RuntimeError(t("GUI_USER_STOPPED"))
+            jobs = []
+            for i in indices:
+                surf = surfaces_info[i]
+                logging.info(t("PY_WF_PROCESS_SURFACE", current=i+1, total=total_surfaces, name=surf['name']))
+
+                # --- 修改：表面以二进制网格格式交给 polyvox，省去OBJ文本的格式化与解析 ---
+                out_mesh = export_surface_mesh(i)
+
+                # --- 核心修改：所有 .vox 文件都直接生成在扁平的 vox_dir 中 ---
+                out_vox = os.path.join(vox_dir, f"{surf['name']}.vox")
+                jobs.append({"obj": out_mesh, "vox": out_vox, "pos": surf["center"], "rot": surf["normal_euler_deg"]})
+
+            # polyvox 在每个表面完成时写出其XML，据此按表面更新进度
+            reported = set()
+            def report_finished_jobs():
+                for i, job in zip(indices, jobs):
+                    if i not in reported and os.path.exists(os.path.splitext(job["vox"])[0] + ".xml"):
+                        reported.add(i)
+                        report_surfaces_done(1)
+
+            # 变换信息随清单传入，polyvox 直接写入 group 节点
+            tools.run_polyvox_batch(
+                polyvox_exe, jobs, os.path.join(manifest_dir, f"batch_{chunk_index}.json"),
+                voxel_size, lang, 
                 material_maps=material_maps, 
                 material_properties=material_properties,
-                stop_checker=stop_check_callback
+                stop_checker=job_stop_checker,
+                threads=threads_per_process,
+                texture_cache_dir=texture_cache_dir,
+                palette_file=palette_file,
+                wait_callback=report_finished_jobs
             )
+            report_finished_jobs()
 
-            # --- 核心修改：临时XML也从扁平的 vox_dir 中移动 ---
-            temp_xml_path = os.path.splitext(out_vox)[0] + ".xml"
-            final_xml_path = os.path.join(xml_dir, f"{surf['name']}.xml")
-            
-            if os.path.exists(temp_xml_path):
-                shutil.move(temp_xml_path, final_xml_path)
-            else:
-                logging.error(t("PY_TOOL_XML_NOT_FOUND", path=temp_xml_path))
-                continue
+            xml_results = []
+            for i, job in zip(indices, jobs):
+                # --- 核心修改：临时XML也从扁平的 vox_dir 中移动 ---
+                temp_xml_path = os.path.splitext(job["vox"])[0] + ".xml"
+                final_xml_path = os.path.join(xml_dir, f"{surfaces_info[i]['name']}.xml")
+                
+                if os.path.exists(temp_xml_path):
+                    shutil.move(temp_xml_path, final_xml_path)
+                    xml_results.append(final_xml_path)
+                else:
+                    logging.error(t("PY_TOOL_XML_NOT_FOUND", path=temp_xml_path))
+                    xml_results.append(None)
+            return xml_results
+
+        process_chunk = process_chunk_in_process if in_process else process_chunk_with_process
+
+        # 结果按表面序号存放，保证合并后的XML顺序与串行处理时一致
+        results = [None] * total_surfaces
+        try:
+            with ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix="polyvox_surface") as pool:
+                pending = {pool.submit(process_chunk, c, indices): indices for c, indices in enumerate(chunks)}
+                try:
+                    while pending:
+                        if stop_check_callback and stop_check_callback(): raise RuntimeError(t("GUI_USER_STOPPED"))
+                        done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            indices = pending.pop(future)
+                            for i, xml_path in zip(indices, future.result()): # 重新抛出任务中的异常
+                                results[i] = xml_path
+                except BaseException:
+                    # 取消尚未开始的任务，并让正在运行的任务尽快终止其子进程或取消其会话
+                    abort_event.set()
+                    for session in native_sessions:
+                        session.cancel()
+                    for future in pending:
+                        future.cancel()
+                    raise
+        finally:
+            # 线程池退出时所有任务都已结束，不再有线程使用这些会话
+            for session in native_sessions:
+                session.close()
 
-            tools.update_group_transform(final_xml_path, surf["center"], surf["normal_euler_deg"])
-            xml_paths.append(final_xml_path)
+        xml_paths = [p for p in results if p]
         
         # 4. 合并XML
         report_stage(ProcessingStage.MERGING, "PY_WF_STEP4")
@@ -218,6 +466,8 @@ def process_model(obj_path, out_dir, polyvox_exe, voxel_size, lang,
         logging.info(t("PY_WF_COMPLETE", path=out_dir.replace("\\", "/")))
 
     finally:
+        if numpy_session is not None:
+            numpy_session.close()
         # --- 无论成功、失败还是中止，都清理临时工作目录 ---
         shutil.rmtree(work_dir)
         msg = t("PY_CLEANUP_TEMP_DIR", dir=work_dir.replace("\\", "/"))
@@ -230,13 +480,19 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="Unified Polyvox Workflow")
     parser.add_argument("--obj", "-o", required=True, help="Input OBJ model path")
-    parser.add_argument("--polyvox", "-p", required=True, help="polyvox.exe path")
+    parser.add_argument("--polyvox", "-p", help="polyvox.exe path (required by the native backend)")
     parser.add_argument("--outdir", "-d", required=True, help="Output directory")
     parser.add_argument("--voxel-size", "-s", type=float, default=0.1, help="Voxel size for processing")
     parser.add_argument("--lang", "-l", default="en", choices=['en', 'zh'], help="Language for log messages (en/zh)")
+    parser.add_argument("--workers", "-j", type=int, default=0, help="Number of surfaces voxelized in parallel (0 = all CPU cores)")
+    parser.add_argument("--backend", "-b", default="native", choices=BACKENDS, help="Voxelization backend (native = polyvox, numpy = pure NumPy)")
+    parser.add_argument("--per-surface-palette", action="store_true", help="Quantize every surface separately instead of building one model-wide palette")
     args = parser.parse_args()
+    if args.backend == "native" and not args.polyvox:
+        parser.error("--polyvox is required by the native backend")
 
     # 初始化多语言环境
     load_translations(args.lang)
 
-    process_model(args.obj, args.outdir, args.polyvox, args.voxel_size, args.lang)
+    process_model(args.obj, args.outdir, args.polyvox, args.voxel_size, args.lang, max_workers=args.workers, backend=args.backend,
+                  global_palette=not args.per_surface_palette)
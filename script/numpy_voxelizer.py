@@ -0,0 +1,1204 @@
+"""
+纯 NumPy 的参考体素化后端：算法与 C++ 核心（src/voxelizer.cpp）一致，输出相同布局的 .vox 与 group XML。
+不需要 polyvox 可执行文件或动态库，可在无法运行 polyvox 的平台上于进程内体素化，也可作为对照基准。
+接口与 polyvox_native.NativeSession 相同：输入 geometry_processor.build_surface_mesh_arrays 返回的网格数组，
+返回 (VOX文件内容 bytes, XML文本 str)。
+
+浮点运算与 C++ 一样使用 float32，计算顺序保持一致；纹理通过 Qt（PySide6）解码。
+"""
+import json
+import logging
+import math
+import os
+import struct
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from localization import t
+from geometry_processor import PVM_NO_UV, PVM_NO_MATERIAL
+
+f32 = np.float32
+
+EDGE_OFFSET_MULTIPLIER = f32(0.25)  # 边界体素条沿外法线的偏移量乘数
+TRIM_EPSILON = f32(0.03)            # 修剪阶段的容忍误差
+MAX_VOX_SIZE = 256                  # VOX 格式的尺寸限制
+
+# 调色板：0 透明，1-8 车辆灯光，254-255 Hole，可用索引为 9..253
+FIRST_PALETTE_INDEX = 9
+LAST_PALETTE_INDEX = 253
+# 每个材质至少占8个槽位，超过这个数量的材质无法放进同一个调色板
+MAX_PALETTE_MATERIALS = (LAST_PALETTE_INDEX - FIRST_PALETTE_INDEX + 1) // 8
+PALETTE_FILE_VERSION = 1
+MAGENTA = 0xFF00FF
+
+# ogt_vox 材质类型与属性标志
+MATL_DIFFUSE, MATL_METAL, MATL_GLASS, MATL_EMIT = 0, 1, 2, 3
+_MATL_TYPE_NAMES = ["_diffuse", "_metal", "_glass", "_emit", "_blend", "_media"]
+# (属性名, 标志位)，顺序与 ogt_vox_write_scene 写出 MATL 的顺序一致
+_MATL_FIELDS = [("metal", 1 << 0), ("rough", 1 << 1), ("spec", 1 << 2), ("ior", 1 << 3), ("att", 1 << 4),
+                ("flux", 1 << 5), ("emit", 1 << 6), ("ldr", 1 << 7), ("trans", 1 << 8), ("alpha", 1 << 9),
+                ("d", 1 << 10), ("sp", 1 << 11), ("g", 1 << 12), ("media", 1 << 13)]
+_MATL_FLAG = dict(_MATL_FIELDS)
+
+# 修剪与光栅化时每批生成的 (面/边, 体素单元) 候选对数量上限
+PAIR_BATCH_SIZE = 1 << 22
+
+
+def _byte_order(name):
+    """与 C++ std::map<std::string, ...> 相同的键顺序（按UTF-8字节比较）。"""
+    return name.encode('utf-8')
+
+def _pack_colors(rgb):
+    rgb = rgb.astype(np.uint32)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+def _unpack_colors(colors):
+    colors = np.asarray(colors, dtype=np.uint32)
+    return np.stack([(colors >> 16) & 0xFF, (colors >> 8) & 0xFF, colors & 0xFF], axis=-1)
+
+def _kd_color(kd):
+    """MTL漫反射色转换为打包的RGB（与C++相同：乘以255后截断到 [0, 255]）。"""
+    return int(_pack_colors(np.clip(kd * f32(255.0), f32(0.0), f32(255.0)).astype(np.uint8)))
+
+
+# ---------------------------------------------------------------------------
+# MTL 解析与材质分类
+# ---------------------------------------------------------------------------
+
+def _read_floats(tokens, current):
+    """按 C++ 流提取的语义读取若干浮点数：第一个无法解析的值置0，其后的值保持不变。"""
+    values = list(current)
+    for i in range(len(values)):
+        if i >= len(tokens):
+            break
+        try:
+            values[i] = f32(float(tokens[i]))
+        except ValueError:
+            values[i] = f32(0.0)
+            break
+    return values
+
+def _new_material(name):
+    return {"name": name, "diffuse_map": "",
+            "Kd": np.ones(3, dtype=f32), "Ks": np.zeros(3, dtype=f32), "Ns": f32(10.0),
+            "d": f32(1.0), "Ke": np.zeros(3, dtype=f32), "Ni": f32(1.0)}
+
+def parse_mtl_file(mtl_path):
+    """解析MTL文件，返回 {材质名: 材质}；文件无法打开时返回 None。"""
+    try:
+        with open(mtl_path, 'r', encoding='utf-8', errors='replace') as f:
+            lines = f.read().split('\n')
+    except OSError:
+        return None
+
+    materials = {}
+    current = None
+    for line in lines:
+        tokens = line.split()
+        if not tokens:
+            continue
+        token = tokens[0]
+        if token == "newmtl":
+            if current is not None:
+                materials[current["name"]] = current
+            current = _new_material(tokens[1] if len(tokens) > 1 else "")
+        elif current is None:
+            continue
+        elif token == "map_Kd":
+            parts = line.strip(" \t\r\n").split(None, 1)
+            current["diffuse_map"] = parts[1].strip(" \t\r\n") if len(parts) > 1 else ""
+        elif token in ("Kd", "Ks", "Ke"):
+            current[token] = np.array(_read_floats(tokens[1:], current[token]), dtype=f32)
+        elif token in ("Ns", "d", "Ni"):
+            current[token] = _read_floats(tokens[1:], [current[token]])[0]
+    if current is not None:
+        materials[current["name"]] = current
+    return materials
+
+def _split_option(value):
+    """与 C++ 中按 ':' 循环 getline 的结果一致（末尾的空段不计入）。"""
+    parts = value.split(':')
+    if parts and parts[-1] == "":
+        parts.pop()
+    return parts
+
+def _new_matl():
+    matl = {name: f32(0.0) for name, _ in _MATL_FIELDS}
+    matl["type"] = MATL_DIFFUSE
+    matl["flags"] = 0
+    return matl
+
+def _set_matl(matl, name, value):
+    matl[name] = f32(value)
+    matl["flags"] |= _MATL_FLAG[name]
+
+def classify_materials(mtl_materials, material_maps, material_properties):
+    """
+    材质分类，与 C++ classify_materials 相同：-m 映射与 -p 属性优先，其余根据MTL数据与材质名推断。
+    返回 {材质名: {"td_note": Teardown物理标签, "matl": MagicaVoxel材质}}，包含无材质面使用的 "" 项。
+    """
+    custom_td_notes, custom_vox_types = {}, {}
+    for map_str in material_maps or []:
+        parts = _split_option(map_str)
+        if len(parts) >= 2:
+            custom_td_notes[parts[0]] = parts[1]
+            if len(parts) >= 3:
+                custom_vox_types[parts[0]] = parts[2]
+
+    custom_properties = {}
+    for prop_str in material_properties or []:
+        parts = _split_option(prop_str)
+        if len(parts) == 3:
+            try:
+                custom_properties.setdefault(parts[0], {})[parts[1]] = f32(float(parts[2]))
+            except ValueError:
+                logging.warning("Invalid property value: " + parts[2])
+
+    profiles = {}
+    for mtl_name, mtl in mtl_materials.items():
+        matl = _new_matl()
+
+        # 1. 用户通过 -p 指定的属性
+        for prop_name, prop_value in custom_properties.get(mtl_name, {}).items():
+            if prop_name == "trans":
+                _set_matl(matl, "trans", prop_value)
+                _set_matl(matl, "alpha", f32(1.0) - prop_value)
+            elif prop_name == "emission":
+                _set_matl(matl, "emit", prop_value)
+            elif prop_name == "power":
+                _set_matl(matl, "flux", prop_value)
+            elif prop_name in ("rough", "spec", "ior", "ldr", "metal"):
+                _set_matl(matl, prop_name, prop_value)
+
+        # 2. TD Note 与 VOX 渲染类型
+        custom_note = custom_td_notes.get(mtl_name)
+        if custom_note is not None and custom_note != "$TD_auto":
+            td_note = custom_note
+            vox_type = custom_vox_types.get(mtl_name)
+            if vox_type is not None:
+                matl["type"] = {"glass": MATL_GLASS, "metal": MATL_METAL, "emit": MATL_EMIT}.get(vox_type, MATL_DIFFUSE)
+            else:
+                matl["type"] = {"$TD_glass": MATL_GLASS, "$TD_metal": MATL_METAL}.get(td_note, MATL_DIFFUSE)
+        else:
+            lower_name = _byte_order(mtl_name).lower()
+            flags = matl["flags"]
+            if flags & _MATL_FLAG["emit"] and matl["emit"] > 0.0:
+                matl["type"] = MATL_EMIT
+            elif mtl["d"] < f32(0.9) or (flags & _MATL_FLAG["trans"] and matl["trans"] > 0.0):
+                matl["type"] = MATL_GLASS
+            elif flags & _MATL_FLAG["metal"] and matl["metal"] > f32(0.5):
+                matl["type"] = MATL_METAL
+            else:
+                matl["type"] = MATL_DIFFUSE
+
+            if matl["type"] == MATL_GLASS:
+                td_note = "$TD_glass"
+            elif matl["type"] == MATL_METAL or b"metal" in lower_name:
+                td_note = "$TD_metal"
+            elif b"wood" in lower_name:
+                td_note = "$TD_wood"
+            elif b"brick" in lower_name or b"concrete" in lower_name:
+                td_note = "$TD_masonry"
+            elif b"vegetation" in lower_name:
+                td_note = "$TD_foliage"
+            elif b"carpet" in lower_name:
+                td_note = "$TD_plastic"
+            else:
+                td_note = "$TD_metal"
+
+        # 3. 未被用户覆盖的属性取MTL中的值
+        if not matl["flags"] & _MATL_FLAG["rough"]:
+            _set_matl(matl, "rough", max(f32(0.001), f32(1.0) - mtl["Ns"] / f32(1000.0)))
+        if not matl["flags"] & _MATL_FLAG["spec"]:
+            matl["spec"] = (mtl["Ks"][0] + mtl["Ks"][1] + mtl["Ks"][2]) / f32(3.0)
+            if matl["spec"] > 0.0: matl["flags"] |= _MATL_FLAG["spec"]
+        if not matl["flags"] & _MATL_FLAG["ior"]:
+            _set_matl(matl, "ior", mtl["Ni"])
+        if not matl["flags"] & _MATL_FLAG["alpha"]:
+            matl["alpha"] = mtl["d"]
+            if matl["alpha"] < 1.0: matl["flags"] |= _MATL_FLAG["alpha"]
+        if not matl["flags"] & _MATL_FLAG["trans"] and matl["type"] == MATL_GLASS:
+            _set_matl(matl, "trans", f32(1.0) - matl["alpha"])
+        if not matl["flags"] & _MATL_FLAG["emit"]:
+            matl["emit"] = (mtl["Ke"][0] + mtl["Ke"][1] + mtl["Ke"][2]) / f32(3.0)
+            if matl["emit"] > 0.0: matl["flags"] |= _MATL_FLAG["emit"]
+        if not matl["flags"] & _MATL_FLAG["flux"] and matl["flags"] & _MATL_FLAG["emit"]:
+            _set_matl(matl, "flux", matl["emit"] * f32(4.0))
+
+        profiles[mtl_name] = {"td_note": td_note, "matl": matl}
+
+    # 无材质的面使用的默认项
+    default_matl = _new_matl()
+    _set_matl(default_matl, "rough", 0.8)
+    profiles[""] = {"td_note": "", "matl": default_matl}
+    return profiles
+
+
+# ---------------------------------------------------------------------------
+# 纹理
+# ---------------------------------------------------------------------------
+
+def texture_decoder_available():
+    """纹理通过 Qt（PySide6）的 QImage 解码，不需要显示设备；未安装 PySide6 时返回 False。"""
+    try:
+        from PySide6.QtGui import QImage  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def load_texture_rgba(path):
+    """解码纹理图片为 (高, 宽, 4) 的 RGBA uint8 数组，无法解码时返回 None。"""
+    from PySide6.QtGui import QImage
+    image = QImage(path)
+    if image.isNull():
+        return None
+    image = image.convertToFormat(QImage.Format.Format_RGBA8888)
+    width, height = image.width(), image.height()
+    pixels = np.frombuffer(image.constBits(), dtype=np.uint8, count=image.sizeInBytes())
+    return pixels.reshape(height, image.bytesPerLine())[:, :width * 4].reshape(height, width, 4).copy()
+
+def sample_colors(material_ids, u, v, w, corner_uvs, material_table):
+    """
+    按重心坐标采样颜色，与 C++ get_voxel_color_and_note 相同。
+    material_ids: 每个采样点的局部材质编号（-1 为无材质）；corner_uvs: (N, 3, 2) 三个角的UV。
+    没有MTL材质的点为洋红色；纹理缺失或像素透明时使用MTL漫反射色。
+    """
+    colors = np.full(len(material_ids), MAGENTA, dtype=np.uint32)
+    for m, entry in enumerate(material_table):
+        if entry["mtl"] is None:
+            continue
+        rows = np.flatnonzero(material_ids == m)
+        if len(rows) == 0:
+            continue
+        colors[rows] = entry["kd_color"]
+        texture = entry["texture"]
+        if texture is None:
+            continue
+        uvs = corner_uvs[rows]
+        uu, vv, ww = u[rows], v[rows], w[rows]
+        tex_u = uu * uvs[:, 0, 0] + vv * uvs[:, 1, 0] + ww * uvs[:, 2, 0]
+        tex_v = uu * uvs[:, 0, 1] + vv * uvs[:, 1, 1] + ww * uvs[:, 2, 1]
+        tex_u = np.fmod(tex_u, f32(1.0)); tex_u[tex_u < 0] += f32(1.0)
+        tex_v = np.fmod(tex_v, f32(1.0)); tex_v[tex_v < 0] += f32(1.0)
+        height, width = texture.shape[:2]
+        tx = np.clip((tex_u * f32(width - 1)).astype(np.int32), 0, width - 1)
+        ty = np.clip(((f32(1.0) - tex_v) * f32(height - 1)).astype(np.int32), 0, height - 1)
+        pixels = texture[ty, tx]
+        opaque = pixels[:, 3] > 128
+        colors[rows[opaque]] = _pack_colors(pixels[opaque, :3])
+    return colors
+
+
+# ---------------------------------------------------------------------------
+# 调色板量化
+# ---------------------------------------------------------------------------
+
+def _color_distance(colors, centers):
+    """感知加权颜色距离，与 C++ color_distance 的计算顺序相同（双精度计算后转为 float32）。"""
+    diff = _unpack_colors(colors).astype(np.int64) - _unpack_colors(centers).astype(np.int64)
+    sq = diff * diff
+    return (sq[..., 0] * 0.3 + sq[..., 1] * 0.59 + sq[..., 2] * 0.11).astype(f32)
+
+def _nearest_center_exhaustive(colors, centers):
+    result = np.empty(len(colors), dtype=np.int64)
+    step = max(1, (1 << 20) // max(1, len(centers)))
+    for start in range(0, len(colors), step):
+        result[start:start + step] = np.argmin(_color_distance(colors[start:start + step, None], centers[None, :]), axis=1)
+    return result
+
+# kd树在按通道权重缩放后的RGB空间中查找最近中心（欧氏距离的平方即感知加权距离）
+_CHANNEL_SCALE = np.sqrt([0.3, 0.59, 0.11])
+_KD_CANDIDATES = 4
+
+def _nearest_center(colors, centers):
+    """
+    每个颜色最近的聚类中心序号（感知加权距离，距离相同时取序号最小者，与 CenterKdTree::nearest 一致）。
+    kd树给出几个最近的候选中心，再按 float32 距离精确比较；候选中可能遗漏距离相同的中心时逐个比较。
+    """
+    if len(centers) <= _KD_CANDIDATES:
+        return _nearest_center_exhaustive(colors, centers)
+    tree = cKDTree(_unpack_colors(centers) * _CHANNEL_SCALE)
+    _, candidates = tree.query(_unpack_colors(colors) * _CHANNEL_SCALE, k=_KD_CANDIDATES)
+    dist = _color_distance(colors[:, None], centers[candidates])
+    best = dist.min(axis=1)
+    result = np.where(dist == best[:, None], candidates, len(centers)).min(axis=1)
+    ambiguous = np.flatnonzero(dist.max(axis=1) == best)
+    if len(ambiguous):
+        result[ambiguous] = _nearest_center_exhaustive(colors[ambiguous], centers)
+    return result
+
+def kmeans_colors(colors, counts, k, max_iter=10):
+    """
+    与 ColorQuantizer::kmeans 相同的加权K-Means：colors 为升序去重的打包颜色，counts 为各颜色的采样次数。
+    """
+    n = len(colors)
+    if n <= k:
+        return colors.copy()
+    centers = colors[(np.arange(k, dtype=np.int64) * n) // k].copy()
+    rgb = _unpack_colors(colors).astype(np.float64) * counts[:, None]
+    for _ in range(max_iter):
+        labels = _nearest_center(colors, centers)
+        weights = np.bincount(labels, weights=counts, minlength=k).astype(np.int64)
+        filled = weights > 0
+        sums = np.stack([np.bincount(labels, weights=rgb[:, c], minlength=k) for c in range(3)], axis=-1)
+        means = (sums[filled].astype(np.int64) // weights[filled, None])
+        new_centers = _pack_colors(means)
+        if np.array_equal(new_centers, centers[filled]):
+            break
+        centers[filled] = new_centers
+    return centers
+
+class Palette:
+    """
+    与 C++ PaletteManager 相同的调色板：按材质分配调色板槽位并分别量化。
+    samples: {材质名: 打包颜色数组}，材质按名称字节序处理。
+    fixed 为 True 时作为全局调色板使用：不在重映射表中的颜色取所属材质最近的聚类中心。
+    """
+
+    def __init__(self, samples, profiles, mtl_materials):
+        self.colors = np.zeros((256, 4), dtype=np.uint8)
+        self.notes = {}
+        self.materials = {}
+        self.fixed = False
+        self._tables = {}   # 材质名 -> (升序颜色, 调色板索引)
+        self._centers = {}  # 材质名 -> (聚类中心颜色, 调色板索引)，按分配顺序
+        self._fallback = (np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint8))
+
+        samples = {name: c for name, c in samples.items() if len(c)} or self._fallback_samples(profiles, mtl_materials)
+        # 每个材质的采样汇总为加权颜色直方图：(升序颜色, 采样次数)
+        histograms = {name: np.unique(np.asarray(c, dtype=np.uint32), return_counts=True) for name, c in samples.items()}
+        unique = {name: colors for name, (colors, _) in histograms.items()}
+
+        total_slots = LAST_PALETTE_INDEX - FIRST_PALETTE_INDEX + 1
+        order = sorted(unique, key=_byte_order)
+        total_unique = sum(len(unique[name]) for name in order)
+        slots = {}
+        for name in order:
+            proportion = f32(len(unique[name])) / f32(total_unique) if total_unique > 0 else f32(0.0)
+            allocated = max(1, int(proportion * f32(total_slots)))
+            if allocated % 8:
+                allocated = (allocated // 8 + 1) * 8
+            slots[name] = allocated
+        assigned = sum(slots.values())
+        if assigned < total_slots and order:
+            remain, idx = total_slots - assigned, 0
+            while remain > 0:
+                slots[order[idx % len(order)]] += 8
+                remain -= 8
+                idx += 1
+        elif assigned > total_slots:
+            over = assigned - total_slots
+            while over > 0 and order:
+                changed = False
+                for name in order:
+                    if slots[name] > 8 and over > 0:
+                        slots[name] -= 8
+                        over -= 8
+                        changed = True
+                if not changed:
+                    break
+
+        index = FIRST_PALETTE_INDEX
+        self._order = order
+        for name in order:
+            colors = unique[name]
+            centers = kmeans_colors(colors, histograms[name][1], slots[name])
+            profile = profiles.get(name)
+            center_index = {}
+            assigned = []
+            for center in centers.tolist():
+                if index > LAST_PALETTE_INDEX:
+                    logging.error(t("PALETTE_INDEX_OUT_OF_RANGE"))
+                    break
+                if profile is not None:
+                    self.notes[index] = profile["td_note"]
+                    self.materials[index] = profile["matl"]
+                self.colors[index] = (*_unpack_colors(center).tolist(), 255)
+                center_index[center] = index  # 中心颜色重复时与C++一样由后者覆盖
+                assigned.append((center, index))
+                index += 1
+            self._centers[name] = (np.array([c for c, _ in assigned], dtype=np.uint32),
+                                   np.array([i for _, i in assigned], dtype=np.uint8))
+
+            # 一次分配求出每个颜色最近的中心，直接建立重映射表
+            index_of_center = np.array([center_index.get(c, 0) for c in centers.tolist()], dtype=np.uint8)
+            mapped = index_of_center[_nearest_center(colors, centers)]
+            keep = mapped != 0
+            self._tables[name] = (colors[keep], mapped[keep])
+
+        # 按颜色的兜底表：材质按名称顺序，同一颜色取第一个材质中的索引
+        if self._tables:
+            keys = np.concatenate([self._tables[name][0] for name in order if name in self._tables])
+            values = np.concatenate([self._tables[name][1] for name in order if name in self._tables])
+            keys, first = np.unique(keys, return_index=True)
+            self._fallback = (keys, values[first])
+
+    @staticmethod
+    def _fallback_samples(profiles, mtl_materials):
+        """采样池为空时的兜底：有MTL时使用各材质的漫反射色，否则使用洋红色（与C++相同，以物理标签为键）。"""
+        logging.warning(t("SAMPLE_POOL_EMPTY"))
+        samples = {}
+        if any(name != "" for name in profiles):
+            for name in sorted(profiles, key=_byte_order):
+                if name == "":
+                    continue
+                mtl = mtl_materials.get(name)
+                color = _kd_color(mtl["Kd"]) if mtl is not None else 0xC8C8C8
+                samples.setdefault(profiles[name]["td_note"], []).append(color)
+        if not samples:
+            samples[""] = [MAGENTA] * 32
+        return {name: np.array(c, dtype=np.uint32) for name, c in samples.items()}
+
+    @staticmethod
+    def _lookup(table, colors):
+        keys, values = table
+        result = np.zeros(len(colors), dtype=np.uint8)
+        if len(keys) == 0:
+            return result, np.zeros(len(colors), dtype=bool)
+        pos = np.minimum(np.searchsorted(keys, colors), len(keys) - 1)
+        found = keys[pos] == colors
+        result[found] = values[pos[found]]
+        return result, found
+
+    def final_indices(self, colors, material_names):
+        """
+        颜色在最终调色板中的索引，与 C++ get_final_index 相同：
+        优先精确匹配 (颜色, 材质)；全局调色板再取所属材质最近的聚类中心；否则按颜色匹配任意材质，都找不到时为0。
+        material_names: (ids, names)，ids 为与 colors 等长的局部材质编号，names 为编号到材质名的列表。
+        """
+        ids, names = material_names
+        result = np.zeros(len(colors), dtype=np.uint8)
+        found = np.zeros(len(colors), dtype=bool)
+        for m, name in enumerate(names):
+            rows = np.flatnonzero(ids == m)
+            if len(rows) and name in self._tables:
+                result[rows], found[rows] = self._lookup(self._tables[name], colors[rows])
+                centers, indices = self._centers[name]
+                misses = rows[~found[rows]]
+                if self.fixed and len(misses) and len(centers):
+                    result[misses] = indices[_nearest_center(colors[misses], centers)]
+                    found[misses] = True
+        missing = np.flatnonzero(~found)
+        if len(missing):
+            result[missing] = self._lookup(self._fallback, colors[missing])[0]
+        return result
+
+    def to_json(self):
+        """
+        全局调色板文件的内容（polyvox --palette）：按材质名顺序列出各材质的聚类中心与调色板索引，以及原始颜色的重映射表。
+        物理标签与渲染材质由 polyvox 根据MTL分类结果按材质名补全。
+        """
+        materials = []
+        for name in self._order:
+            if name not in self._tables:
+                continue
+            centers, indices = self._centers[name]
+            colors, color_indices = self._tables[name]
+            materials.append({"name": name, "centers": centers.tolist(), "indices": indices.tolist(),
+                              "colors": colors.tolist(), "color_indices": color_indices.tolist()})
+        return {"version": PALETTE_FILE_VERSION, "materials": materials}
+
+
+# ---------------------------------------------------------------------------
+# 几何
+# ---------------------------------------------------------------------------
+
+def _cell_centers(grid_min, count, voxel_size):
+    """体素单元中心坐标，与 C++ voxel_cell_center 的计算顺序相同。"""
+    cell_min = grid_min + np.arange(count, dtype=f32) * voxel_size
+    return (cell_min + (cell_min + voxel_size)) * f32(0.5)
+
+def _strip_length(length, voxel_size):
+    return max(1, int(np.floor(f32(length) / voxel_size)))
+
+def _strip_placement(lengths, voxel_size):
+    """体素条长度（取 floor/ceil 中误差较小者）及其相对原边中点的平移，与 calc_voxel_strip_placement 相同。"""
+    ratio = lengths / voxel_size
+    n_floor = np.floor(ratio).astype(np.int64)
+    n_ceil = np.ceil(ratio).astype(np.int64)
+    err_floor = lengths - n_floor.astype(f32) * voxel_size
+    err_ceil = n_ceil.astype(f32) * voxel_size - lengths
+    n = np.maximum(np.where(err_ceil < err_floor, n_ceil, n_floor), 1)
+    offset = (n.astype(f32) * voxel_size - lengths) / f32(2.0)
+    return n, offset
+
+def _range_pairs(lo, hi):
+    """对每个区间 [lo, hi) 展开：返回 (区间序号, 区间内的值)。"""
+    counts = np.maximum(hi - lo, 0)
+    owner = np.repeat(np.arange(len(lo)), counts)
+    starts = np.cumsum(counts) - counts
+    values = np.arange(counts.sum(), dtype=np.int64) - np.repeat(starts - lo, counts)
+    return owner, values
+
+def _batches(counts, limit=PAIR_BATCH_SIZE):
+    """把若干项按候选对数量切分为批次，返回 (起始, 结束) 序号。"""
+    bounds = np.cumsum(counts)
+    start, batches = 0, []
+    while start < len(counts):
+        base = bounds[start - 1] if start else 0
+        end = max(start + 1, int(np.searchsorted(bounds, base + limit, side='right')))
+        batches.append((start, end))
+        start = end
+    return batches
+
+def _normalized_xy(dx, dy):
+    length = np.sqrt(dx * dx + dy * dy)
+    scale = length > f32(1e-6)
+    nx = np.where(scale, dx / np.where(scale, length, f32(1.0)), dx)
+    ny = np.where(scale, dy / np.where(scale, length, f32(1.0)), dy)
+    return nx, ny
+
+def _face_is_ccw(positions, faces):
+    """面在XY平面上是否为逆时针（与 C++ is_face_ccw 相同的累加顺序）。"""
+    area = np.zeros(len(faces), dtype=f32)
+    for i in range(3):
+        v0 = positions[faces[:, i]]
+        v1 = positions[faces[:, (i + 1) % 3]]
+        area = area + (v1[:, 0] - v0[:, 0]) * (v1[:, 1] + v0[:, 1])
+    return area < 0.0
+
+def rasterize_faces(positions, faces, cx, cy):
+    """
+    以体素单元中心对三角形做向量化的重心坐标测试。
+    每个单元取序号最小的命中面（与 C++ 逐面扫描的结果一致），返回 (命中面[H, W]，-1 为未命中, u, v, w)。
+    """
+    height, width = len(cy), len(cx)
+    hit_face = np.full(height * width, -1, dtype=np.int64)
+    bary = np.zeros((height * width, 3), dtype=f32)
+    if len(faces) == 0:
+        return hit_face.reshape(height, width), bary
+
+    a, b, c = positions[faces[:, 0]], positions[faces[:, 1]], positions[faces[:, 2]]
+    x0, y0 = a[:, 0], a[:, 1]
+    v0x, v0y = b[:, 0] - x0, b[:, 1] - y0
+    v1x, v1y = c[:, 0] - x0, c[:, 1] - y0
+    d00 = v0x * v0x + v0y * v0y
+    d01 = v0x * v1x + v0y * v1y
+    d11 = v1x * v1x + v1y * v1y
+    denom = d00 * d11 - d01 * d01
+    valid = np.abs(denom.astype(np.float64)) >= 1e-6
+
+    # 包围盒略微外扩以覆盖重心坐标测试的容差
+    bx0 = np.minimum(np.minimum(a[:, 0], b[:, 0]), c[:, 0]); bx1 = np.maximum(np.maximum(a[:, 0], b[:, 0]), c[:, 0])
+    by0 = np.minimum(np.minimum(a[:, 1], b[:, 1]), c[:, 1]); by1 = np.maximum(np.maximum(a[:, 1], b[:, 1]), c[:, 1])
+    pad = (np.maximum(bx1 - bx0, by1 - by0) + f32(1.0)) * f32(1e-4)
+    gx0 = np.searchsorted(cx, bx0 - pad, side='left'); gx1 = np.searchsorted(cx, bx1 + pad, side='right')
+    gy0 = np.searchsorted(cy, by0 - pad, side='left'); gy1 = np.searchsorted(cy, by1 + pad, side='right')
+    span_x = np.maximum(gx1 - gx0, 0)
+    counts = np.where(valid, span_x * np.maximum(gy1 - gy0, 0), 0)
+
+    eps = f32(-1e-5)
+    for start, end in _batches(counts):
+        owner, k = _range_pairs(np.zeros(end - start, dtype=np.int64), counts[start:end])
+        if len(owner) == 0:
+            continue
+        f = owner + start
+        gx = gx0[f] + k % span_x[f]
+        gy = gy0[f] + k // span_x[f]
+        v2x = cx[gx] - x0[f]
+        v2y = cy[gy] - y0[f]
+        d20 = v2x * v0x[f] + v2y * v0y[f]
+        d21 = v2x * v1x[f] + v2y * v1y[f]
+        v = (d11[f] * d20 - d01[f] * d21) / denom[f]
+        w = (d00[f] * d21 - d01[f] * d20) / denom[f]
+        u = f32(1.0) - v - w
+        inside = (u >= eps) & (v >= eps) & (w >= eps)
+        cells = gy[inside] * width + gx[inside]
+        # 候选对按面序号升序排列，每个单元的第一个命中即为序号最小的面
+        cells, first = np.unique(cells, return_index=True)
+        fresh = hit_face[cells] < 0
+        cells, first = cells[fresh], np.flatnonzero(inside)[first[fresh]]
+        hit_face[cells] = f[first]
+        bary[cells] = np.stack([u[first], v[first], w[first]], axis=-1)
+    return hit_face.reshape(height, width), bary
+
+def trace_boundary_loops(edge_start, edge_end):
+    """由轮廓边串成有序的顶点环（支持孔洞与多个岛），每个环从编号最小的未使用边开始追踪。"""
+    vertex_edges = {}
+    for j, (s, e) in enumerate(zip(edge_start.tolist(), edge_end.tolist())):
+        vertex_edges.setdefault(s, []).append(j)
+        if e != s:
+            vertex_edges.setdefault(e, []).append(j)
+    used = [False] * len(edge_start)
+    loops = []
+    starts, ends = edge_start.tolist(), edge_end.tolist()
+    for first in range(len(starts)):
+        if used[first]:
+            continue
+        loop = [starts[first]]
+        current = ends[first]
+        used[first] = True
+        while True:
+            for j in vertex_edges.get(current, ()):
+                if not used[j]:
+                    loop.append(current)
+                    current = ends[j] if starts[j] == current else starts[j]
+                    used[j] = True
+                    break
+            else:
+                break
+        loops.append(loop)
+    return loops
+
+def inside_loops(positions, loops, cx, cy):
+    """奇偶规则判断每个单元中心是否在轮廓环内，等价于 C++ 的逐行扫描线交点计算。"""
+    x1, y1, x2, y2 = [], [], [], []
+    for loop in loops:
+        p = positions[np.asarray(loop, dtype=np.int64)]
+        q = np.roll(p, -1, axis=0)
+        x1.append(p[:, 0]); y1.append(p[:, 1]); x2.append(q[:, 0]); y2.append(q[:, 1])
+    x1, y1, x2, y2 = (np.concatenate(a) for a in (x1, y1, x2, y2))
+
+    # 与 py 相交的行：恰好一个端点的 y 大于 py
+    ra = np.searchsorted(cy, y1, side='left')
+    rb = np.searchsorted(cy, y2, side='left')
+    seg, rows = _range_pairs(np.minimum(ra, rb), np.maximum(ra, rb))
+    py = cy[rows]
+    crossing = (x2[seg] - x1[seg]) * (py - y1[seg]) / (y2[seg] - y1[seg] + f32(1e-10)) + x1[seg]
+
+    # 交点 x 大于中心 x 的个数为奇数时在内部：用差分数组统计每个单元右侧的交点数
+    toggles = np.zeros((len(cy), len(cx) + 1), dtype=np.int32)
+    np.add.at(toggles, (rows, np.searchsorted(cx, crossing, side='left')), 1)
+    right = np.cumsum(toggles[:, ::-1], axis=1)[:, ::-1]
+    return (right[:, 1:] & 1).astype(bool)
+
+def trim_boundary_cells(cells, cx, cy, width, edges, voxel_size):
+    """
+    边界修剪，与 C++ create_final_models 的判定相同：
+    若某条轮廓边的垂足在边上、距离在查询半径内、视线未被其他轮廓边遮挡，且体素越过向外偏移后的虚拟边界，则剔除该体素。
+    cells: 待检查的单元序号（行优先）；返回需要剔除的布尔掩码。
+    """
+    skip = np.zeros(len(cells), dtype=bool)
+    if len(cells) == 0 or len(edges["x1"]) == 0:
+        return skip
+    radius = voxel_size * f32(0.70710678118)
+    query_radius = radius + voxel_size * EDGE_OFFSET_MULTIPLIER + TRIM_EPSILON
+    margin = voxel_size * EDGE_OFFSET_MULTIPLIER
+
+    ex1, ey1, ex2, ey2 = edges["x1"], edges["y1"], edges["x2"], edges["y2"]
+    edx, edy, len2 = edges["dx"], edges["dy"], edges["len2"]
+    gx0 = np.searchsorted(cx, np.minimum(ex1, ex2) - query_radius, side='left')
+    gx1 = np.searchsorted(cx, np.maximum(ex1, ex2) + query_radius, side='right')
+    gy0 = np.searchsorted(cy, np.minimum(ey1, ey2) - query_radius, side='left')
+    gy1 = np.searchsorted(cy, np.maximum(ey1, ey2) + query_radius, side='right')
+    span_x = np.maximum(gx1 - gx0, 0)
+    counts = span_x * np.maximum(gy1 - gy0, 0)
+
+    # 1. 收集每个待检查单元附近（线段距离不超过查询半径）的边
+    cell_slot = np.full(len(cx) * len(cy), -1, dtype=np.int64)
+    cell_slot[cells] = np.arange(len(cells))
+    near_cell, near_edge = [], []
+    limit = float(query_radius) * 1.001 + 1e-6
+    for start, end in _batches(counts):
+        owner, k = _range_pairs(np.zeros(end - start, dtype=np.int64), counts[start:end])
+        if len(owner) == 0:
+            continue
+        e = owner + start
+        gx = gx0[e] + k % span_x[e]
+        gy = gy0[e] + k // span_x[e]
+        slot = cell_slot[gy * width + gx]
+        keep = slot >= 0
+        e, gx, gy, slot = e[keep], gx[keep], gy[keep], slot[keep]
+        px, py = cx[gx].astype(np.float64), cy[gy].astype(np.float64)
+        dx, dy = edx[e].astype(np.float64), edy[e].astype(np.float64)
+        seg_t = np.clip(((px - ex1[e]) * dx + (py - ey1[e]) * dy) / np.maximum(dx * dx + dy * dy, 1e-30), 0.0, 1.0)
+        dist = np.hypot(ex1[e] + seg_t * dx - px, ey1[e] + seg_t * dy - py)
+        keep = dist <= limit
+        near_cell.append(slot[keep]); near_edge.append(e[keep])
+    if not near_cell:
+        return skip
+    near_cell = np.concatenate(near_cell); near_edge = np.concatenate(near_edge)
+    order = np.lexsort((near_edge, near_cell))
+    near_cell, near_edge = near_cell[order], near_edge[order]
+
+    # 2. 按 C++ 的 float32 计算顺序求垂足与越界距离
+    ccx = cx[cells % width][near_cell]
+    ccy = cy[cells // width][near_cell]
+    e = near_edge
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tt = ((ccx - ex1[e]) * edx[e] + (ccy - ey1[e]) * edy[e]) / len2[e]
+    proj_x = ex1[e] + tt * edx[e]
+    proj_y = ey1[e] + tt * edy[e]
+    to_x, to_y = proj_x - ccx, proj_y - ccy
+    signed = (ccx - proj_x) * edges["nx"][e] + (ccy - proj_y) * edges["ny"][e]
+    overshoot = signed - margin - TRIM_EPSILON + radius > 0
+    candidate = ((len2[e] >= f32(1e-10)) & (tt >= 0.0) & (tt <= 1.0)
+                 & (to_x * to_x + to_y * to_y <= query_radius * query_radius)
+                 & edges["has_face"][e] & overshoot)
+    cand = np.flatnonzero(candidate)
+    if len(cand) == 0:
+        return skip
+
+    # 3. 遮挡测试：中心到垂足的线段与同一单元附近的其他边严格相交
+    group_start = np.searchsorted(near_cell, near_cell[cand], side='left')
+    group_end = np.searchsorted(near_cell, near_cell[cand], side='right')
+    owner, other = _range_pairs(group_start, group_end)
+    q = cand[owner]
+    o = near_edge[other]
+    qx, qy, fx, fy = ccx[q], ccy[q], proj_x[q], proj_y[q]
+    d1 = edx[o] * (qy - ey1[o]) - (qx - ex1[o]) * edy[o]
+    d2 = edx[o] * (fy - ey1[o]) - (fx - ex1[o]) * edy[o]
+    d3 = (fx - qx) * (ey1[o] - qy) - (ex1[o] - qx) * (fy - qy)
+    d4 = (fx - qx) * (ey2[o] - qy) - (ex2[o] - qx) * (fy - qy)
+    blocked = (o != near_edge[q]) & (d1 * d2 < 0) & (d3 * d4 < 0)
+    occluded = np.bincount(owner[blocked], minlength=len(cand)) > 0
+
+    skip[near_cell[cand[~occluded]]] = True
+    return skip
+
+
+# ---------------------------------------------------------------------------
+# VOX 与 XML 输出
+# ---------------------------------------------------------------------------
+
+def _chunk(chunk_id, content, children=b""):
+    return chunk_id + struct.pack('<II', len(content), len(children)) + content + children
+
+def _dict(pairs):
+    out = [struct.pack('<I', len(pairs))]
+    for key, value in pairs:
+        key, value = key.encode('utf-8'), value.encode('utf-8')
+        out.append(struct.pack('<I', len(key)) + key + struct.pack('<I', len(value)) + value)
+    return b"".join(out)
+
+def _transform_chunk(node_id, child_id, name, translation):
+    # 单位旋转矩阵按 MagicaVoxel 的打包格式为 4
+    frame = _dict([("_r", "4"), ("_t", "%d %d %d" % tuple(int(v) for v in translation))])
+    content = (struct.pack('<I', node_id) + _dict([("_name", name)] if name else [])
+               + struct.pack('<iIiI', child_id, 0xFFFFFFFF, 0, 1) + frame)
+    return _chunk(b"nTRN", content)
+
+def write_vox_scene(models, palette):
+    """
+    按 ogt_vox_write_scene 的布局写出VOX场景：一个图层、一个组，每个子模型一个实例。
+    models: [(名称, 体素[y, x] uint8, 平移(x, y, z))]，palette: Palette。
+    """
+    count = len(models)
+    children = []
+    for _, voxels, _ in models:
+        size_y, size_x = voxels.shape
+        ys, xs = np.nonzero(voxels)
+        xyzi = np.stack([xs, ys, np.zeros_like(xs), voxels[ys, xs]], axis=-1).astype(np.uint8)
+        children.append(_chunk(b"SIZE", struct.pack('<III', size_x, size_y, 1)))
+        children.append(_chunk(b"XYZI", struct.pack('<I', len(xs)) + xyzi.tobytes()))
+
+    # 节点编号：组变换 0，组 1，形状 2..，实例变换 2+N..
+    first_shape, first_instance = 2, 2 + count
+    children.append(_transform_chunk(0, 1, "default_group", (0, 0, 0)))
+    children.append(_chunk(b"nGRP", struct.pack('<II', 1, 0) + struct.pack('<I', count)
+                           + np.arange(first_instance, first_instance + count, dtype='<u4').tobytes()))
+    for i in range(count):
+        children.append(_chunk(b"nSHP", struct.pack('<IIIII', first_shape + i, 0, 1, i, 0)))
+    for i, (name, _, translation) in enumerate(models):
+        children.append(_transform_chunk(first_instance + i, first_shape + i, name, translation))
+
+    # 调色板在文件中整体偏移一个索引
+    children.append(_chunk(b"RGBA", np.roll(palette.colors, -1, axis=0).tobytes()))
+
+    if palette.notes:
+        # 每8个索引一组共用一个物理标签，按第31组到第0组的顺序写出
+        notes = []
+        for group in range(31, -1, -1):
+            note = ""
+            for i in range(1, 9):
+                index = group * 8 + i
+                if FIRST_PALETTE_INDEX <= index <= LAST_PALETTE_INDEX and palette.notes.get(index):
+                    note = palette.notes[index]
+                    break
+            notes.append(note.encode('utf-8'))
+        children.append(_chunk(b"NOTE", struct.pack('<I', len(notes))
+                               + b"".join(struct.pack('<I', len(n)) + n for n in notes)))
+
+    for index in sorted(palette.materials):
+        matl = palette.materials[index]
+        if not FIRST_PALETTE_INDEX <= index <= LAST_PALETTE_INDEX or matl["flags"] == 0:
+            continue
+        pairs = [("_type", _MATL_TYPE_NAMES[matl["type"]])]
+        if matl["type"] == MATL_GLASS:
+            pairs.append(("_media_type", "_absorb"))
+        pairs += [("_" + name, "%f" % float(matl[name])) for name, flag in _MATL_FIELDS if matl["flags"] & flag]
+        children.append(_chunk(b"MATL", struct.pack('<I', index) + _dict(pairs)))
+
+    children.append(_chunk(b"LAYR", struct.pack('<I', 0) + _dict([("_name", "default_layer"), ("_color", "0 0 0")])
+                           + struct.pack('<I', 0xFFFFFFFF)))
+
+    return b"VOX " + struct.pack('<I', 150) + _chunk(b"MAIN", b"", b"".join(children))
+
+_XML_ESCAPES = {'"': "&quot;", '&': "&amp;", "'": "&apos;", '<': "&lt;", '>': "&gt;"}
+
+def _xml_attr(value):
+    return "".join(_XML_ESCAPES.get(ch, ch) for ch in value)
+
+def build_group_xml(group_pos, group_rot, nodes):
+    """生成与 C++ 核心（tinyxml2）相同格式的 group XML 文本。nodes: 每个 vox 节点的属性字典。"""
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             f'<group name="obj_model" pos="{_xml_attr(group_pos)}" rot="{_xml_attr(group_rot)}">']
+    for attrs in nodes:
+        text = " ".join(f'{key}="{_xml_attr(attrs[key])}"' for key in sorted(attrs))
+        lines.append(f"    <vox {text}/>")
+    lines.append("</group>")
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------------------------------
+# 体素化
+# ---------------------------------------------------------------------------
+
+def _format_vector(values):
+    return f"{values[0]} {values[1]} {values[2]}"
+
+def voxelize_mesh(mesh, mtl_materials, profiles, textures, voxel_size, vox_name, group_pos, group_rot, palette=None):
+    """
+    体素化一个表面网格，流程与 C++ voxelize_model 相同：
+    光栅化采样 → 轮廓边采样 → 调色板量化 → 平面瓦片（内部判断与边界修剪）→ 边界体素条 → VOX与XML。
+    textures: {diffuse_map: RGBA数组}。palette: 全局调色板（Palette），指定时跳过采样与量化。
+    返回 (VOX文件内容, XML文本)，没有生成任何子模型时抛出 RuntimeError。
+    """
+    return _voxelize_surface(mesh, mtl_materials, profiles, textures, voxel_size, vox_name,
+                             group_pos=group_pos, group_rot=group_rot, palette=palette)
+
+def surface_samples(mesh, mtl_materials, profiles, textures, voxel_size, vox_name):
+    """只执行采样阶段（光栅化采样与轮廓边采样），返回 {材质名: 打包颜色数组}，用于构建全局调色板。"""
+    return _voxelize_surface(mesh, mtl_materials, profiles, textures, voxel_size, vox_name, samples_only=True)
+
+def _voxelize_surface(mesh, mtl_materials, profiles, textures, voxel_size, vox_name,
+                      group_pos="", group_rot="", palette=None, samples_only=False):
+    vs = f32(voxel_size)
+    positions = np.asarray(mesh["positions"], dtype=f32).reshape(-1, 3)
+    faces = np.asarray(mesh["face_v"], dtype=np.int64).reshape(-1, 3)
+    face_vt = np.asarray(mesh["face_vt"], dtype=np.int64).reshape(-1, 3)
+    face_mat = np.asarray(mesh["face_mat"], dtype=np.int64)
+    uvs = np.asarray(mesh["uvs"], dtype=f32).reshape(-1, 2)
+    if len(positions) == 0 or len(faces) == 0 or faces.max() >= len(positions):
+        raise RuntimeError(t("INVALID_MESH_FILE", filename=vox_name))
+    # 没有UV或越界的UV索引与C++一样使用第0个UV
+    face_vt = np.where((face_vt == PVM_NO_UV) | (face_vt >= len(uvs)), 0, face_vt)
+    if len(uvs) == 0:
+        uvs = np.zeros((1, 2), dtype=f32)
+
+    # 本表面的材质表：名称取第一个空白分隔的记号，最后一项为无材质
+    names = [(name.split() or [""])[0] for name in mesh["material_names"]] + [""]
+    face_mat = np.where(face_mat == PVM_NO_MATERIAL, len(names) - 1, face_mat)
+    material_table = []
+    for name in names:
+        mtl = mtl_materials.get(name)
+        material_table.append({
+            "mtl": mtl,
+            "kd_color": _kd_color(mtl["Kd"]) if mtl is not None else MAGENTA,
+            "texture": textures.get(mtl["diffuse_map"]) if mtl is not None else None,
+        })
+
+    # 1. 光栅化与平面采样
+    min_x, min_y = positions[:, 0].min() - vs, positions[:, 1].min() - vs
+    max_x, max_y = positions[:, 0].max() + vs, positions[:, 1].max() + vs
+    size_x, size_y = _strip_length(max_x - min_x, vs), _strip_length(max_y - min_y, vs)
+    cx, cy = _cell_centers(min_x, size_x, vs), _cell_centers(min_y, size_y, vs)
+    hit_face, bary = rasterize_faces(positions, faces, cx, cy)
+    hit_cells = np.flatnonzero(hit_face.ravel() >= 0)
+    hit_faces = hit_face.ravel()[hit_cells]
+    hit_colors = sample_colors(face_mat[hit_faces], bary[hit_cells, 0], bary[hit_cells, 1], bary[hit_cells, 2],
+                               uvs[face_vt[hit_faces]], material_table)
+
+    # 2. 识别轮廓边（只属于一个面的边），并找出每条边所属的第一个面
+    face_edges = np.stack([faces, np.roll(faces, -1, axis=1)], axis=-1).reshape(-1, 2)
+    lo, hi = face_edges.min(axis=1), face_edges.max(axis=1)
+    keys = lo * len(positions) + hi
+    _, first_edge, inverse, key_counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+    boundary = np.flatnonzero(key_counts[inverse.ravel()] == 1)
+    b_start, b_end = face_edges[boundary, 0], face_edges[boundary, 1]
+    b_face = first_edge[inverse.ravel()[boundary]] // 3
+    diff = (positions[b_end] - positions[b_start]).astype(np.float64)
+    b_length = np.sqrt((diff * diff).sum(axis=1)).astype(f32)
+    logging.info(t("FOUND_EDGES", total_edges=len(face_edges), boundary_edges=len(boundary)))
+
+    # 轮廓边在所属面上的UV与材质
+    def corner_of(face_ids, vertex_ids):
+        return np.argmax(faces[face_ids] == vertex_ids[:, None], axis=1)
+    b_mat = face_mat[b_face]
+    b_uv_start = face_vt[b_face, corner_of(b_face, b_start)]
+    b_uv_end = face_vt[b_face, corner_of(b_face, b_end)]
+    b_has_mtl = np.array([material_table[m]["mtl"] is not None for m in b_mat.tolist()], dtype=bool)
+    b_note = np.array([bool(profiles.get(names[m], {}).get("td_note")) for m in b_mat.tolist()], dtype=bool)
+
+    def sample_along_edges(edge_ids, t_values):
+        u = f32(1.0) - t_values
+        corner = np.stack([b_uv_start[edge_ids], b_uv_end[edge_ids], np.zeros(len(edge_ids), dtype=np.int64)], axis=-1)
+        return sample_colors(b_mat[edge_ids], u, t_values, np.zeros(len(edge_ids), dtype=f32), uvs[corner], material_table)
+
+    # 3. 轮廓边采样与量化（使用全局调色板时跳过）
+    if palette is None:
+        samples = {}
+        for m, name in enumerate(names):
+            colors = hit_colors[face_mat[hit_faces] == m]
+            if len(colors):
+                samples.setdefault(name, []).append(colors)
+
+        sampled = np.flatnonzero(b_has_mtl & b_note)
+        n_samples, _ = _strip_placement(b_length[sampled], vs)
+        edge_ids = np.repeat(sampled, n_samples)
+        steps = np.arange(n_samples.sum()) - np.repeat(np.cumsum(n_samples) - n_samples, n_samples)
+        edge_colors = sample_along_edges(edge_ids, (steps.astype(f32) + f32(0.5)) / np.repeat(n_samples, n_samples).astype(f32))
+        for m in np.unique(b_mat[edge_ids]).tolist():
+            samples.setdefault(names[m], []).append(edge_colors[b_mat[edge_ids] == m])
+        samples = {name: np.concatenate(c) for name, c in samples.items()}
+        if samples_only:
+            return samples
+
+        # 4. 量化
+        palette = Palette(samples, profiles, mtl_materials)
+
+    # 5. 平面瓦片：内部判断 + 边界修剪
+    loops = trace_boundary_loops(b_start, b_end) if len(boundary) else [np.arange(len(positions))]
+    inside = inside_loops(positions, loops, cx, cy).ravel()
+    solid_cells = hit_cells[inside[hit_cells]]
+    solid_faces = hit_face.ravel()[solid_cells]
+
+    parent_ccw = _face_is_ccw(positions, faces[b_face])
+    edx = positions[b_end, 0] - positions[b_start, 0]
+    edy = positions[b_end, 1] - positions[b_start, 1]
+    nx, ny = _normalized_xy(edx, edy)
+    edges = {"x1": positions[b_start, 0], "y1": positions[b_start, 1], "x2": positions[b_end, 0], "y2": positions[b_end, 1],
+             "dx": edx, "dy": edy, "len2": edx * edx + edy * edy,
+             "nx": np.where(parent_ccw, ny, -ny), "ny": np.where(parent_ccw, -nx, nx),
+             "has_face": np.ones(len(boundary), dtype=bool)}
+    keep = ~trim_boundary_cells(solid_cells, cx, cy, size_x, edges, vs)
+    solid_cells, solid_faces = solid_cells[keep], solid_faces[keep]
+    solid_colors = hit_colors[np.searchsorted(hit_cells, solid_cells)]
+    grid = np.zeros(size_x * size_y, dtype=np.uint8)
+    grid[solid_cells] = palette.final_indices(solid_colors, (face_mat[solid_faces], names))
+    grid = grid.reshape(size_y, size_x)
+
+    sub_models = []  # (名称, 体素, VOX平移, XML世界坐标 x/y/z, 边的角度或None)
+    for tile_y in range(0, size_y, MAX_VOX_SIZE):
+        for tile_x in range(0, size_x, MAX_VOX_SIZE):
+            tile = grid[tile_y:tile_y + MAX_VOX_SIZE, tile_x:tile_x + MAX_VOX_SIZE]
+            ys, xs = np.nonzero(tile)
+            if len(xs) == 0:
+                continue
+            x0, y0 = xs.min(), ys.min()
+            cropped = tile[y0:ys.max() + 1, x0:xs.max() + 1]
+            m30 = f32(tile_x + x0 + cropped.shape[1] // 2)
+            m31 = f32(tile_y + y0 + cropped.shape[0] // 2)
+            sub_models.append((f"plane_{tile_x // MAX_VOX_SIZE}_{tile_y // MAX_VOX_SIZE}", cropped, (m30, m31, 0),
+                               (min_x + m30 * vs, min_y + m31 * vs, f32(0.0)), None))
+    logging.info(t("PLANE_MODEL_DONE", count=len(sub_models)))
+
+    # 6. 边界体素条：过长的边先分段（新顶点追加到顶点表，参与后面的中心计算）
+    all_positions = [positions]
+    vertex_count = len(positions)
+    max_length = f32(MAX_VOX_SIZE) * vs
+    segments = []  # (轮廓边序号, 段起点, 段终点, 段长度, 起点坐标, 终点坐标)
+    for e in range(len(boundary)):
+        start_i, end_i = int(b_start[e]), int(b_end[e])
+        p0, p1 = positions[start_i], positions[end_i]
+        if b_length[e] <= max_length:
+            segments.append((e, start_i, end_i, b_length[e], p0, p1))
+            continue
+        pieces = _strip_length(b_length[e], max_length)
+        step = (p1 - p0) / f32(pieces)
+        points, indices = [p0], [start_i]
+        for i in range(1, pieces):
+            points.append(p0 + f32(i) * step)
+            indices.append(vertex_count)
+            all_positions.append(points[-1][None, :])
+            vertex_count += 1
+        points.append(p1); indices.append(end_i)
+        for i in range(pieces):
+            d = points[i + 1] - points[i]
+            segments.append((e, indices[i], indices[i + 1], np.sqrt(d[0] * d[0] + d[1] * d[1] + d[2] * d[2]),
+                             points[i], points[i + 1]))
+
+    edge_models = []
+    for e, seg_start, seg_end, seg_length, p0, p1 in segments:
+        if not b_has_mtl[e]:
+            continue
+        q0 = positions[b_start[e]]
+        dist_from_start = f32(np.sqrt(float(p0[0] - q0[0]) ** 2 + float(p0[1] - q0[1]) ** 2))
+        if b_length[e] > 1e-6:
+            t_start, t_end = dist_from_start / b_length[e], (dist_from_start + seg_length) / b_length[e]
+        else:
+            t_start, t_end = f32(0.0), f32(1.0)
+        t_start, t_end = np.clip(t_start, f32(0.0), f32(1.0)), np.clip(t_end, f32(0.0), f32(1.0))
+        counts, offsets = _strip_placement(np.array([seg_length], dtype=f32), vs)
+        total, along = int(counts[0]), offsets[0]
+
+        dir_x, dir_y = _normalized_xy(p1[0] - p0[0], p1[1] - p0[1])
+        if seg_start == b_start[e] and seg_end == b_end[e]:
+            normal_x, normal_y = edges["nx"][e], edges["ny"][e]
+        else:
+            # 分段产生的新顶点不属于任何面，使用与面无关的外法线
+            normal_x, normal_y = dir_y, -dir_x
+        # 双精度计算后舍入到 float32，与 C++ calculate_edge_angle 相同
+        angle = f32(math.atan2(-(p1[1] - p0[1]), p1[0] - p0[0])) * f32(180.0) / f32(3.14159265)
+        if angle < 0:
+            angle += f32(360.0)
+
+        for i, start_voxel in enumerate(range(0, total, MAX_VOX_SIZE)):
+            length = min(MAX_VOX_SIZE, total - start_voxel)
+            t_local = (np.arange(start_voxel, start_voxel + length, dtype=f32) + f32(0.5)) / f32(total)
+            t_global = t_start + t_local * (t_end - t_start)
+            colors = sample_along_edges(np.full(length, e, dtype=np.int64), t_global)
+            voxels = palette.final_indices(colors, (np.full(length, b_mat[e]), names))[None, :]
+
+            t_center = (f32(start_voxel) + f32(length) / f32(2.0)) / f32(total)
+            center = p0 + (p1 - p0) * t_center
+            offset = vs * EDGE_OFFSET_MULTIPLIER
+            mid_x = center[0] + along * dir_x + normal_x * offset
+            mid_y = center[1] + along * dir_y + normal_y * offset
+            m30, m31 = (mid_x - min_x) / vs, (mid_y - min_y) / vs
+            edge_models.append((f"edge_{e}_seg_{i}", voxels, (m30, m31, 0),
+                                (min_x + m30 * vs, min_y + m31 * vs, p0[2]), angle))
+    logging.info(t("EDGE_MODEL_DONE", count=len(edge_models)))
+    sub_models += edge_models
+    if not sub_models:
+        raise RuntimeError(t("NO_VALID_SUBMODEL"))
+
+    # 7. VOX 与 XML；XML 中的位置以所有顶点（含分段新增的顶点）的重心为原点
+    vox_bytes = write_vox_scene([(name, voxels, translation) for name, voxels, translation, _, _ in sub_models], palette)
+
+    all_positions = np.concatenate(all_positions)
+    center_x = np.cumsum(all_positions[:, 0], dtype=f32)[-1] / f32(len(all_positions))
+    center_y = np.cumsum(all_positions[:, 1], dtype=f32)[-1] / f32(len(all_positions))
+    scale = "%f" % float(vs / f32(0.1))
+    nodes = []
+    for name, _, _, (world_x, world_y, world_z), angle in sub_models:
+        pos = "%f %f %f" % (float(world_x - center_x), float(world_z), float(-(world_y - center_y)))
+        rot = "0 0 0" if angle is None else "0 %f 0" % float(-angle)
+        nodes.append({"file": "MOD/vox/" + vox_name, "object": name, "pos": pos, "rot": rot, "scale": scale})
+    return vox_bytes, build_group_xml(group_pos, group_rot, nodes)
+
+
+class NumpySession:
+    """
+    NumPy 体素化会话，接口与 polyvox_native.NativeSession 相同。
+    MTL解析、材质分类与解码后的纹理在多个表面之间共享；会话可以同时在多个线程中使用。
+    全局调色板：collect_samples 累积所有表面的采样，save_palette 量化一次并设置 fixed_palette，此后各表面不再单独采样和量化。
+    """
+
+    def __init__(self, voxel_size, material_maps=None, material_properties=None):
+        # 没有纹理解码器时每张纹理都会退回到漫反射色，输出错误却不会失败，因此直接拒绝创建会话
+        if not texture_decoder_available():
+            raise RuntimeError(t("PY_NUMPY_NO_TEXTURE_DECODER"))
+        self._voxel_size = voxel_size
+        # 与 polyvox 的 -m/-p 选项相同的字符串形式（material_properties 为 {材质名: {属性名: 值}}）
+        self._material_maps = list(material_maps or [])
+        self._material_properties = [f"{mat_name}:{prop_name}:{prop_value}"
+                                     for mat_name, props in (material_properties or {}).items()
+                                     for prop_name, prop_value in props.items()]
+        self._lock = threading.Lock()
+        self._materials = {}  # MTL路径 -> (材质, 分类结果)
+        self._textures = {}   # 纹理路径 -> Future（RGBA数组，加载失败为 None）
+        self._samples = {}      # 全局调色板的采样：材质名 -> [打包颜色数组]
+        self._palette_source = None  # 采样所用的 (MTL材质, 分类结果)
+        self.fixed_palette = None
+
+    def _load_materials(self, mtl_path):
+        with self._lock:
+            if mtl_path not in self._materials:
+                materials = {}
+                if mtl_path:
+                    logging.info(t("TRY_LOAD_MTL", filename=mtl_path.replace("\\", "/")))
+                    materials = parse_mtl_file(mtl_path) or {}
+                    if not materials:
+                        logging.warning(t("CANNOT_LOAD_MTL", filename=mtl_path.replace("\\", "/")))
+                profiles = classify_materials(materials, self._material_maps, self._material_properties)
+                self._materials[mtl_path] = (materials, profiles)
+            return self._materials[mtl_path]
+
+    def _load_textures(self, materials, used_names, texture_dir):
+        textures = {}
+        for name in used_names:
+            mtl = materials.get(name)
+            if mtl is None or not mtl["diffuse_map"]:
+                continue
+            path = os.path.join(texture_dir, mtl["diffuse_map"])
+            if not os.path.exists(path):
+                path = os.path.join(texture_dir, os.path.basename(mtl["diffuse_map"]))
+            key = os.path.normpath(path)
+            # 锁只保护缓存字典：第一个请求该纹理的线程在锁外解码，其余线程等待同一个 Future，其他纹理的解码不受影响
+            with self._lock:
+                pending = self._textures.get(key)
+                decode = pending is None
+                if decode:
+                    pending = self._textures[key] = Future()
+            if decode:
+                try:
+                    pending.set_result(self._decode_texture(path))
+                except BaseException as e:
+                    pending.set_exception(e)
+                    raise
+            image = pending.result()
+            if image is not None:
+                textures[mtl["diffuse_map"]] = image
+        return textures
+
+    @staticmethod
+    def _decode_texture(path):
+        if not os.path.exists(path):
+            logging.warning(t("TEXTURE_NOT_EXIST", filename=path.replace("\\", "/")))
+            return None
+        image = load_texture_rgba(path)
+        if image is None:
+            logging.warning(t("CANNOT_LOAD_TEXTURE", filename=path.replace("\\", "/")))
+        else:
+            logging.info(t("TEXTURE_LOADED", filename=path.replace("\\", "/")))
+        return image
+
+    def _prepare(self, mesh, mtl_path, texture_dir):
+        mtl_full_path = os.path.normpath(os.path.join(texture_dir, mtl_path)) if mtl_path else ""
+        materials, profiles = self._load_materials(mtl_full_path)
+        used_names = {(name.split() or [""])[0] for name in mesh["material_names"]}
+        textures = self._load_textures(materials, sorted(used_names), texture_dir)
+        return materials, profiles, textures
+
+    def voxelize(self, mesh, mtl_path, texture_dir, vox_name, pos, rot):
+        """
+        体素化一个表面。参数与返回值同 NativeSession.voxelize：mtl_path 可以是相对 texture_dir 的路径，
+        返回 (VOX文件内容 bytes, XML文本 str)，失败时抛出 RuntimeError。
+        """
+        materials, profiles, textures = self._prepare(mesh, mtl_path, texture_dir)
+        return voxelize_mesh(mesh, materials, profiles, textures, self._voxel_size, vox_name,
+                             _format_vector(pos), _format_vector(rot), palette=self.fixed_palette)
+
+    def collect_samples(self, mesh, mtl_path, texture_dir, vox_name):
+        """对一个表面执行与体素化相同的采样，样本累积在会话中，用于 save_palette。"""
+        materials, profiles, textures = self._prepare(mesh, mtl_path, texture_dir)
+        samples = surface_samples(mesh, materials, profiles, textures, self._voxel_size, vox_name)
+        with self._lock:
+            self._palette_source = (materials, profiles)
+            for name, colors in samples.items():
+                self._samples.setdefault(name, []).append(colors)
+
+    def save_palette(self, palette_path):
+        """
+        对累积的样本量化一次，写出全局调色板文件（polyvox --palette 的格式）并作为本会话的 fixed_palette。
+        没有样本或材质数超过一个调色板的容量时返回 False。
+        """
+        if not self._samples:
+            logging.warning(t("SAMPLE_POOL_EMPTY"))
+            return False
+        if len(self._samples) > MAX_PALETTE_MATERIALS:
+            logging.warning(t("PALETTE_TOO_MANY_MATERIALS", count=len(self._samples), limit=MAX_PALETTE_MATERIALS))
+            return False
+        materials, profiles = self._palette_source
+        palette = Palette({name: np.concatenate(c) for name, c in self._samples.items()}, profiles, materials)
+        palette.fixed = True
+        with open(palette_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(palette.to_json(), separators=(",", ":")))  # dumps 使用C实现的编码器
+        self._samples = {}
+        self.fixed_palette = palette
+        return True
+
+    def close(self):
+        with self._lock:
+            self._materials.clear()
+            self._textures.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
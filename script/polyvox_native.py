@@ -0,0 +1,211 @@
+"""
+polyvox 动态库（polyvox_core）的 ctypes 绑定：在当前进程内体素化表面网格。
+网格数组直接传给 C++ 核心，VOX 文件内容与 XML 文本在内存中返回，省去进程启动、中间网格文件和输出解析。
+C 接口定义见 include/polyvox_api.h。
+"""
+import ctypes
+import logging
+import os
+import sys
+import threading
+
+from localization import t
+
+API_VERSION = 3
+
+if sys.platform == "win32":
+    LIBRARY_NAME = "polyvox_core.dll"
+elif sys.platform == "darwin":
+    LIBRARY_NAME = "libpolyvox_core.dylib"
+else:
+    LIBRARY_NAME = "libpolyvox_core.so"
+
+
+class _PolyvoxMesh(ctypes.Structure):
+    _fields_ = [
+        ("positions", ctypes.POINTER(ctypes.c_float)),
+        ("vertex_count", ctypes.c_uint32),
+        ("uvs", ctypes.POINTER(ctypes.c_float)),
+        ("uv_count", ctypes.c_uint32),
+        ("face_v", ctypes.POINTER(ctypes.c_uint32)),
+        ("face_vt", ctypes.POINTER(ctypes.c_uint32)),
+        ("face_mat", ctypes.POINTER(ctypes.c_uint16)),
+        ("face_count", ctypes.c_uint32),
+        ("material_names", ctypes.POINTER(ctypes.c_char_p)),
+        ("material_count", ctypes.c_uint32),
+        ("mtl_path", ctypes.c_char_p),
+        ("texture_dir", ctypes.c_char_p),
+    ]
+
+
+_LOG_CALLBACK = ctypes.CFUNCTYPE(None, ctypes.c_int, ctypes.c_char_p)
+
+def _forward_log(level, message):
+    """将 C++ 核心的日志转发到 logging，级别与命令行模式下的 stdout/stderr 对应。"""
+    text = message.decode('utf-8', errors='replace') if message else ""
+    if level == 0:
+        logging.info(text)
+    elif level == 1:
+        logging.warning(text)
+    else:
+        logging.error(text)
+
+# 回调对象必须在库的整个生命周期内保持引用
+_log_callback = _LOG_CALLBACK(_forward_log)
+
+_libraries = {}
+_libraries_lock = threading.Lock()
+
+
+def library_path(polyvox_exe):
+    """动态库与 polyvox 可执行文件位于同一目录。"""
+    return os.path.join(os.path.dirname(os.path.abspath(polyvox_exe)), LIBRARY_NAME)
+
+def _declare_api(lib):
+    lib.polyvox_api_version.argtypes = []
+    lib.polyvox_api_version.restype = ctypes.c_int
+    lib.polyvox_set_log_callback.argtypes = [_LOG_CALLBACK]
+    lib.polyvox_set_log_callback.restype = None
+    lib.polyvox_session_create.argtypes = [ctypes.c_int, ctypes.POINTER(ctypes.c_char_p)]
+    lib.polyvox_session_create.restype = ctypes.c_void_p
+    lib.polyvox_session_destroy.argtypes = [ctypes.c_void_p]
+    lib.polyvox_session_destroy.restype = None
+    lib.polyvox_session_cancel.argtypes = [ctypes.c_void_p]
+    lib.polyvox_session_cancel.restype = None
+    lib.polyvox_voxelize.argtypes = [ctypes.c_void_p, ctypes.POINTER(_PolyvoxMesh),
+                                     ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p]
+    lib.polyvox_voxelize.restype = ctypes.c_void_p
+    lib.polyvox_sample.argtypes = [ctypes.c_void_p, ctypes.POINTER(_PolyvoxMesh), ctypes.c_char_p]
+    lib.polyvox_sample.restype = ctypes.c_int
+    lib.polyvox_save_palette.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    lib.polyvox_save_palette.restype = ctypes.c_int
+    lib.polyvox_result_vox.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_size_t)]
+    lib.polyvox_result_vox.restype = ctypes.c_void_p
+    lib.polyvox_result_xml.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_size_t)]
+    lib.polyvox_result_xml.restype = ctypes.c_void_p
+    lib.polyvox_result_free.argtypes = [ctypes.c_void_p]
+    lib.polyvox_result_free.restype = None
+
+def load_library(polyvox_exe):
+    """
+    加载 polyvox 可执行文件旁边的动态库。
+    库不存在、无法加载或接口版本不匹配时返回 None，调用方应回退到子进程方式。
+    """
+    path = library_path(polyvox_exe)
+    with _libraries_lock:
+        if path in _libraries:
+            return _libraries[path]
+        lib = None
+        if os.path.isfile(path):
+            try:
+                lib = ctypes.CDLL(path)
+                _declare_api(lib)
+                if lib.polyvox_api_version() != API_VERSION:
+                    logging.warning(t("PY_NATIVE_VERSION_MISMATCH", path=path.replace("\\", "/")))
+                    lib = None
+                else:
+                    lib.polyvox_set_log_callback(_log_callback)
+            except (OSError, AttributeError) as e:
+                logging.warning(t("PY_NATIVE_LOAD_FAILED", path=path.replace("\\", "/"), error=str(e)))
+                lib = None
+        _libraries[path] = lib
+        return lib
+
+def _format_vector(values):
+    return f"{values[0]} {values[1]} {values[2]}"
+
+def _array_pointer(array, ctype):
+    return array.ctypes.data_as(ctypes.POINTER(ctype))
+
+
+class NativeSession:
+    """
+    一个体素化会话，持有在多个表面之间共享的MTL、材质分类与纹理缓存。
+    同一个会话同一时间只能在一个线程中使用（cancel 除外）；会话应在主线程中创建（创建时会加载语言资源）。
+    """
+
+    def __init__(self, lib, options):
+        self._lib = lib
+        encoded = [str(option).encode('utf-8') for option in options]
+        argv = (ctypes.c_char_p * len(encoded))(*encoded)
+        self._handle = lib.polyvox_session_create(len(encoded), argv)
+        self._cancelled = False
+        if not self._handle:
+            raise RuntimeError(t("PY_NATIVE_SESSION_FAILED"))
+
+    @staticmethod
+    def _native_mesh(mesh, mtl_path, texture_dir):
+        names = [name.encode('utf-8') for name in mesh["material_names"]]
+        name_array = (ctypes.c_char_p * max(1, len(names)))(*names)
+        return _PolyvoxMesh(
+            positions=_array_pointer(mesh["positions"], ctypes.c_float),
+            vertex_count=len(mesh["positions"]),
+            uvs=_array_pointer(mesh["uvs"], ctypes.c_float),
+            uv_count=len(mesh["uvs"]),
+            face_v=_array_pointer(mesh["face_v"], ctypes.c_uint32),
+            face_vt=_array_pointer(mesh["face_vt"], ctypes.c_uint32),
+            face_mat=_array_pointer(mesh["face_mat"], ctypes.c_uint16),
+            face_count=len(mesh["face_v"]),
+            material_names=name_array,
+            material_count=len(names),
+            mtl_path=(mtl_path or "").encode('utf-8'),
+            texture_dir=texture_dir.encode('utf-8'),
+        )
+
+    def _raise_failure(self, vox_name):
+        if self._cancelled:
+            raise RuntimeError(t("GUI_USER_STOPPED"))
+        raise RuntimeError(t("PY_NATIVE_SURFACE_FAILED", name=vox_name))
+
+    def voxelize(self, mesh, mtl_path, texture_dir, vox_name, pos, rot):
+        """
+        体素化一个表面。mesh 为 geometry_processor.build_surface_mesh_arrays 返回的数组。
+        mtl_path 可以是相对 texture_dir 的路径。返回 (VOX文件内容 bytes, XML文本 str)，失败时抛出 RuntimeError。
+        """
+        native_mesh = self._native_mesh(mesh, mtl_path, texture_dir)
+        # ctypes 调用期间会释放GIL，多个会话可以在不同线程中真正并行
+        result = self._lib.polyvox_voxelize(self._handle, ctypes.byref(native_mesh), vox_name.encode('utf-8'),
+                                            _format_vector(pos).encode('utf-8'), _format_vector(rot).encode('utf-8'))
+        if not result:
+            self._raise_failure(vox_name)
+        try:
+            size = ctypes.c_size_t()
+            vox_ptr = self._lib.polyvox_result_vox(result, ctypes.byref(size))
+            vox_bytes = ctypes.string_at(vox_ptr, size.value)
+            xml_ptr = self._lib.polyvox_result_xml(result, ctypes.byref(size))
+            xml_text = ctypes.string_at(xml_ptr, size.value).decode('utf-8')
+        finally:
+            self._lib.polyvox_result_free(result)
+        return vox_bytes, xml_text
+
+    def collect_samples(self, mesh, mtl_path, texture_dir, vox_name):
+        """对一个表面执行与体素化相同的采样，样本累积在会话中，用于 save_palette。失败时抛出 RuntimeError。"""
+        native_mesh = self._native_mesh(mesh, mtl_path, texture_dir)
+        if not self._lib.polyvox_sample(self._handle, ctypes.byref(native_mesh), vox_name.encode('utf-8')):
+            self._raise_failure(vox_name)
+
+    def save_palette(self, palette_path):
+        """对累积的样本量化一次并写出全局调色板文件；没有样本或材质过多时返回 False。"""
+        if self._lib.polyvox_save_palette(self._handle, palette_path.encode('utf-8')):
+            return True
+        if self._cancelled:
+            raise RuntimeError(t("GUI_USER_STOPPED"))
+        return False
+
+    def cancel(self):
+        """取消会话（可在任意线程中调用）：正在运行的体素化/采样尽快失败返回，之后的调用也都失败。"""
+        self._cancelled = True
+        handle = self._handle
+        if handle:
+            self._lib.polyvox_session_cancel(handle)
+
+    def close(self):
+        if self._handle:
+            self._lib.polyvox_session_destroy(self._handle)
+            self._handle = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
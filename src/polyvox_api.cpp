@@ -0,0 +1,147 @@
+#include <exception>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <vector>
+
+#include "polyvox_api.h"
+#include "local/command_line.h"
+#include "local/logger.h"
+#include "local/message.h"
+#include "local/parallel.h"
+#include "voxelizer.h"
+
+struct PolyvoxSession {
+    std::unique_ptr<VoxelizerSession> session;
+};
+
+struct PolyvoxResult {
+    std::vector<uint8_t> vox;
+    std::string xml;
+};
+
+namespace {
+// 语言资源和日志开关是进程级的全局状态，创建会话时串行设置
+std::mutex setup_mutex;
+
+SurfaceMesh to_surface_mesh(const PolyvoxMesh* mesh) {
+    SurfaceMesh surface;
+    surface.positions = mesh->positions;
+    surface.vertex_count = mesh->vertex_count;
+    surface.uvs = mesh->uvs;
+    surface.uv_count = mesh->uv_count;
+    surface.face_v = mesh->face_v;
+    surface.face_vt = mesh->face_vt;
+    surface.face_mat = mesh->face_mat;
+    surface.face_count = mesh->face_count;
+    for (uint32_t i = 0; i < mesh->material_count; ++i) {
+        surface.material_names.emplace_back(mesh->material_names[i] ? mesh->material_names[i] : "");
+    }
+    surface.mtl_path = mesh->mtl_path ? mesh->mtl_path : "";
+    surface.texture_dir = mesh->texture_dir ? mesh->texture_dir : "";
+    return surface;
+}
+}
+
+extern "C" {
+
+int polyvox_api_version(void) {
+    return POLYVOX_API_VERSION;
+}
+
+void polyvox_set_log_callback(PolyvoxLogCallback callback) {
+    Logger::sink = callback;
+}
+
+PolyvoxSession* polyvox_session_create(int option_count, const char* const* options) {
+    try {
+        std::vector<std::string> arg_storage{ "polyvox" };
+        for (int i = 0; i < option_count; ++i) {
+            arg_storage.emplace_back(options[i] ? options[i] : "");
+        }
+        std::vector<char*> argv;
+        for (auto& arg : arg_storage) {
+            argv.push_back(arg.data());
+        }
+
+        std::lock_guard<std::mutex> lock(setup_mutex);
+        CommandLineArgs args = parse_session_options(static_cast<int>(argv.size()), argv.data());
+        Logger::verbose = args.verbose;
+        Message::load(args.lang);
+        auto* handle = new PolyvoxSession();
+        handle->session = std::make_unique<VoxelizerSession>(args);
+        return handle;
+    } catch (const std::exception& e) {
+        Logger::error(e.what());
+        return nullptr;
+    }
+}
+
+void polyvox_session_destroy(PolyvoxSession* session) {
+    delete session;
+}
+
+void polyvox_session_cancel(PolyvoxSession* session) {
+    if (session) session->session->cancel();
+}
+
+PolyvoxResult* polyvox_voxelize(PolyvoxSession* session, const PolyvoxMesh* mesh,
+                                const char* vox_name, const char* group_pos, const char* group_rot) {
+    if (!session || !mesh || !vox_name) return nullptr;
+    try {
+        SurfaceMesh surface = to_surface_mesh(mesh);
+        auto result = std::make_unique<PolyvoxResult>();
+        if (!session->session->voxelize_mesh(surface, vox_name,
+                                             group_pos ? group_pos : "0.0 0.0 0.0",
+                                             group_rot ? group_rot : "0.0 0.0 0.0",
+                                             result->vox, result->xml)) {
+            return nullptr;
+        }
+        return result.release();
+    } catch (const OperationCancelled&) {
+        return nullptr; // 宿主主动取消，不输出错误日志
+    } catch (const std::exception& e) {
+        Logger::error(e.what());
+        return nullptr;
+    }
+}
+
+int polyvox_sample(PolyvoxSession* session, const PolyvoxMesh* mesh, const char* vox_name) {
+    if (!session || !mesh || !vox_name) return 0;
+    try {
+        return session->session->sample_mesh(to_surface_mesh(mesh), vox_name) ? 1 : 0;
+    } catch (const OperationCancelled&) {
+        return 0;
+    } catch (const std::exception& e) {
+        Logger::error(e.what());
+        return 0;
+    }
+}
+
+int polyvox_save_palette(PolyvoxSession* session, const char* palette_path) {
+    if (!session || !palette_path) return 0;
+    try {
+        return session->session->save_palette(palette_path) ? 1 : 0;
+    } catch (const OperationCancelled&) {
+        return 0;
+    } catch (const std::exception& e) {
+        Logger::error(e.what());
+        return 0;
+    }
+}
+
+const uint8_t* polyvox_result_vox(const PolyvoxResult* result, size_t* size) {
+    if (size) *size = result ? result->vox.size() : 0;
+    return result ? result->vox.data() : nullptr;
+}
+
+const char* polyvox_result_xml(const PolyvoxResult* result, size_t* size) {
+    if (size) *size = result ? result->xml.size() : 0;
+    return result ? result->xml.c_str() : nullptr;
+}
+
+void polyvox_result_free(PolyvoxResult* result) {
+    delete result;
+}
+
+} // extern "C"
@@ -0,0 +1,3013 @@
+#include <vector>
+#include <string>
+#include <array>
+#include <algorithm>
+#include <cmath>
+#include <iostream>
+#include <fstream>
+#include <sstream>
+#include <cfloat>
+#include <cstring>
+#include <map>
+#include <unordered_map>
+#include <unordered_set>
+#include <filesystem>
+#include <memory>
+
+#define STB_IMAGE_IMPLEMENTATION
+#include "third_party/stb_image.h"
+
+#define OGT_VOX_IMPLEMENTATION
+#include "third_party/ogt_vox.h"
+#include "third_party/json.hpp"
+
+#include "local/xml_parser.h"
+#include "local/logger.h"
+#include "local/file_utils.h"
+#include "local/color_quantizer.h"
+#include "local/command_line.h"
+#include "local/message.h"
+#include "local/parallel.h"
+#include "local/texture_cache.h"
+#include "voxelizer.h"
+
+const float EDGE_OFFSET_MULTIPLIER = 0.25f; // 边界偏移量乘数，用于计算体素条的偏移
+
+// VOX 格式的尺寸限制
+const int MAX_VOX_SIZE = 256;
+
+// 3D向量结构
+struct Vec3 {
+    float x, y, z;
+    Vec3(float _x = 0.0f, float _y = 0.0f, float _z = 0.0f) : x(_x), y(_y), z(_z) {}
+};
+
+// UV坐标结构
+struct Vec2 {
+    float u, v;
+    Vec2(float _u = 0.0f, float _v = 0.0f) : u(_u), v(_v) {}
+};
+
+// 面结构
+// --- 修改：面固定为三角形，索引内联存储；材质以编号表示（ObjModel::material_names 中的下标） ---
+struct Face {
+    std::array<int, 3> v{}; // 顶点索引
+    std::array<int, 3> t{}; // 纹理坐标索引
+    int material = 0;       // 面使用的材质
+};
+
+// MTL材质结构 - 增强以支持更多物理属性
+struct MtlMaterial {
+    std::string name;          // 材质名称
+    std::string diffuse_map;   // 漫反射纹理路径
+    Vec3 Kd = {1.0f, 1.0f, 1.0f}; // 新增：漫反射颜色（默认白色）
+    Vec3 Ks = {0.0f, 0.0f, 0.0f}; // 镜面反射颜色
+    float Ns = 10.0f;          // 镜面反射指数
+    float d = 1.0f;            // 不透明度 (dissolve)
+    Vec3 Ke = {0.0f, 0.0f, 0.0f}; // 自发光颜色
+    float Ni = 1.0f;           // 折射率
+};
+
+// 表示多边形的一条边
+struct Edge {
+    int start_index;  // 起点在vertices数组中的索引
+    int end_index;    // 终点在vertices数组中的索引
+    float length;     // 边的长度
+    bool is_aligned = false; // 新增：是否轴对齐
+};
+
+// 存储边的原始信息，用于XML生成
+struct EdgeInfo {
+    Vec3 startPos;       // 位置
+    Vec3 endPos;         // 结束位置（原始坐标系）
+    float length;        // 长度
+    int parentFaceIndex; // 所属面索引
+};
+
+// OBJ模型结构
+struct ObjModel {
+    std::vector<Vec3> vertices;
+    std::vector<Vec2> texcoords;
+    std::vector<Face> faces;
+    std::vector<Edge> original_edges; // 新增：存储原始边界边
+    std::string mtl_filename;                  // MTL文件名
+    std::map<std::string, MtlMaterial> materials; // 材质列表
+    std::vector<std::string> material_names;   // 面引用的材质名（按首次出现的顺序编号，没有材质时为空字符串）
+    std::unordered_map<std::string, int> material_ids; // 材质名 -> 编号，只在加载时使用
+
+    // 返回材质名的编号，第一次出现时分配新编号
+    int intern_material(const std::string& name) {
+        auto [it, inserted] = material_ids.emplace(name, static_cast<int>(material_names.size()));
+        if (inserted) material_names.push_back(name);
+        return it->second;
+    }
+};
+
+// 统一的体素条长度计算函数，支持可选最小值参数（默认为1）
+inline int calc_voxel_strip_length(float edge_length, float voxel_size, int min_voxels = 1) {
+    int n = static_cast<int>(std::floor(edge_length / voxel_size));
+    if (n < min_voxels) n = min_voxels;
+    return n;
+}
+
+struct VoxelStripPlacement {
+    int voxel_count;
+    float offset_along_edge; // 相对于原边中点的平移（正值为沿边方向，负值为反向）
+};
+
+inline VoxelStripPlacement calc_voxel_strip_placement(float edge_length, float voxel_size) {
+    int n_floor = static_cast<int>(std::floor(edge_length / voxel_size));
+    int n_ceil  = static_cast<int>(std::ceil(edge_length / voxel_size));
+    float err_floor = edge_length - n_floor * voxel_size;
+    float err_ceil  = n_ceil * voxel_size - edge_length;
+
+    // 选择误差较小的方案
+    int n = (err_ceil < err_floor) ? n_ceil : n_floor;
+    if (n < 1) n = 1;
+    float actual_length = n * voxel_size;
+    float offset = (actual_length - edge_length) / 2.0f; // 体素条中心相对原边中点的平移
+    return { n, offset };
+}
+
+// 新增：分割单条边（替换 split_long_edges）
+std::vector<Edge> split_single_edge(const Edge& edge, ObjModel& obj_model, float voxel_size) {
+    std::vector<Edge> segments;
+    float maxLength = MAX_VOX_SIZE * voxel_size;
+
+    if (edge.length <= maxLength) {
+        segments.push_back(edge);
+        return segments;
+    }
+
+    int num_segments = calc_voxel_strip_length(edge.length, maxLength * 1.0f);
+    const Vec3& start_v = obj_model.vertices[edge.start_index];
+    const Vec3& end_v = obj_model.vertices[edge.end_index];
+
+    float dx = (end_v.x - start_v.x) / num_segments;
+    float dy = (end_v.y - start_v.y) / num_segments;
+    float dz = (end_v.z - start_v.z) / num_segments;
+
+    int prev_v_index = edge.start_index;
+    for (int i = 1; i <= num_segments; ++i) {
+        int current_v_index;
+        if (i == num_segments) {
+            current_v_index = edge.end_index;
+        } else {
+            Vec3 new_vertex = { start_v.x + i * dx, start_v.y + i * dy, start_v.z + i * dz };
+            current_v_index = obj_model.vertices.size();
+            obj_model.vertices.push_back(new_vertex);
+        }
+
+        Edge new_segment;
+        new_segment.start_index = prev_v_index;
+        new_segment.end_index = current_v_index;
+        
+        const Vec3& seg_start = obj_model.vertices[new_segment.start_index];
+        const Vec3& seg_end = obj_model.vertices[new_segment.end_index];
+        float seg_dx = seg_end.x - seg_start.x;
+        float seg_dy = seg_end.y - seg_start.y;
+        float seg_dz = seg_end.z - seg_start.z;
+        new_segment.length = std::sqrt(seg_dx*seg_dx + seg_dy*seg_dy + seg_dz*seg_dz);
+
+        segments.push_back(new_segment);
+        prev_v_index = current_v_index;
+    }
+    return segments;
+}
+
+// 修改：直接返回解析时存储的原始边，以避免三角化引入的内部边
+std::vector<Edge> extract_edges_from_obj(const ObjModel& obj_model) {
+    return obj_model.original_edges;
+}
+
+// 描述一个Teardown材质的完整画像
+struct MaterialProfile {
+    std::string td_note;      // Teardown物理关键字, 如 "$TD_wood"
+    ogt_vox_matl vox_material; // MagicaVoxel渲染材质参数
+};
+
+// 颜色与物理材质的采样点
+struct ColorSample {
+    uint32_t color_rgb;
+    std::string td_note;
+};
+
+// 返回 true 表示逆时针（法线朝上/内部），false 表示顺时针（法线朝下/外部）
+bool is_face_ccw(const Face& face, const std::vector<Vec3>& vertices) {
+    float area = 0.0f;
+    for (size_t i = 0; i < face.v.size(); ++i) {
+        const Vec3& v0 = vertices[face.v[i]];
+        const Vec3& v1 = vertices[face.v[(i + 1) % face.v.size()]];
+        area += (v1.x - v0.x) * (v1.y + v0.y);
+    }
+    return area < 0.0f; // <0为逆时针，>0为顺时针
+}
+
+// 获取边的2D外部法线（与面无关，始终为左手法则外侧）
+Vec3 get_edge_outer_normal(const Edge& edge, const ObjModel& obj_model) {
+    const Vec3& p1 = obj_model.vertices[edge.start_index];
+    const Vec3& p2 = obj_model.vertices[edge.end_index];
+    float dx = p2.x - p1.x;
+    float dy = p2.y - p1.y;
+    float len = std::sqrt(dx*dx + dy*dy);
+    if (len > 1e-6f) {
+        dx /= len;
+        dy /= len;
+    }
+    // 外侧法线（左手法则：边的起点到终点，外侧为 (dy, -dx)）
+    return {dy, -dx, 0.0f};
+}
+
+// 获取边的多边形外部法线（依赖于面朝向）
+Vec3 get_edge_polygon_outer_normal(const Edge& edge, const Face& face, const std::vector<Vec3>& vertices) {
+    const Vec3& p1 = vertices[edge.start_index];
+    const Vec3& p2 = vertices[edge.end_index];
+    float dx = p2.x - p1.x;
+    float dy = p2.y - p1.y;
+    float len = std::sqrt(dx*dx + dy*dy);
+    if (len > 1e-6f) {
+        dx /= len;
+        dy /= len;
+    }
+    bool ccw = is_face_ccw(face, vertices);
+    // 逆时针时，外部法线为 (dy, -dx)；顺时针时，外部法线为 (-dy, dx)
+    return ccw ? Vec3{dy, -dx, 0.0f} : Vec3{-dy, dx, 0.0f};
+}
+
+// 智能调色板管理器
+class PaletteManager {
+public:
+    // 构造函数
+    PaletteManager();
+
+    // --- 修改：按材质成批收集从模型表面采样到的颜色 ---
+    void collect_samples(const std::string& material_name, const std::vector<uint32_t>& colors);
+
+    // 执行颜色量化和调色板分配
+    void process_and_quantize(
+        const std::map<std::string, MaterialProfile>& profiles,
+        const std::map<std::string, MtlMaterial>& mtl_materials,
+        const CommandLineArgs& args);
+
+    // --- 修改：材质名预先解析为编号，逐体素查找时不再比较字符串 ---
+    // 返回材质在调色板中的编号，没有参与量化的材质返回 -1
+    int material_id(const std::string& material_name) const;
+
+    // 获取一个原始颜色在最终调色板中的索引（material_id 为 material_id() 的返回值）
+    uint8_t get_final_index(uint32_t original_color, int material_id) const;
+
+    // --- 新增：载入对整个模型量化一次得到的全局调色板（--palette），代替采样与量化 ---
+    bool load_fixed(const std::filesystem::path& palette_path, const std::map<std::string, MaterialProfile>& profiles);
+
+    // 将量化结果写成全局调色板文件（load_fixed 读取的格式）
+    bool save_fixed(const std::filesystem::path& palette_path) const;
+
+    // 采样池中的材质数
+    size_t sampled_material_count() const;
+
+    // 获取最终生成的调色板、注释和材质
+    ogt_vox_palette get_palette() const;
+    const std::map<uint8_t, std::string>& get_notes() const;
+    const std::map<uint8_t, ogt_vox_matl>& get_materials() const;
+
+private:
+    // --- 修改：采样池按原始材质名分组存放颜色，量化时不再重新分组 ---
+    std::map<std::string, std::vector<uint32_t>> sample_pool;
+    
+    ogt_vox_palette final_palette = {};
+    std::map<uint8_t, std::string> final_notes;
+    std::map<uint8_t, ogt_vox_matl> final_materials;
+    
+    // --- 修改：重映射表按材质编号分组，每个材质一个哈希表；另有按颜色的兜底表 ---
+    std::unordered_map<std::string, int> material_ids;                 // 材质名 -> 编号（按材质名排序分配）
+    std::vector<std::unordered_map<uint32_t, uint8_t>> remap_by_material; // 编号 -> (原始颜色 -> 调色板索引)
+    std::unordered_map<uint32_t, uint8_t> remap_by_color;              // 颜色 -> 材质名最小的那个材质中的索引
+
+    // --- 新增：全局调色板中各材质的聚类中心，重映射表中没有的颜色取所属材质最近的中心 ---
+    bool fixed = false;
+    std::vector<std::string> material_names;              // 编号 -> 材质名
+    std::vector<std::vector<uint32_t>> center_colors;     // 编号 -> 聚类中心（按分配顺序）
+    std::vector<std::vector<uint8_t>> center_indices;     // 编号 -> 各聚类中心的调色板索引
+    std::vector<CenterKdTree> center_trees;               // 编号 -> 聚类中心的kd树（只用于全局调色板）
+};
+
+// 将RGB颜色打包为32位整数
+inline uint32_t pack_color(unsigned char r, unsigned char g, unsigned char b) {
+    return (uint32_t(r) << 16) | (uint32_t(g) << 8) | uint32_t(b);
+}
+
+// 从32位整数解包RGB颜色
+inline void unpack_color(uint32_t color, unsigned char& r, unsigned char& g, unsigned char& b) {
+    r = (color >> 16) & 0xFF;
+    g = (color >> 8) & 0xFF;
+    b = color & 0xFF;
+}
+
+// 计算两个颜色之间的感知距离
+float color_distance(uint32_t c1, uint32_t c2) {
+    unsigned char r1, g1, b1, r2, g2, b2;
+    unpack_color(c1, r1, g1, b1);
+    unpack_color(c2, r2, g2, b2);
+    
+    // 人眼对绿色更敏感
+    long dr = r1 - r2;
+    long dg = g1 - g2;
+    long db = b1 - b2;
+    
+    return (float)(dr*dr*0.3 + dg*dg*0.59 + db*db*0.11);
+}
+
+// 计算边的角度并检查是否与网格对齐shi
+float calculate_edge_angle(const Vec3& start, const Vec3& end, bool* isAligned = nullptr) {
+    float dx = end.x - start.x;
+    float dy = end.y - start.y;
+    
+    // 计算角度 (弧度)，从正X轴顺时针方向
+    // 双精度计算后舍入到 float：atan2f 不保证正确舍入，不同C库的结果会相差1ulp，NumPy 后端也按此计算
+    float angle = static_cast<float>(std::atan2(-static_cast<double>(dy), static_cast<double>(dx))); // 注意Y轴需要反转
+    
+    // 转换为度
+    float degrees = angle * 180.0f / 3.14159265f;
+    
+    // 调整范围为 [0, 360)
+    if (degrees < 0) {
+        degrees += 360.0f;
+    }
+    
+    // 检查是否与网格对齐（如果需要）
+    if (isAligned) {
+        // 如果dx或dy接近于0，则边在垂直或水平方向上
+        const float EPSILON = 0.001f;
+        if (std::abs(dx) < EPSILON || std::abs(dy) < EPSILON) {
+            *isAligned = true;
+        }
+        else {
+            // 检查是否是90度的整数倍（允许小误差）
+            const float ANGLE_EPSILON = 1.0f; // 允许1度的误差
+            float mod90 = std::fmod(degrees, 90.0f);
+            *isAligned = mod90 < ANGLE_EPSILON || mod90 > (90.0f - ANGLE_EPSILON);
+        }
+    }
+    
+    return degrees;
+}
+
+PaletteManager::PaletteManager() {
+    // 索引0是保留给透明的
+    // 索引1-8保留给车辆灯光
+    // 索引254-255保留给Hole
+    // 所以我们从9开始，到253结束
+    final_palette.color[0] = {0,0,0,0};
+}
+
+// --- 新增：每个材质至少占8个调色板槽位，全局调色板最多容纳的材质数 ---
+constexpr size_t MAX_PALETTE_MATERIALS = (253 - 9 + 1) / 8;
+
+// 新增：判断是否为保留色索引
+inline bool is_reserved_palette_index(uint8_t palette_index) {
+    // 0-8, 225-240, 254-255 都是保留
+    return (palette_index <= 8) ||
+           //(palette_index >= 225 && palette_index <= 240) ||
+           (palette_index >= 254);
+}
+
+void PaletteManager::collect_samples(const std::string& material_name, const std::vector<uint32_t>& colors) {
+    if (colors.empty()) return;
+    auto& pool = sample_pool[material_name];
+    pool.insert(pool.end(), colors.begin(), colors.end());
+}
+
+// --- 核心修复：重构 PaletteManager::process_and_quantize 函数 ---
+void PaletteManager::process_and_quantize(
+    const std::map<std::string, MaterialProfile>& profiles,
+    const std::map<std::string, MtlMaterial>& mtl_materials,
+    const CommandLineArgs& args)
+{
+    if (sample_pool.empty()) {
+        Logger::warn(Message::get("SAMPLE_POOL_EMPTY"));
+
+        // 兜底逻辑：为无MTL材质且无图片纹理的模型提供默认颜色和物理标签
+        // 1. 如果模型没有任何材质或纹理，所有面分配洋红色和空物理标签
+        // 2. 如果有MTL材质但无纹理，使用MTL的漫反射色，物理标签若无匹配则为空字符串
+
+        bool has_mtl = !profiles.empty() && !(profiles.size() == 1 && profiles.count("") == 1);
+        bool has_any_color = false;
+
+        if (!has_mtl) {
+            // 没有任何材质，所有面分配洋红色
+            uint32_t magenta = pack_color(255, 0, 255);
+            sample_pool.clear();
+            sample_pool[""].assign(32, magenta); // 采样32次，保证量化有数据
+            Logger::warn("No MTL/material found, using magenta as default color and empty physical tag.");
+        } else {
+            // 有MTL但无纹理，尝试用MTL的漫反射色
+            for (const auto& [mat_name, profile] : profiles) {
+                if (mat_name.empty()) continue;
+                auto mtl_it = mtl_materials.find(mat_name);
+                unsigned char r = 200, g = 200, b = 200;
+                if (mtl_it != mtl_materials.end()) {
+                    r = static_cast<unsigned char>(std::clamp(mtl_it->second.Kd.x * 255.0f, 0.0f, 255.0f));
+                    g = static_cast<unsigned char>(std::clamp(mtl_it->second.Kd.y * 255.0f, 0.0f, 255.0f));
+                    b = static_cast<unsigned char>(std::clamp(mtl_it->second.Kd.z * 255.0f, 0.0f, 255.0f));
+                }
+                uint32_t color = pack_color(r, g, b);
+                std::string td_note = profile.td_note.empty() ? "" : profile.td_note;
+                sample_pool[td_note].push_back(color);
+                has_any_color = true;
+            }
+            if (!has_any_color) {
+                // 兜底：仍然分配洋红色
+                uint32_t magenta = pack_color(255, 0, 255);
+                sample_pool[""].assign(32, magenta);
+                Logger::warn("No valid color in MTL, using magenta as default color and empty physical tag.");
+            } else {
+                Logger::warn("No texture found, using MTL color and empty physical tag if not matched.");
+            }
+        }
+    }
+
+    std::map<std::string, MaterialProfile> profiles_by_note;
+    for (const auto& pair : profiles) {
+        profiles_by_note[pair.second.td_note] = pair.second;
+    }
+
+    int total_available_slots = 0;
+    for (int idx = 9; idx <= 253; ++idx) {
+        if (!is_reserved_palette_index(idx)) {
+            total_available_slots++;
+        }
+    }
+    Logger::info(Message::get("TOTAL_PALETTE_SLOTS", { {"total", std::to_string(total_available_slots)} }));
+
+    // --- 修改：每个材质的采样汇总为加权颜色直方图，量化与重映射都基于直方图 ---
+    std::map<std::string, std::vector<ColorBin>> histogram_by_material;
+    std::map<std::string, int> unique_color_counts;
+    int total_unique_colors = 0;
+    for (auto& [mat_name, colors] : sample_pool) {
+        auto& histogram = histogram_by_material[mat_name];
+        histogram = ColorQuantizer::build_histogram(std::move(colors));
+        int count = static_cast<int>(histogram.size());
+        unique_color_counts[mat_name] = count;
+        total_unique_colors += count;
+    }
+
+    // --- 修复：按原始材质名分配槽位 ---
+    std::map<std::string, int> slots_for_material;
+    int slots_assigned = 0;
+    std::vector<std::string> material_order;
+    for (auto const& [mat_name, count] : unique_color_counts) {
+        material_order.push_back(mat_name);
+        float proportion = (total_unique_colors > 0) ? ((float)count / (float)total_unique_colors) : 0.0f;
+        int allocated_slots = std::max(1, static_cast<int>(proportion * total_available_slots));
+        if (allocated_slots % 8 != 0) allocated_slots = ((allocated_slots / 8) + 1) * 8;
+        if (allocated_slots == 0 && count > 0) allocated_slots = 8;
+        slots_for_material[mat_name] = allocated_slots;
+        slots_assigned += allocated_slots;
+    }
+
+    // 补齐或缩减逻辑，步长为8
+    if (slots_assigned < total_available_slots && !material_order.empty()) {
+        int remain = total_available_slots - slots_assigned;
+        size_t idx = 0;
+        while (remain > 0) {
+            slots_for_material[material_order[idx % material_order.size()]] += 8;
+            remain -= 8;
+            idx++;
+        }
+    } else if (slots_assigned > total_available_slots) {
+        int over = slots_assigned - total_available_slots;
+        while (over > 0 && !material_order.empty()) {
+            bool changed = false;
+            for (auto& mat_name : material_order) {
+                if (slots_for_material[mat_name] > 8 && over > 0) {
+                    slots_for_material[mat_name] -= 8;
+                    over -= 8;
+                    changed = true;
+                }
+            }
+            if (!changed) break; // 防止死循环
+        }
+    }
+
+
+    slots_assigned = 0;
+    for (auto const& [mat_name, slots] : slots_for_material) slots_assigned += slots;
+    Logger::info(Message::get("PALETTE_SLOTS_ASSIGNED", { {"count", std::to_string(slots_assigned)} }));
+
+    // 4. 对每组进行K-Means量化
+    uint8_t current_palette_index = 9;
+    material_ids.clear();
+    remap_by_material.clear();
+    remap_by_color.clear();
+    material_names.clear();
+    center_colors.clear();
+    center_indices.clear();
+    for (auto const& [mat_name, histogram] : histogram_by_material) {
+        int k = slots_for_material[mat_name];
+        if (k == 0 || histogram.empty()) continue;
+        int mat_id = static_cast<int>(remap_by_material.size());
+        material_ids.emplace(mat_name, mat_id);
+        material_names.push_back(mat_name);
+        auto& remap_table = remap_by_material.emplace_back();
+        auto& assigned_colors = center_colors.emplace_back();
+        auto& assigned_indices = center_indices.emplace_back();
+
+        // --- 修复：日志现在显示原始材质名 ---
+        auto profile_it = profiles.find(mat_name);
+        const std::string& td_note_for_log = (profile_it != profiles.end()) ? profile_it->second.td_note : "Unknown";
+        Logger::info(Message::get("PROCESS_MATERIAL", { {"note", td_note_for_log}, {"orig", std::to_string(unique_color_counts[mat_name])}, {"quant", std::to_string(k)} }));
+
+        std::vector<uint32_t> centers = ColorQuantizer::kmeans(histogram, k);
+        std::unordered_map<uint32_t, uint8_t> center_palette_index; // 中心颜色 -> 调色板索引（颜色重复时取后者）
+
+        for (size_t i = 0; i < centers.size(); ++i) {
+            while (current_palette_index <= 253 && is_reserved_palette_index(current_palette_index)) {
+                current_palette_index++;
+            }
+            if (current_palette_index > 253) {
+                Logger::error(Message::get("PALETTE_INDEX_OUT_OF_RANGE"));
+                break;
+            }
+            uint32_t center_color = centers[i];
+            
+            // --- 核心修复：直接通过原始材质名查找正确的Profile ---
+            if (profile_it != profiles.end()) {
+                final_notes[current_palette_index] = profile_it->second.td_note;
+                final_materials[current_palette_index] = profile_it->second.vox_material;
+            }
+
+            unsigned char r, g, b;
+            unpack_color(center_color, r, g, b);
+            final_palette.color[current_palette_index] = {r, g, b, 255};
+            center_palette_index[center_color] = current_palette_index;
+            assigned_colors.push_back(center_color);
+            assigned_indices.push_back(current_palette_index);
+            current_palette_index++;
+        }
+
+        // --- 修改：一次分配求出每个颜色最近的中心，直接建立重映射表 ---
+        std::vector<int> nearest = ColorQuantizer::assign(histogram, centers);
+        for (size_t i = 0; i < histogram.size(); ++i) {
+            auto it = center_palette_index.find(centers[nearest[i]]);
+            if (it != center_palette_index.end()) {
+                remap_table[histogram[i].color] = it->second;
+            }
+        }
+    }
+
+    // 兜底表：材质按名称顺序编号，先插入的（材质名最小的）优先
+    for (const auto& remap_table : remap_by_material) {
+        for (const auto& [color, palette_index] : remap_table) {
+            remap_by_color.emplace(color, palette_index);
+        }
+    }
+}
+
+int PaletteManager::material_id(const std::string& material_name) const {
+    auto it = material_ids.find(material_name);
+    return it != material_ids.end() ? it->second : -1;
+}
+
+uint8_t PaletteManager::get_final_index(uint32_t original_color, int material_id) const {
+    if (material_id >= 0) {
+        const auto& remap_table = remap_by_material[material_id];
+        auto it = remap_table.find(original_color);
+        if (it != remap_table.end()) {
+            return it->second;
+        }
+        // 全局调色板只包含采样到的颜色，其余颜色（如边缘体素条的插值颜色）取所属材质最近的中心
+        if (fixed && !center_indices[material_id].empty()) {
+            return center_indices[material_id][center_trees[material_id].nearest(original_color)];
+        }
+    }
+    // 兜底逻辑：如果找不到精确匹配，尝试只按颜色匹配
+    auto it = remap_by_color.find(original_color);
+    return it != remap_by_color.end() ? it->second : 0;
+}
+
+// 全局调色板文件：{"version": 1, "materials": [{"name", "centers", "indices", "colors", "color_indices"}, ...]}
+// 材质按名称顺序排列；物理标签与渲染材质按材质名从分类结果中补全
+bool PaletteManager::load_fixed(const std::filesystem::path& palette_path, const std::map<std::string, MaterialProfile>& profiles) {
+    std::ifstream file(palette_path);
+    if (!file.is_open()) {
+        Logger::error(Message::get("CANNOT_OPEN_PALETTE", { {"filename", palette_path.generic_string()} }));
+        return false;
+    }
+
+    material_ids.clear();
+    remap_by_material.clear();
+    remap_by_color.clear();
+    material_names.clear();
+    center_colors.clear();
+    center_indices.clear();
+    center_trees.clear();
+    try {
+        nlohmann::json j;
+        file >> j;
+        if (j.at("version").get<int>() != 1) {
+            throw std::runtime_error("unsupported version");
+        }
+        for (const auto& item : j.at("materials")) {
+            const std::string mat_name = item.at("name").get<std::string>();
+            const auto centers = item.at("centers").get<std::vector<uint32_t>>();
+            const auto indices = item.at("indices").get<std::vector<int>>();
+            const auto colors = item.at("colors").get<std::vector<uint32_t>>();
+            const auto color_indices = item.at("color_indices").get<std::vector<int>>();
+            if (centers.size() != indices.size() || colors.size() != color_indices.size()) {
+                throw std::runtime_error("mismatched array lengths in material " + mat_name);
+            }
+            auto is_valid_index = [](int index) { return index >= 9 && index <= 253 && !is_reserved_palette_index(static_cast<uint8_t>(index)); };
+
+            int mat_id = static_cast<int>(remap_by_material.size());
+            material_ids.emplace(mat_name, mat_id);
+            material_names.push_back(mat_name);
+            center_colors.push_back(centers);
+            auto profile_it = profiles.find(mat_name);
+            auto& center_index_table = center_indices.emplace_back();
+            for (size_t i = 0; i < centers.size(); ++i) {
+                if (!is_valid_index(indices[i])) throw std::runtime_error("palette index out of range in material " + mat_name);
+                uint8_t palette_index = static_cast<uint8_t>(indices[i]);
+                unsigned char r, g, b;
+                unpack_color(centers[i], r, g, b);
+                final_palette.color[palette_index] = {r, g, b, 255};
+                if (profile_it != profiles.end()) {
+                    final_notes[palette_index] = profile_it->second.td_note;
+                    final_materials[palette_index] = profile_it->second.vox_material;
+                }
+                center_index_table.push_back(palette_index);
+            }
+            center_trees.emplace_back(centers);
+
+            auto& remap_table = remap_by_material.emplace_back();
+            remap_table.reserve(colors.size());
+            for (size_t i = 0; i < colors.size(); ++i) {
+                if (!is_valid_index(color_indices[i])) throw std::runtime_error("palette index out of range in material " + mat_name);
+                remap_table.emplace(colors[i], static_cast<uint8_t>(color_indices[i]));
+            }
+        }
+    } catch (const std::exception& e) {
+        Logger::error(Message::get("INVALID_PALETTE", { {"filename", palette_path.generic_string()}, {"error", e.what()} }));
+        return false;
+    }
+
+    // 兜底表：与 process_and_quantize 相同，材质名最小的优先
+    for (const auto& remap_table : remap_by_material) {
+        for (const auto& [color, palette_index] : remap_table) {
+            remap_by_color.emplace(color, palette_index);
+        }
+    }
+    fixed = true;
+    Logger::info(Message::get("PALETTE_LOADED", { {"filename", palette_path.generic_string()}, {"count", std::to_string(material_ids.size())} }));
+    return true;
+}
+
+bool PaletteManager::save_fixed(const std::filesystem::path& palette_path) const {
+    nlohmann::json materials = nlohmann::json::array();
+    for (size_t mat_id = 0; mat_id < material_names.size(); ++mat_id) {
+        // 重映射表按颜色升序写出，文件内容与哈希表的遍历顺序无关
+        std::vector<std::pair<uint32_t, uint8_t>> remap(remap_by_material[mat_id].begin(), remap_by_material[mat_id].end());
+        std::sort(remap.begin(), remap.end());
+        std::vector<uint32_t> colors;
+        std::vector<int> color_indices;
+        colors.reserve(remap.size());
+        color_indices.reserve(remap.size());
+        for (const auto& [color, palette_index] : remap) {
+            colors.push_back(color);
+            color_indices.push_back(palette_index);
+        }
+        materials.push_back({
+            {"name", material_names[mat_id]},
+            {"centers", center_colors[mat_id]},
+            {"indices", std::vector<int>(center_indices[mat_id].begin(), center_indices[mat_id].end())},
+            {"colors", colors},
+            {"color_indices", color_indices},
+        });
+    }
+
+    std::ofstream file(palette_path);
+    if (!file.is_open()) {
+        Logger::error(Message::get("CANNOT_OPEN_PALETTE", { {"filename", palette_path.generic_string()} }));
+        return false;
+    }
+    file << nlohmann::json{ {"version", 1}, {"materials", materials} }.dump();
+    return file.good();
+}
+
+size_t PaletteManager::sampled_material_count() const {
+    return sample_pool.size();
+}
+
+ogt_vox_palette PaletteManager::get_palette() const { return final_palette; }
+const std::map<uint8_t, std::string>& PaletteManager::get_notes() const { return final_notes; }
+const std::map<uint8_t, ogt_vox_matl>& PaletteManager::get_materials() const { return final_materials; }
+
+// 材质分类器
+std::map<std::string, MaterialProfile> classify_materials(
+    const std::map<std::string, MtlMaterial>& mtl_materials,
+    const std::vector<std::string>& material_maps,
+    const std::vector<std::string>& material_properties) // 新增参数
+{
+    std::map<std::string, MaterialProfile> profiles;
+    
+    // 1. 解析外部传入的自定义映射 (TD Note 和 VOX Type)
+    std::map<std::string, std::string> custom_td_notes;
+    std::map<std::string, std::string> custom_vox_types; // <-- 新增
+    for (const auto& map_str : material_maps) {
+        std::vector<std::string> parts;
+        std::string current_part;
+        std::stringstream ss(map_str);
+        while(std::getline(ss, current_part, ':')) {
+            parts.push_back(current_part);
+        }
+
+        if (parts.size() >= 2) {
+            custom_td_notes[parts[0]] = parts[1];
+            if (parts.size() >= 3) {
+                custom_vox_types[parts[0]] = parts[2]; // <-- 新增：保存 vox_type
+            }
+        }
+    }
+
+    // --- 新增：解析外部传入的属性覆盖 ---
+    std::map<std::string, std::map<std::string, float>> custom_properties;
+    for (const auto& prop_str : material_properties) {
+        std::vector<std::string> parts;
+        std::string current_part;
+        std::stringstream ss(prop_str);
+        while(std::getline(ss, current_part, ':')) {
+            parts.push_back(current_part);
+        }
+        if (parts.size() == 3) {
+            std::string mat_name = parts[0];
+            std::string prop_name = parts[1];
+            try {
+                float prop_value = std::stof(parts[2]);
+                custom_properties[mat_name][prop_name] = prop_value;
+            } catch (const std::invalid_argument& ia) {
+                Logger::warn("Invalid property value: " + parts[2]);
+            }
+        }
+    }
+
+    for (const auto& pair : mtl_materials) {
+        const std::string& mtl_name = pair.first;
+        const MtlMaterial& mtl = pair.second;
+        MaterialProfile profile;
+        memset(&profile.vox_material, 0, sizeof(profile.vox_material));
+
+        // --- 修复：重构逻辑顺序，确保用户设置拥有最高优先级 ---
+
+        // 步骤 1: 首先应用所有来自 -p 参数的用户自定义属性
+        auto props_it = custom_properties.find(mtl_name);
+        if (props_it != custom_properties.end()) {
+            for (const auto& prop_pair : props_it->second) {
+                const std::string& prop_name = prop_pair.first;
+                float prop_value = prop_pair.second;
+
+                if (prop_name == "rough") {
+                    profile.vox_material.rough = prop_value;
+                    profile.vox_material.content_flags |= k_ogt_vox_matl_have_rough;
+                } else if (prop_name == "spec") {
+                    profile.vox_material.spec = prop_value;
+                    profile.vox_material.content_flags |= k_ogt_vox_matl_have_spec;
+                } else if (prop_name == "ior") {
+                    profile.vox_material.ior = prop_value;
+                    profile.vox_material.content_flags |= k_ogt_vox_matl_have_ior;
+                } else if (prop_name == "trans") {
+                    profile.vox_material.trans = prop_value;
+                    profile.vox_material.alpha = 1.0f - prop_value;
+                    profile.vox_material.content_flags |= k_ogt_vox_matl_have_trans;
+                    profile.vox_material.content_flags |= k_ogt_vox_matl_have_alpha;
+                } else if (prop_name == "emission") {
+                    profile.vox_material.emit = prop_value;
+                    profile.vox_material.content_flags |= k_ogt_vox_matl_have_emit;
+                } else if (prop_name == "power") {
+                    profile.vox_material.flux = prop_value;
+                    profile.vox_material.content_flags |= k_ogt_vox_matl_have_flux;
+                } else if (prop_name == "ldr") {
+                    profile.vox_material.ldr = prop_value;
+                    profile.vox_material.content_flags |= k_ogt_vox_matl_have_ldr;
+                } else if (prop_name == "metal") {
+                    profile.vox_material.metal = prop_value;
+                    profile.vox_material.content_flags |= k_ogt_vox_matl_have_metal;
+                }
+            }
+        }
+
+        // 步骤 2: 确定 TD Note 和 VOX 渲染类型
+        auto custom_it = custom_td_notes.find(mtl_name);
+        if (custom_it != custom_td_notes.end() && custom_it->second != "$TD_auto") {
+            // 用户手动指定了映射
+            profile.td_note = custom_it->second;
+            
+            auto type_it = custom_vox_types.find(mtl_name);
+            if (type_it != custom_vox_types.end()) {
+                // 优先使用 -m 参数第三段指定的 vox_type
+                const std::string& vox_type = type_it->second;
+                if (vox_type == "glass") profile.vox_material.type = ogt_matl_type_glass;
+                else if (vox_type == "metal") profile.vox_material.type = ogt_matl_type_metal;
+                else if (vox_type == "emit") profile.vox_material.type = ogt_matl_type_emit;
+                else profile.vox_material.type = ogt_matl_type_diffuse;
+            } else {
+                // 如果 -m 只有两段，则根据 TD Note 推断
+                if (profile.td_note == "$TD_glass") profile.vox_material.type = ogt_matl_type_glass;
+                else if (profile.td_note == "$TD_metal") profile.vox_material.type = ogt_matl_type_metal;
+                else profile.vox_material.type = ogt_matl_type_diffuse;
+            }
+        } else {
+            // 用户选择自动检测，或未提供映射
+            // 在这里，我们根据已应用的属性和MTL原始数据进行推断
+            std::string lower_name = mtl_name;
+            std::transform(lower_name.begin(), lower_name.end(), lower_name.begin(),
+                           [](unsigned char c){ return std::tolower(c); });
+
+            // 首先根据已应用的属性推断渲染类型
+            if (profile.vox_material.content_flags & k_ogt_vox_matl_have_emit && profile.vox_material.emit > 0.0f) {
+                profile.vox_material.type = ogt_matl_type_emit;
+            } else if (mtl.d < 0.9f || (profile.vox_material.content_flags & k_ogt_vox_matl_have_trans && profile.vox_material.trans > 0.0f)) {
+                profile.vox_material.type = ogt_matl_type_glass;
+            } else if (profile.vox_material.content_flags & k_ogt_vox_matl_have_metal && profile.vox_material.metal > 0.5f) {
+                profile.vox_material.type = ogt_matl_type_metal;
+            } else {
+                profile.vox_material.type = ogt_matl_type_diffuse; // 默认
+            }
+            
+            // 然后根据渲染类型和名称推断 TD Note
+            if (profile.vox_material.type == ogt_matl_type_glass) {
+                profile.td_note = "$TD_glass";
+            } else if (profile.vox_material.type == ogt_matl_type_metal || lower_name.find("metal") != std::string::npos) {
+                profile.td_note = "$TD_metal";
+            } else if (lower_name.find("wood") != std::string::npos) {
+                profile.td_note = "$TD_wood";
+            } else if (lower_name.find("brick") != std::string::npos || lower_name.find("concrete") != std::string::npos) {
+                profile.td_note = "$TD_masonry";
+            } else if (lower_name.find("vegetation") != std::string::npos) {
+                profile.td_note = "$TD_foliage";
+            } else if (lower_name.find("carpet") != std::string::npos) {
+                profile.td_note = "$TD_plastic";
+            } else {
+                profile.td_note = "$TD_metal"; // 默认兜底
+            }
+        }
+        
+        // 步骤 3: 为尚未被用户覆盖的属性，从MTL文件应用默认值
+        if (!(profile.vox_material.content_flags & k_ogt_vox_matl_have_rough)) {
+            profile.vox_material.rough = std::max(0.001f, 1.0f - (mtl.Ns / 1000.0f));
+            profile.vox_material.content_flags |= k_ogt_vox_matl_have_rough;
+        }
+        if (!(profile.vox_material.content_flags & k_ogt_vox_matl_have_spec)) {
+            profile.vox_material.spec = (mtl.Ks.x + mtl.Ks.y + mtl.Ks.z) / 3.0f;
+            if (profile.vox_material.spec > 0.0f) profile.vox_material.content_flags |= k_ogt_vox_matl_have_spec;
+        }
+        if (!(profile.vox_material.content_flags & k_ogt_vox_matl_have_ior)) {
+            profile.vox_material.ior = mtl.Ni;
+            profile.vox_material.content_flags |= k_ogt_vox_matl_have_ior;
+        }
+        if (!(profile.vox_material.content_flags & k_ogt_vox_matl_have_alpha)) {
+            profile.vox_material.alpha = mtl.d;
+            if (profile.vox_material.alpha < 1.0f) profile.vox_material.content_flags |= k_ogt_vox_matl_have_alpha;
+        }
+        if (!(profile.vox_material.content_flags & k_ogt_vox_matl_have_trans) && profile.vox_material.type == ogt_matl_type_glass) {
+            profile.vox_material.trans = 1.0f - profile.vox_material.alpha;
+            profile.vox_material.content_flags |= k_ogt_vox_matl_have_trans;
+        }
+        if (!(profile.vox_material.content_flags & k_ogt_vox_matl_have_emit)) {
+            profile.vox_material.emit = (mtl.Ke.x + mtl.Ke.y + mtl.Ke.z) / 3.0f;
+            if (profile.vox_material.emit > 0.0f) profile.vox_material.content_flags |= k_ogt_vox_matl_have_emit;
+        }
+        if (!(profile.vox_material.content_flags & k_ogt_vox_matl_have_flux) && (profile.vox_material.content_flags & k_ogt_vox_matl_have_emit)) {
+            profile.vox_material.flux = profile.vox_material.emit * 4.0f;
+            profile.vox_material.content_flags |= k_ogt_vox_matl_have_flux;
+        }
+        
+        profiles[mtl_name] = profile;
+    }
+    
+    // 添加一个默认profile，用于没有材质的面
+    MaterialProfile default_profile;
+    default_profile.td_note = "";
+    memset(&default_profile.vox_material, 0, sizeof(default_profile.vox_material));
+    default_profile.vox_material.type = ogt_matl_type_diffuse;
+    default_profile.vox_material.rough = 0.8f;
+    default_profile.vox_material.content_flags = k_ogt_vox_matl_have_rough;
+    profiles[""] = default_profile;
+
+    for (const auto& pair : profiles) {
+        Logger::info(Message::get("MATERIAL_CLASSIFY", { {"name", pair.first}, {"td_note", pair.second.td_note} }));
+    }
+
+    return profiles;
+}
+
+// 添加一个HSV转RGB的辅助函数
+struct RGB {
+    unsigned char r, g, b;
+};
+
+// 用于存储量化后的颜色映射
+struct ColorMap {
+    std::vector<ogt_vox_rgba> colors;      // 量化后的颜色
+    std::unordered_map<uint32_t, uint8_t> color_to_index; // 原始颜色到调色板索引的映射
+};
+
+// 解析MTL文件 - 增强以支持新属性
+// 修改：函数签名接受 std::filesystem::path
+bool parse_mtl_file(const std::filesystem::path& mtl_path, std::map<std::string, MtlMaterial>& materials) {
+    std::ifstream file(mtl_path);
+    if (!file.is_open()) {
+        Logger::error(Message::get("CANNOT_OPEN_MTL", { {"filename", mtl_path.generic_string()} })); // <-- 修改
+        return false;
+    }
+    
+    MtlMaterial current_material;
+    bool has_material = false;
+    
+    std::string line;
+    while (std::getline(file, line)) {
+        std::istringstream iss(line);
+        std::string token;
+        iss >> token;
+        
+        if (token == "newmtl") {
+            if (has_material) {
+                materials[current_material.name] = current_material;
+            }
+            current_material = MtlMaterial();
+            iss >> current_material.name;
+            has_material = true;
+        }
+        else if (token == "map_Kd" && has_material) {
+            std::string texture_path;
+            std::getline(iss, texture_path);
+            texture_path.erase(0, texture_path.find_first_not_of(" \t\r\n"));
+            texture_path.erase(texture_path.find_last_not_of(" \t\r\n") + 1);
+            current_material.diffuse_map = texture_path;
+        }
+        else if (token == "Kd" && has_material) {
+            iss >> current_material.Kd.x >> current_material.Kd.y >> current_material.Kd.z;
+        }
+        else if (token == "Ks" && has_material) {
+            iss >> current_material.Ks.x >> current_material.Ks.y >> current_material.Ks.z;
+        }
+        else if (token == "Ns" && has_material) {
+            iss >> current_material.Ns;
+        }
+        else if (token == "d" && has_material) {
+            iss >> current_material.d;
+        }
+        // --- 新增：解析 Ke 和 Ni ---
+        else if (token == "Ke" && has_material) {
+            iss >> current_material.Ke.x >> current_material.Ke.y >> current_material.Ke.z;
+        }
+        else if (token == "Ni" && has_material) {
+            iss >> current_material.Ni;
+        }
+    }
+    
+    if (has_material) {
+        materials[current_material.name] = current_material;
+    }
+    
+    file.close();
+    return !materials.empty();
+}
+
+// 批处理（清单）模式下在多个表面之间共享的资源缓存
+// 同一次运行中的所有表面引用相同的MTL和纹理，只需解析/解码一次
+struct TextureImage;
+struct AssetCache {
+    std::map<std::string, std::map<std::string, MtlMaterial>> materials;     // MTL路径 -> 解析结果
+    std::map<std::string, std::map<std::string, MaterialProfile>> profiles;  // MTL路径 -> 材质分类结果
+    std::unordered_map<std::string, std::shared_ptr<const TextureImage>> textures; // 纹理路径 -> 解码后的图片
+    const TextureCache* texture_cache = nullptr; // 跨进程共享的磁盘纹理缓存（可为空）
+    std::map<std::string, std::shared_ptr<const PaletteManager>> fixed_palettes; // MTL路径 -> 全局调色板（载入失败为空）
+    const CancelFlag* cancel = nullptr; // 会话的取消标志（命令行模式为空）
+};
+
+// 记录多边形的原始边（用于识别轮廓边），polygon 为顶点索引
+void add_face_edges(ObjModel& model, const int* polygon, size_t count) {
+    if (count <= 1) return;
+    for (size_t i = 0; i < count; ++i) {
+        size_t j = (i + 1) % count;
+        Edge edge;
+        edge.start_index = polygon[i];
+        edge.end_index = polygon[j];
+        const Vec3& start = model.vertices[edge.start_index];
+        const Vec3& end = model.vertices[edge.end_index];
+        edge.length = std::sqrt(pow(end.x - start.x, 2) + pow(end.y - start.y, 2) + pow(end.z - start.z, 2));
+        model.original_edges.push_back(edge);
+    }
+}
+
+bool finalize_loaded_model(const std::filesystem::path& obj_path, ObjModel& model, AssetCache* cache);
+
+// 解析OBJ文件
+// 修改：函数签名接受 std::filesystem::path
+bool parse_obj_file(const std::filesystem::path& obj_path, ObjModel& model, AssetCache* cache = nullptr) {
+    std::ifstream file(obj_path);
+    if (!file.is_open()) {
+        Logger::error(Message::get("CANNOT_OPEN_OBJ", { {"filename", obj_path.generic_string()} })); // <-- 修改
+        return false;
+    }
+    
+    std::filesystem::path objPath(obj_path);
+    std::string directory = objPath.parent_path().string();
+    
+    int current_material = model.intern_material(""); // usemtl 之前的面没有材质
+    std::vector<int> polygon_v, polygon_t;
+    std::string line;
+    while (std::getline(file, line)) {
+        if (line.empty() || line[0] == '#')
+            continue;
+        
+        std::istringstream iss(line);
+        std::string token;
+        iss >> token;
+        
+        if (token == "v") {
+            Vec3 vertex;
+            iss >> vertex.x >> vertex.y >> vertex.z;
+            model.vertices.push_back(vertex);
+        } 
+        else if (token == "vt") {
+            Vec2 texcoord;
+            iss >> texcoord.u >> texcoord.v;
+            model.texcoords.push_back(texcoord);
+        }
+        else if (token == "mtllib") {
+            iss >> model.mtl_filename;
+        }
+        else if (token == "usemtl") {
+            // 不带名称的 usemtl 恢复为没有材质
+            std::string material_name;
+            iss >> material_name;
+            current_material = model.intern_material(material_name);
+        }
+        else if (token == "f") {
+            // 多边形的索引只在解析本行时使用，缓冲区在各行之间复用
+            polygon_v.clear();
+            polygon_t.clear();
+
+            std::string vertex_str;
+            while (iss >> vertex_str) {
+                size_t slash1_pos = vertex_str.find('/');
+                size_t slash2_pos = (slash1_pos == std::string::npos) ? std::string::npos : vertex_str.find('/', slash1_pos + 1);
+
+                int v_idx = std::stoi(vertex_str.substr(0, slash1_pos));
+                polygon_v.push_back((v_idx > 0) ? (v_idx - 1) : (model.vertices.size() + v_idx));
+
+                if (slash1_pos != std::string::npos) {
+                    if (slash1_pos + 1 != slash2_pos) {
+                        int t_idx = std::stoi(vertex_str.substr(slash1_pos + 1, slash2_pos - (slash1_pos + 1)));
+                        polygon_t.push_back((t_idx > 0) ? (t_idx - 1) : (model.texcoords.size() + t_idx));
+                    } else {
+                        polygon_t.push_back(0);
+                    }
+                } else {
+                    polygon_t.push_back(0);
+                }
+            }
+            
+            add_face_edges(model, polygon_v.data(), polygon_v.size());
+
+            // 多边形按扇形拆分为三角形；少于3个顶点的面（点、线）不参与光栅化
+            for (size_t i = 1; i + 1 < polygon_v.size(); i++) {
+                Face triangle_face;
+                triangle_face.material = current_material;
+                triangle_face.v = {polygon_v[0], polygon_v[i], polygon_v[i+1]};
+                triangle_face.t = {polygon_t[0], polygon_t[i], polygon_t[i+1]};
+                model.faces.push_back(triangle_face);
+            }
+        }
+    }
+    
+    file.close();
+    return finalize_loaded_model(obj_path, model, cache);
+}
+
+// --- 新增：二进制表面网格（.pvm）格式，由 Python 端的 export_single_surface_mesh 写出 ---
+// 所有数值均为小端序：
+//   char[4] "PVM1"，uint32 版本，uint32 顶点数/UV数/面数/材质数
+//   uint32 mtllib 长度 + 字节；每个材质名：uint32 长度 + 字节
+//   float32 顶点[顶点数*3]，float32 UV[UV数*2]
+//   uint32 顶点索引[面数*3]，uint32 UV索引[面数*3]（0xFFFFFFFF 表示没有UV）
+//   uint16 材质编号[面数]（0xFFFF 表示没有材质）
+const char PVM_MAGIC[4] = { 'P', 'V', 'M', '1' };
+const uint32_t PVM_VERSION = 1;
+const uint32_t PVM_NO_UV = 0xFFFFFFFFu;
+const uint16_t PVM_NO_MATERIAL = 0xFFFF;
+
+// 在内存缓冲区上顺序读取，越界时返回 false
+struct BinaryReader {
+    const char* data;
+    size_t size;
+    size_t pos = 0;
+
+    bool read_bytes(void* out, size_t count) {
+        if (count > size - pos) return false;
+        std::memcpy(out, data + pos, count);
+        pos += count;
+        return true;
+    }
+    bool read_u32(uint32_t& value) { return read_bytes(&value, sizeof(value)); }
+    bool read_string(std::string& value) {
+        uint32_t length = 0;
+        if (!read_u32(length) || length > size - pos) return false;
+        value.assign(data + pos, length);
+        pos += length;
+        return true;
+    }
+};
+
+// 由内存中的网格数组构建模型（.pvm 文件与库接口共用），索引越界时返回 false
+bool fill_model_from_mesh(const SurfaceMesh& mesh, ObjModel& model) {
+    // 与OBJ解析保持一致：材质名取第一个空白分隔的记号；没有材质的面使用空字符串
+    const int no_material = model.intern_material("");
+    std::vector<int> material_ids(mesh.material_names.size());
+    for (size_t i = 0; i < material_ids.size(); ++i) {
+        std::string name;
+        std::istringstream(mesh.material_names[i]) >> name;
+        material_ids[i] = model.intern_material(name);
+    }
+
+    model.vertices.reserve(mesh.vertex_count);
+    for (size_t i = 0; i < mesh.vertex_count; ++i) {
+        model.vertices.emplace_back(mesh.positions[i * 3], mesh.positions[i * 3 + 1], mesh.positions[i * 3 + 2]);
+    }
+    model.texcoords.reserve(mesh.uv_count);
+    for (size_t i = 0; i < mesh.uv_count; ++i) {
+        model.texcoords.emplace_back(mesh.uvs[i * 2], mesh.uvs[i * 2 + 1]);
+    }
+
+    model.faces.reserve(mesh.face_count);
+    model.original_edges.reserve(size_t(mesh.face_count) * 3);
+    for (size_t f = 0; f < mesh.face_count; ++f) {
+        Face face;
+        uint16_t mat = mesh.face_mat[f];
+        face.material = no_material;
+        if (mat != PVM_NO_MATERIAL) {
+            if (mat >= material_ids.size()) return false;
+            face.material = material_ids[mat];
+        }
+        for (size_t k = 0; k < 3; ++k) {
+            uint32_t v_idx = mesh.face_v[f * 3 + k];
+            uint32_t t_idx = mesh.face_vt[f * 3 + k];
+            if (v_idx >= mesh.vertex_count) return false;
+            face.v[k] = static_cast<int>(v_idx);
+            // 与OBJ解析一致：没有UV时使用0，越界的UV索引由 finalize_loaded_model 统一报告并置0
+            int t = 0;
+            if (t_idx != PVM_NO_UV) t = t_idx < mesh.uv_count ? static_cast<int>(t_idx) : -1;
+            face.t[k] = t;
+        }
+        add_face_edges(model, face.v.data(), face.v.size());
+        model.faces.push_back(face);
+    }
+    return true;
+}
+
+bool parse_pvm_file(const std::filesystem::path& mesh_path, ObjModel& model, AssetCache* cache = nullptr) {
+    // 一次性读入整个文件
+    std::ifstream file(mesh_path, std::ios::binary | std::ios::ate);
+    if (!file.is_open()) {
+        Logger::error(Message::get("CANNOT_OPEN_OBJ", { {"filename", mesh_path.generic_string()} }));
+        return false;
+    }
+    std::vector<char> buffer(static_cast<size_t>(file.tellg()));
+    file.seekg(0);
+    file.read(buffer.data(), static_cast<std::streamsize>(buffer.size()));
+    file.close();
+
+    auto invalid = [&]() {
+        Logger::error(Message::get("INVALID_MESH_FILE", { {"filename", mesh_path.generic_string()} }));
+        return false;
+    };
+
+    BinaryReader reader{ buffer.data(), buffer.size() };
+    char magic[4];
+    uint32_t version = 0, vertex_count = 0, uv_count = 0, face_count = 0, material_count = 0;
+    if (!reader.read_bytes(magic, sizeof(magic)) || std::memcmp(magic, PVM_MAGIC, sizeof(magic)) != 0 ||
+        !reader.read_u32(version) || version != PVM_VERSION ||
+        !reader.read_u32(vertex_count) || !reader.read_u32(uv_count) ||
+        !reader.read_u32(face_count) || !reader.read_u32(material_count) ||
+        !reader.read_string(model.mtl_filename)) {
+        return invalid();
+    }
+
+    SurfaceMesh mesh;
+    mesh.material_names.resize(material_count);
+    for (auto& name : mesh.material_names) {
+        if (!reader.read_string(name)) return invalid();
+    }
+
+    // 余下的数组大小必须与文件长度完全一致
+    uint64_t expected = uint64_t(vertex_count) * 3 * sizeof(float) + uint64_t(uv_count) * 2 * sizeof(float) +
+                        uint64_t(face_count) * (6 * sizeof(uint32_t) + sizeof(uint16_t));
+    if (expected != buffer.size() - reader.pos) return invalid();
+
+    std::vector<float> positions(size_t(vertex_count) * 3);
+    std::vector<float> uvs(size_t(uv_count) * 2);
+    std::vector<uint32_t> face_v(size_t(face_count) * 3), face_vt(size_t(face_count) * 3);
+    std::vector<uint16_t> face_mat(face_count);
+    reader.read_bytes(positions.data(), positions.size() * sizeof(float));
+    reader.read_bytes(uvs.data(), uvs.size() * sizeof(float));
+    reader.read_bytes(face_v.data(), face_v.size() * sizeof(uint32_t));
+    reader.read_bytes(face_vt.data(), face_vt.size() * sizeof(uint32_t));
+    reader.read_bytes(face_mat.data(), face_mat.size() * sizeof(uint16_t));
+
+    mesh.positions = positions.data();
+    mesh.vertex_count = vertex_count;
+    mesh.uvs = uvs.data();
+    mesh.uv_count = uv_count;
+    mesh.face_v = face_v.data();
+    mesh.face_vt = face_vt.data();
+    mesh.face_mat = face_mat.data();
+    mesh.face_count = face_count;
+    if (!fill_model_from_mesh(mesh, model)) return invalid();
+
+    return finalize_loaded_model(mesh_path, model, cache);
+}
+
+// 按扩展名加载表面网格：.pvm 为二进制格式，其余按OBJ文本解析
+bool load_surface_mesh(const std::filesystem::path& mesh_path, ObjModel& model, AssetCache* cache = nullptr) {
+    std::string extension = mesh_path.extension().u8string();
+    std::transform(extension.begin(), extension.end(), extension.begin(), [](unsigned char c) { return static_cast<char>(std::tolower(c)); });
+    if (extension == ".pvm") {
+        return parse_pvm_file(mesh_path, model, cache);
+    }
+    return parse_obj_file(mesh_path, model, cache);
+}
+
+// 加载MTL、检查索引范围并输出统计信息（OBJ与二进制网格共用）
+bool finalize_loaded_model(const std::filesystem::path& obj_path, ObjModel& model, AssetCache* cache) {
+    if (!model.mtl_filename.empty()) {
+        std::filesystem::path mtl_full_path = obj_path.parent_path() / model.mtl_filename;
+        std::string mtl_key = mtl_full_path.lexically_normal().generic_string();
+
+        bool loaded_from_cache = false;
+        if (cache) {
+            auto cached_it = cache->materials.find(mtl_key);
+            if (cached_it != cache->materials.end()) {
+                model.materials = cached_it->second;
+                loaded_from_cache = true;
+            }
+        }
+        if (!loaded_from_cache) {
+            Logger::info(Message::get("TRY_LOAD_MTL", { {"filename", mtl_full_path.generic_string()} })); // <-- 修改
+            if (!parse_mtl_file(mtl_full_path, model.materials)) {
+                Logger::warn(Message::get("CANNOT_LOAD_MTL", { {"filename", mtl_full_path.generic_string()} })); // <-- 修改
+            }
+            if (cache) cache->materials[mtl_key] = model.materials;
+        }
+    }
+    
+    bool has_error = false;
+    for (auto& face : model.faces) {
+        for (size_t i = 0; i < face.v.size(); i++) {
+            if (face.v[i] < 0 || face.v[i] >= (int)model.vertices.size()) {
+                Logger::error(Message::get("VERTEX_INDEX_OUT_OF_RANGE", { {"index", std::to_string(face.v[i])} }));
+                has_error = true;
+            }
+            if (face.t[i] < 0 || face.t[i] >= (int)model.texcoords.size()) {
+                Logger::warn(Message::get("TEXCOORD_INDEX_OUT_OF_RANGE", { {"index", std::to_string(face.t[i])} }));
+                face.t[i] = 0;
+            }
+        }
+    }
+    
+    if (has_error) {
+        return false;
+    }
+    
+    Logger::info(Message::get("LOAD_OBJ_SUCCESS", { 
+        {"filename", obj_path.generic_string()}, // <-- 修改
+        {"material_count", std::to_string(model.materials.size())},
+        {"vertex_count", std::to_string(model.vertices.size())}, 
+        {"texcoord_count", std::to_string(model.texcoords.size())}, 
+        {"face_count", std::to_string(model.faces.size())} 
+    }));
+    
+    return !model.vertices.empty() && !model.faces.empty();
+}
+
+// 查找纹理目录（优先-t参数，否则自动查找同名目录）
+std::string find_texture_directory(const std::string& obj_path, const CommandLineArgs& args) {
+    if (!args.texture_file.empty()) {
+        return args.texture_file;
+    }
+    std::string obj_dir = FileUtils::getDirectory(obj_path);
+    std::string obj_basename = FileUtils::getStem(obj_path);
+    std::string candidate = FileUtils::join(obj_dir, obj_basename);
+    if (std::filesystem::exists(candidate) && std::filesystem::is_directory(candidate)) {
+        return candidate;
+    }
+    return obj_dir; // 兜底：返回obj所在目录
+}
+
+// 纹理图片缓存结构
+struct TextureImage {
+    int width = 0, height = 0, channels = 0;
+    // 像素数据可能来自 stb_image 解码，也可能是磁盘缓存的内存映射，统一用共享指针管理生命周期
+    std::shared_ptr<const unsigned char> data;
+};
+
+// 纹理以共享指针保存，以便在批处理模式下被多个表面复用
+using TextureMap = std::unordered_map<std::string, std::shared_ptr<const TextureImage>>;
+
+// 加载所有用到的纹理图片（仅限模型中的面实际使用的材质）
+// cache 不为空时，已解码过的纹理（按完整路径）直接复用；若配置了磁盘缓存，优先映射缓存中的解码结果
+// --- 修改：同一次调用中需要加载的纹理并行解码，日志按材质顺序串行输出 ---
+TextureMap load_all_textures(const ObjModel& model, const std::string& texture_dir, AssetCache* cache = nullptr, int threads = 1) {
+    enum class LoadStatus { Loaded, FromCache, Failed, Missing };
+    struct TextureRequest {
+        std::filesystem::path path;
+        std::string key;
+        std::shared_ptr<const TextureImage> image;
+        LoadStatus status = LoadStatus::Missing;
+    };
+
+    // 1. 解析每个材质的纹理路径，并按完整路径去重
+    // --- 新增：只加载面实际引用的材质的纹理，MTL中未使用的材质不解码 ---
+    std::vector<bool> material_used(model.material_names.size(), false);
+    for (const auto& face : model.faces) {
+        material_used[face.material] = true;
+    }
+    std::unordered_set<std::string> used_materials;
+    for (size_t id = 0; id < model.material_names.size(); ++id) {
+        if (material_used[id]) used_materials.insert(model.material_names[id]);
+    }
+
+    std::vector<std::pair<std::string, std::string>> material_textures; // diffuse_map -> 纹理键
+    std::vector<TextureRequest> requests;
+    std::unordered_map<std::string, size_t> request_index;
+    for (const auto& [mat_name, mat] : model.materials) {
+        if (!mat.diffuse_map.empty() && used_materials.count(mat_name)) {
+            std::filesystem::path tex_path = std::filesystem::path(texture_dir) / mat.diffuse_map;
+            
+            if (!std::filesystem::exists(tex_path)) {
+                // 尝试只用文件名查找
+                tex_path = std::filesystem::path(texture_dir) / std::filesystem::path(mat.diffuse_map).filename();
+            }
+
+            std::string tex_key = tex_path.lexically_normal().generic_string();
+            material_textures.emplace_back(mat.diffuse_map, tex_key);
+            if (cache && cache->textures.count(tex_key)) continue;
+            if (request_index.emplace(tex_key, requests.size()).second) {
+                requests.push_back({ tex_path, tex_key, nullptr, LoadStatus::Missing });
+            }
+        }
+    }
+
+    // 2. 并行解码（或从磁盘缓存映射）
+    const TextureCache* disk_cache = cache ? cache->texture_cache : nullptr;
+    parallel_for(requests.size(), threads, [&](size_t i) {
+        TextureRequest& req = requests[i];
+        if (!std::filesystem::exists(req.path)) {
+            req.status = LoadStatus::Missing;
+            return;
+        }
+
+        auto img = std::make_shared<TextureImage>();
+        if (disk_cache) {
+            img->data = disk_cache->load(req.path, img->width, img->height);
+            if (img->data) {
+                img->channels = 4;
+                req.image = img;
+                req.status = LoadStatus::FromCache;
+                return;
+            }
+        }
+
+        // --- 修改：使用Unicode安全的方式加载纹理 ---
+        FILE* f = nullptr;
+        #ifdef _WIN32
+            f = _wfopen(req.path.wstring().c_str(), L"rb");
+        #else
+            f = fopen(req.path.string().c_str(), "rb");
+        #endif
+
+        if (f) {
+            img->data.reset(stbi_load_from_file(f, &img->width, &img->height, &img->channels, 4), stbi_image_free);
+            fclose(f);
+        }
+        // --- 结束修改 ---
+
+        if (img->data) {
+            if (disk_cache) disk_cache->store(req.path, img->width, img->height, img->data.get());
+            req.image = img;
+            req.status = LoadStatus::Loaded;
+        } else {
+            req.status = LoadStatus::Failed;
+        }
+    }, cache ? cache->cancel : nullptr);
+
+    // 3. 串行记录结果与日志
+    std::unordered_map<std::string, std::shared_ptr<const TextureImage>> local_textures;
+    auto& textures = cache ? cache->textures : local_textures;
+    for (const auto& req : requests) {
+        textures[req.key] = req.image; // 失败时记录空指针，避免重复尝试
+        switch (req.status) {
+            case LoadStatus::Loaded:
+                Logger::info(Message::get("TEXTURE_LOADED", { {"filename", req.path.generic_string()} }));
+                break;
+            case LoadStatus::FromCache:
+                Logger::info(Message::get("TEXTURE_LOADED_FROM_CACHE", { {"filename", req.path.generic_string()} }));
+                break;
+            case LoadStatus::Failed:
+                Logger::warn(Message::get("CANNOT_LOAD_TEXTURE", { {"filename", req.path.generic_string()} }));
+                break;
+            case LoadStatus::Missing:
+                Logger::warn(Message::get("TEXTURE_NOT_EXIST", { {"filename", req.path.generic_string()} }));
+                break;
+        }
+    }
+
+    TextureMap tex_map;
+    for (const auto& [diffuse_map, tex_key] : material_textures) {
+        auto it = textures.find(tex_key);
+        if (it != textures.end() && it->second) tex_map[diffuse_map] = it->second;
+    }
+    return tex_map;
+}
+
+// --- 新增：采样所需的材质信息，按 ObjModel::material_names 的编号预先解析，逐体素采样时不再按名称查找 ---
+struct ResolvedMaterial {
+    const std::string* name = nullptr;          // 材质名
+    const MtlMaterial* mtl = nullptr;           // MTL中的定义，没有时为空
+    const TextureImage* texture = nullptr;      // 漫反射纹理，没有或加载失败时为空
+    const MaterialProfile* profile = nullptr;   // 物理材质分类，没有时为空
+    uint32_t fallback_color = 0;                // 无纹理或透明像素时的颜色（MTL漫反射色，没有材质时为洋红色）
+};
+using MaterialTable = std::vector<ResolvedMaterial>;
+
+MaterialTable resolve_materials(const ObjModel& model, const TextureMap& texture_map,
+                                const std::map<std::string, MaterialProfile>& material_profiles) {
+    MaterialTable table(model.material_names.size());
+    for (size_t id = 0; id < table.size(); ++id) {
+        ResolvedMaterial& resolved = table[id];
+        const std::string& name = model.material_names[id];
+        resolved.name = &name;
+        resolved.fallback_color = pack_color(255, 0, 255);
+
+        auto mat_it = model.materials.find(name);
+        if (mat_it != model.materials.end()) {
+            const MtlMaterial& mtl = mat_it->second;
+            resolved.mtl = &mtl;
+            resolved.fallback_color = pack_color(
+                static_cast<unsigned char>(std::clamp(mtl.Kd.x * 255.0f, 0.0f, 255.0f)),
+                static_cast<unsigned char>(std::clamp(mtl.Kd.y * 255.0f, 0.0f, 255.0f)),
+                static_cast<unsigned char>(std::clamp(mtl.Kd.z * 255.0f, 0.0f, 255.0f)));
+            auto tex_it = texture_map.find(mtl.diffuse_map);
+            if (tex_it != texture_map.end() && tex_it->second->data) {
+                resolved.texture = tex_it->second.get();
+            }
+        }
+        auto profile_it = material_profiles.find(name);
+        if (profile_it != material_profiles.end()) {
+            resolved.profile = &profile_it->second;
+        }
+    }
+    return table;
+}
+
+// 检查点是否在三角形内（使用重心坐标）
+bool point_in_triangle(float x, float y, 
+                      float x0, float y0, 
+                      float x1, float y1, 
+                      float x2, float y2, 
+                      float& u, float& v, float& w) 
+{
+    float v0x = x1 - x0;
+    float v0y = y1 - y0;
+    float v1x = x2 - x0;
+    float v1y = y2 - y0;
+    float v2x = x - x0;
+    float v2y = y - y0;
+    
+    float d00 = v0x*v0x + v0y*v0y;
+    float d01 = v0x*v1x + v0y*v1y;
+    float d11 = v1x*v1x + v1y*v1y;
+    float d20 = v2x*v0x + v2y*v0y;
+    float d21 = v2x*v1x + v2y*v1y;
+    
+    float denom = d00*d11 - d01*d01;
+    if (std::abs(denom) < 1e-6) return false; // 三角形太小或变形
+    
+    v = (d11*d20 - d01*d21) / denom;
+    w = (d00*d21 - d01*d20) / denom;
+    u = 1.0f - v - w;
+    
+    // 容忍小的数值误差
+    const float EPSILON = 1e-5f;
+    return (u >= -EPSILON) && (v >= -EPSILON) && (w >= -EPSILON);
+}
+
+// --- 新增：三角形的二维均匀网格索引，避免每个体素单元都线性扫描全部面 ---
+// 每个网格单元按面序号升序保存与其包围盒相交的面，因此查询结果与线性扫描（返回第一个命中的面）完全一致。
+struct TriangleGrid {
+    const ObjModel* model = nullptr;
+    float min_x = 0, min_y = 0, inv_cell_x = 0, inv_cell_y = 0;
+    int cells_x = 0, cells_y = 0;
+    std::vector<int> cell_start; // CSR 偏移，大小为 cells_x * cells_y + 1
+    std::vector<int> cell_faces; // 各单元内的面序号
+
+    explicit TriangleGrid(const ObjModel& obj_model) : model(&obj_model) {
+        const auto& faces = obj_model.faces;
+        const auto& verts = obj_model.vertices;
+        if (faces.empty()) return;
+
+        // 1. 计算每个面的包围盒，并略微外扩以覆盖 point_in_triangle 的容差
+        std::vector<float> bounds(faces.size() * 4);
+        float gmin_x = FLT_MAX, gmin_y = FLT_MAX, gmax_x = -FLT_MAX, gmax_y = -FLT_MAX;
+        for (size_t i = 0; i < faces.size(); ++i) {
+            const Vec3& a = verts[faces[i].v[0]];
+            const Vec3& b = verts[faces[i].v[1]];
+            const Vec3& c = verts[faces[i].v[2]];
+            float bx0 = std::min({a.x, b.x, c.x}), bx1 = std::max({a.x, b.x, c.x});
+            float by0 = std::min({a.y, b.y, c.y}), by1 = std::max({a.y, b.y, c.y});
+            float pad = (std::max(bx1 - bx0, by1 - by0) + 1.0f) * 1e-4f;
+            bounds[i * 4 + 0] = bx0 - pad; bounds[i * 4 + 1] = by0 - pad;
+            bounds[i * 4 + 2] = bx1 + pad; bounds[i * 4 + 3] = by1 + pad;
+            gmin_x = std::min(gmin_x, bounds[i * 4 + 0]); gmin_y = std::min(gmin_y, bounds[i * 4 + 1]);
+            gmax_x = std::max(gmax_x, bounds[i * 4 + 2]); gmax_y = std::max(gmax_y, bounds[i * 4 + 3]);
+        }
+
+        // 2. 按面数确定网格分辨率（约每单元 1~2 个面），并保持单元接近正方形
+        float extent_x = std::max(gmax_x - gmin_x, 1e-6f);
+        float extent_y = std::max(gmax_y - gmin_y, 1e-6f);
+        float target_cells = static_cast<float>(faces.size()) * 2.0f;
+        float cell = std::sqrt(extent_x * extent_y / target_cells);
+        cells_x = std::clamp(static_cast<int>(extent_x / cell) + 1, 1, 1024);
+        cells_y = std::clamp(static_cast<int>(extent_y / cell) + 1, 1, 1024);
+        min_x = gmin_x; min_y = gmin_y;
+        inv_cell_x = cells_x / extent_x;
+        inv_cell_y = cells_y / extent_y;
+
+        // 3. 两遍构建 CSR：先计数，再按面序号升序填充
+        auto cell_range = [&](size_t i, int& x0, int& y0, int& x1, int& y1) {
+            x0 = cell_x_of(bounds[i * 4 + 0]); y0 = cell_y_of(bounds[i * 4 + 1]);
+            x1 = cell_x_of(bounds[i * 4 + 2]); y1 = cell_y_of(bounds[i * 4 + 3]);
+        };
+        cell_start.assign(static_cast<size_t>(cells_x) * cells_y + 1, 0);
+        for (size_t i = 0; i < faces.size(); ++i) {
+            int x0, y0, x1, y1;
+            cell_range(i, x0, y0, x1, y1);
+            for (int y = y0; y <= y1; ++y)
+                for (int x = x0; x <= x1; ++x)
+                    cell_start[y * cells_x + x + 1]++;
+        }
+        for (size_t c = 1; c < cell_start.size(); ++c) cell_start[c] += cell_start[c - 1];
+        cell_faces.resize(cell_start.back());
+        std::vector<int> cursor(cell_start.begin(), cell_start.end() - 1);
+        for (size_t i = 0; i < faces.size(); ++i) {
+            int x0, y0, x1, y1;
+            cell_range(i, x0, y0, x1, y1);
+            for (int y = y0; y <= y1; ++y)
+                for (int x = x0; x <= x1; ++x)
+                    cell_faces[cursor[y * cells_x + x]++] = static_cast<int>(i);
+        }
+    }
+
+    int cell_x_of(float x) const { return std::clamp(static_cast<int>(std::floor((x - min_x) * inv_cell_x)), 0, cells_x - 1); }
+    int cell_y_of(float y) const { return std::clamp(static_cast<int>(std::floor((y - min_y) * inv_cell_y)), 0, cells_y - 1); }
+
+    // 返回包含点 (px, py) 的序号最小的面，并输出其重心坐标
+    const Face* find(float px, float py, float& out_u, float& out_v, float& out_w) const {
+        if (cell_start.empty()) return nullptr;
+        int cell = cell_y_of(py) * cells_x + cell_x_of(px);
+        for (int k = cell_start[cell]; k < cell_start[cell + 1]; ++k) {
+            const Face& face = model->faces[cell_faces[k]];
+            const Vec3& v0 = model->vertices[face.v[0]];
+            const Vec3& v1 = model->vertices[face.v[1]];
+            const Vec3& v2 = model->vertices[face.v[2]];
+            if (point_in_triangle(px, py, v0.x, v0.y, v1.x, v1.y, v2.x, v2.y, out_u, out_v, out_w)) {
+                return &face;
+            }
+        }
+        return nullptr;
+    }
+};
+
+// --- 新增：轮廓边 -> 所属面与两端UV索引。识别轮廓边后建立一次，采样、修剪和生成边体素条共用，不再逐条边线性扫描所有面 ---
+struct EdgeFaceRef {
+    int face = -1;      // 第一个同时包含两个端点的面，-1 表示找不到
+    int uv_start = -1;  // 边起点在该面中的UV索引
+    int uv_end = -1;    // 边终点在该面中的UV索引
+};
+
+struct EdgeFaceIndex {
+    struct Entry {
+        int face = -1;
+        int uv_low = -1, uv_high = -1; // 编号较小/较大的端点对应的UV索引
+    };
+    std::unordered_map<uint64_t, Entry> entries;
+
+    static uint64_t key(int a, int b) {
+        return (uint64_t(uint32_t(std::min(a, b))) << 32) | uint32_t(std::max(a, b));
+    }
+
+    EdgeFaceIndex(const ObjModel& obj_model, const std::vector<Edge>& boundary_edges) {
+        entries.reserve(boundary_edges.size());
+        bool has_degenerate = false; // 起点与终点相同的边，任何包含该顶点的面都算所属面
+        for (const auto& edge : boundary_edges) {
+            entries.emplace(key(edge.start_index, edge.end_index), Entry{});
+            has_degenerate |= (edge.start_index == edge.end_index);
+        }
+        if (entries.empty()) return;
+
+        // 按面的顺序扫描一次，每条边记录第一个同时包含两个端点的面（顶点重复时取第一次出现的角）
+        auto corner_of = [](const Face& face, int vertex) {
+            for (int c = 0; c < 3; ++c) {
+                if (face.v[c] == vertex) return c;
+            }
+            return 0;
+        };
+        for (size_t f = 0; f < obj_model.faces.size(); ++f) {
+            const Face& face = obj_model.faces[f];
+            for (int a = 0; a < 3; ++a) {
+                for (int b = has_degenerate ? a : a + 1; b < 3; ++b) {
+                    auto it = entries.find(key(face.v[a], face.v[b]));
+                    if (it == entries.end() || it->second.face >= 0) continue;
+                    int low = std::min(face.v[a], face.v[b]);
+                    int high = std::max(face.v[a], face.v[b]);
+                    it->second.face = static_cast<int>(f);
+                    it->second.uv_low = face.t[corner_of(face, low)];
+                    it->second.uv_high = face.t[corner_of(face, high)];
+                }
+            }
+        }
+    }
+
+    // 查找边的所属面与两端UV索引（按边的方向给出）
+    EdgeFaceRef find(const Edge& edge) const {
+        EdgeFaceRef ref;
+        auto it = entries.find(key(edge.start_index, edge.end_index));
+        if (it == entries.end() || it->second.face < 0) return ref;
+        ref.face = it->second.face;
+        bool ascending = edge.start_index <= edge.end_index;
+        ref.uv_start = ascending ? it->second.uv_low : it->second.uv_high;
+        ref.uv_end = ascending ? it->second.uv_high : it->second.uv_low;
+        return ref;
+    }
+};
+
+// --- 新增：轮廓边的预计算信息与二维网格索引，供修剪阶段只测试体素附近的边 ---
+struct BoundaryEdgeGrid {
+    struct EdgeData {
+        float x1, y1, x2, y2;
+        float dx, dy, len2;
+        Vec3 outer_normal;     // 基于所属面朝向的外部法线
+        bool has_parent_face;  // 找不到所属面的边不参与修剪
+    };
+    std::vector<EdgeData> edges;
+    float min_x = 0, min_y = 0, inv_cell = 0;
+    int cells_x = 0, cells_y = 0;
+    std::vector<int> cell_start; // CSR 偏移
+    std::vector<int> cell_edges;
+
+    BoundaryEdgeGrid(const ObjModel& obj_model, const std::vector<Edge>& boundary_edges, const EdgeFaceIndex& edge_faces, float cell_size) {
+        if (boundary_edges.empty()) return;
+
+        // 1. 所属面由轮廓边索引给出，代替逐体素线性搜索
+
+        float gmin_x = FLT_MAX, gmin_y = FLT_MAX, gmax_x = -FLT_MAX, gmax_y = -FLT_MAX;
+        edges.reserve(boundary_edges.size());
+        for (const auto& edge : boundary_edges) {
+            const Vec3& p1 = obj_model.vertices[edge.start_index];
+            const Vec3& p2 = obj_model.vertices[edge.end_index];
+            EdgeData d;
+            d.x1 = p1.x; d.y1 = p1.y; d.x2 = p2.x; d.y2 = p2.y;
+            d.dx = p2.x - p1.x; d.dy = p2.y - p1.y;
+            d.len2 = d.dx * d.dx + d.dy * d.dy;
+            int parent_face = edge_faces.find(edge).face;
+            d.has_parent_face = (parent_face >= 0);
+            d.outer_normal = d.has_parent_face ? get_edge_polygon_outer_normal(edge, obj_model.faces[parent_face], obj_model.vertices) : Vec3{0.0f, 0.0f, 0.0f};
+            edges.push_back(d);
+            gmin_x = std::min({gmin_x, p1.x, p2.x}); gmax_x = std::max({gmax_x, p1.x, p2.x});
+            gmin_y = std::min({gmin_y, p1.y, p2.y}); gmax_y = std::max({gmax_y, p1.y, p2.y});
+        }
+
+        // 2. 按查询半径划分网格，每条边登记到其包围盒覆盖的所有单元
+        cell_size = std::max(cell_size, 1e-6f);
+        min_x = gmin_x; min_y = gmin_y;
+        inv_cell = 1.0f / cell_size;
+        cells_x = std::clamp(static_cast<int>((gmax_x - gmin_x) * inv_cell) + 1, 1, 1024);
+        cells_y = std::clamp(static_cast<int>((gmax_y - gmin_y) * inv_cell) + 1, 1, 1024);
+        cell_start.assign(static_cast<size_t>(cells_x) * cells_y + 1, 0);
+        for (int pass = 0; pass < 2; ++pass) {
+            std::vector<int> cursor;
+            if (pass == 1) {
+                for (size_t c = 1; c < cell_start.size(); ++c) cell_start[c] += cell_start[c - 1];
+                cell_edges.resize(cell_start.back());
+                cursor.assign(cell_start.begin(), cell_start.end() - 1);
+            }
+            for (size_t i = 0; i < edges.size(); ++i) {
+                const EdgeData& d = edges[i];
+                int x0 = cell_x_of(std::min(d.x1, d.x2)), x1 = cell_x_of(std::max(d.x1, d.x2));
+                int y0 = cell_y_of(std::min(d.y1, d.y2)), y1 = cell_y_of(std::max(d.y1, d.y2));
+                for (int y = y0; y <= y1; ++y) {
+                    for (int x = x0; x <= x1; ++x) {
+                        if (pass == 0) cell_start[y * cells_x + x + 1]++;
+                        else cell_edges[cursor[y * cells_x + x]++] = static_cast<int>(i);
+                    }
+                }
+            }
+        }
+    }
+
+    int cell_x_of(float x) const { return std::clamp(static_cast<int>(std::floor((x - min_x) * inv_cell)), 0, cells_x - 1); }
+    int cell_y_of(float y) const { return std::clamp(static_cast<int>(std::floor((y - min_y) * inv_cell)), 0, cells_y - 1); }
+
+    // 收集包围盒与 [px±radius, py±radius] 相交的网格单元中的边（去重，按序号升序）
+    void query(float px, float py, float radius, std::vector<int>& out) const {
+        out.clear();
+        if (edges.empty()) return;
+        int x0 = cell_x_of(px - radius), x1 = cell_x_of(px + radius);
+        int y0 = cell_y_of(py - radius), y1 = cell_y_of(py + radius);
+        for (int y = y0; y <= y1; ++y) {
+            for (int x = x0; x <= x1; ++x) {
+                int c = y * cells_x + x;
+                out.insert(out.end(), cell_edges.begin() + cell_start[c], cell_edges.begin() + cell_start[c + 1]);
+            }
+        }
+        std::sort(out.begin(), out.end());
+        out.erase(std::unique(out.begin(), out.end()), out.end());
+    }
+};
+
+// 辅助函数：判断2D三角形与AABB是否相交
+auto triangle_aabb_overlap_2d = [](float ax, float ay, float bx, float by, float cx, float cy,
+                                   float min_x, float min_y, float max_x, float max_y) -> bool {
+    // 1. 三角形任意顶点在AABB内
+    if ((ax >= min_x && ax <= max_x && ay >= min_y && ay <= max_y) ||
+        (bx >= min_x && bx <= max_x && by >= min_y && by <= max_y) ||
+        (cx >= min_x && cx <= max_x && cy >= min_y && cy <= max_y))
+        return true;
+    // 2. AABB任意顶点在三角形内
+    float u, v, w;
+    auto point_in_tri = [&](float px, float py) {
+        float v0x = bx - ax, v0y = by - ay;
+        float v1x = cx - ax, v1y = cy - ay;
+        float v2x = px - ax, v2y = py - ay;
+        float d00 = v0x*v0x + v0y*v0y;
+        float d01 = v0x*v1x + v0y*v1y;
+        float d11 = v1x*v1x + v1y*v1y;
+        float d20 = v2x*v0x + v2y*v0y;
+        float d21 = v2x*v1x + v2y*v1y;
+        float denom = d00*d11 - d01*d01;
+        if (std::abs(denom) < 1e-6) return false;
+        v = (d11*d20 - d01*d21) / denom;
+        w = (d00*d21 - d01*d20) / denom;
+        u = 1.0f - v - w;
+        const float EPS = 1e-5f;
+        return (u >= -EPS) && (v >= -EPS) && (w >= -EPS);
+    };
+    if (point_in_tri(min_x, min_y) || point_in_tri(max_x, min_y) ||
+        point_in_tri(min_x, max_y) || point_in_tri(max_x, max_y))
+        return true;
+    // 3. 检查三角形三条边与AABB四条边是否有交点
+    auto segs_intersect = [](float x1, float y1, float x2, float y2, float x3, float y3, float x4, float y4) {
+        auto cross = [](float x0, float y0, float x1, float y1) { return x0*y1 - y0*x1; };
+        float d1 = cross(x2-x1, y2-y1, x3-x1, y3-y1);
+        float d2 = cross(x2-x1, y2-y1, x4-x1, y4-y1);
+        float d3 = cross(x4-x3, y4-y3, x1-x3, y1-y3);
+        float d4 = cross(x4-x3, y4-y3, x2-x3, y2-y3);
+        return (d1*d2 < 0) && (d3*d4 < 0);
+    };
+    float tri[3][2] = { {ax, ay}, {bx, by}, {cx, cy} };
+    float box[4][2] = { {min_x, min_y}, {max_x, min_y}, {max_x, max_y}, {min_x, max_y} };
+    for (int i = 0; i < 3; ++i) {
+        float x0 = tri[i][0], y0 = tri[i][1];
+        float x1 = tri[(i+1)%3][0], y1 = tri[(i+1)%3][1];
+        for (int j = 0; j < 4; ++j) {
+            float bx0 = box[j][0], by0 = box[j][1];
+            float bx1 = box[(j+1)%4][0], by1 = box[(j+1)%4][1];
+            if (segs_intersect(x0, y0, x1, y1, bx0, by0, bx1, by1))
+                return true;
+        }
+    }
+    return false;
+};
+
+// --- 修改：射线投射法改为扫描线形式，一行只计算一次所有轮廓环与该行的交点 ---
+// 返回升序排列的交点 x 坐标；点 (px, py) 在内部当且仅当大于 px 的交点个数为奇数（奇偶规则，支持孔洞和多个岛）
+std::vector<float> compute_scanline_crossings(float py, const std::vector<std::vector<Vec3>>& loops) {
+    std::vector<float> crossings;
+    for (const auto& poly_vertices : loops) {  // 每个环是有序的多边形顶点
+        size_t n = poly_vertices.size();
+        for (size_t i = 0; i < n; ++i) {
+            const Vec3& v1 = poly_vertices[i];
+            const Vec3& v2 = poly_vertices[(i + 1) % n];
+            if ((v1.y > py) != (v2.y > py)) {
+                crossings.push_back((v2.x - v1.x) * (py - v1.y) / (v2.y - v1.y + 1e-10f) + v1.x);
+            }
+        }
+    }
+    std::sort(crossings.begin(), crossings.end());
+    return crossings;
+}
+
+inline bool is_inside_scanline(float px, const std::vector<float>& sorted_crossings) {
+    auto right = sorted_crossings.end() - std::upper_bound(sorted_crossings.begin(), sorted_crossings.end(), px);
+    return (right % 2) == 1;
+}
+
+
+// --- 修改：按预先解析的材质采样颜色，(t0, t1, t2) 为三个角的纹理坐标索引，(u, v, w) 为重心坐标 ---
+inline uint32_t sample_material_color(
+    const std::vector<Vec2>& texcoords,
+    const ResolvedMaterial& material,
+    float u, float v, float w,
+    int t0_index, int t1_index, int t2_index)
+{
+    if (material.texture) {
+        const TextureImage& tex = *material.texture;
+        const Vec2& t0 = texcoords[t0_index];
+        const Vec2& t1 = texcoords[t1_index];
+        const Vec2& t2 = texcoords[t2_index];
+
+        float tex_u = u * t0.u + v * t1.u + w * t2.u;
+        float tex_v = u * t0.v + v * t1.v + w * t2.v;
+
+        tex_u = std::fmod(tex_u, 1.0f); if (tex_u < 0) tex_u += 1.0f;
+        tex_v = std::fmod(tex_v, 1.0f); if (tex_v < 0) tex_v += 1.0f;
+
+        int tx = static_cast<int>(tex_u * (tex.width - 1));
+        int ty = static_cast<int>((1.0f - tex_v) * (tex.height - 1));
+        tx = std::max(0, std::min(tex.width - 1, tx));
+        ty = std::max(0, std::min(tex.height - 1, ty));
+
+        const unsigned char* pixel = tex.data.get() + 4 * (ty * tex.width + tx);
+        if (pixel[3] > 128) {
+            return pack_color(pixel[0], pixel[1], pixel[2]);
+        }
+    }
+    // 兜底：无纹理或透明像素，使用MTL颜色；没有材质时为洋红色
+    return material.fallback_color;
+}
+
+// 新增：用于 std::unique_ptr 的自定义删除器结构体
+// 这种方法比全局lambda更健壮，可以避免作用域和声明顺序问题
+struct VoxModelDeleter {
+    void operator()(ogt_vox_model* m) const {
+        if (!m) return;
+        // 必须先释放模型内部的体素数据，再释放模型本身
+        if (m->voxel_data) {
+            // 修正: 使用 const_cast 移除 voxel_data 的 const 属性以便 free()
+            // 这是安全的，因为我们知道这块内存是我们自己用 malloc 分配的
+            free(const_cast<uint8_t*>(m->voxel_data));
+        }
+        free(m);
+    }
+};
+
+// 存储子模型及其变换
+struct SubModel {
+    // 使用新的自定义删除器结构体
+    std::unique_ptr<ogt_vox_model, VoxModelDeleter> model;
+    ogt_vox_transform transform;
+    std::string name;
+    int offsetX, offsetY;
+    bool isEdge;
+    int segmentIndex;
+    int parentFaceIndex;
+    EdgeInfo edgeInfo;
+    
+    // 构造函数，初始化 unique_ptr
+    SubModel() : model(nullptr, VoxModelDeleter{}), isEdge(false), segmentIndex(0), parentFaceIndex(-1) {}
+
+    // 允许移动构造和赋值，以支持在vector中存储和转移所有权
+    SubModel(SubModel&&) = default;
+    SubModel& operator=(SubModel&&) = default;
+
+    // 禁止复制，因为 unique_ptr 是不可复制的
+    SubModel(const SubModel&) = delete;
+    SubModel& operator=(const SubModel&) = delete;
+};
+
+// --- 新增：平面光栅化结果缓冲区。采样阶段记录每个体素单元命中的面和采样颜色，建模阶段直接复用 ---
+struct SurfaceRaster {
+    int size_x = 0, size_y = 0;
+    std::vector<int32_t> hit_face;  // 命中的面序号，-1 表示未命中
+    std::vector<uint32_t> color;    // 采样得到的原始颜色（仅命中时有效）
+};
+
+// 体素单元中心坐标（采样与建模两遍必须使用完全相同的计算方式）
+inline float voxel_cell_center(float grid_min, int index, float voxel_size) {
+    float cell_min = grid_min + index * voxel_size;
+    float cell_max = cell_min + voxel_size;
+    return (cell_min + cell_max) * 0.5f;
+}
+
+// 修改 collect_samples_from_model，传递原始材质名
+// --- 修改：同时填充 SurfaceRaster，供 create_final_models 复用命中面与颜色，避免重复的三角形查找和纹理采样 ---
+void collect_samples_from_model(
+    const ObjModel& obj_model,
+    const MaterialTable& materials,
+    float voxel_size,
+    PaletteManager* palette_manager,
+    float min_x, float min_y, int total_voxel_x, int total_voxel_y,
+    const TriangleGrid& triangle_grid,
+    int threads,
+    SurfaceRaster& raster,
+    const CancelFlag* cancel)
+{
+    // --- 修改：通过网格索引查找三角形，不再线性扫描所有面 ---
+    auto find_triangle_for_point = [&](float px, float py, float& out_u, float& out_v, float& out_w) -> const Face* {
+        return triangle_grid.find(px, py, out_u, out_v, out_w);
+    };
+
+    raster.size_x = total_voxel_x;
+    raster.size_y = total_voxel_y;
+    raster.hit_face.assign(static_cast<size_t>(total_voxel_x) * total_voxel_y, -1);
+    raster.color.assign(raster.hit_face.size(), 0);
+
+    // 1. 按行并行光栅化（每行只写自己的缓冲区区间）
+    parallel_for(static_cast<size_t>(total_voxel_y), threads, [&](size_t row) {
+        int gy = static_cast<int>(row);
+        float world_y = voxel_cell_center(min_y, gy, voxel_size);
+        for (int gx = 0; gx < total_voxel_x; gx++) {
+            float world_x = voxel_cell_center(min_x, gx, voxel_size);
+            
+            float u, v, w;
+            const Face* center_face = find_triangle_for_point(world_x, world_y, u, v, w);
+
+            if (center_face) {
+                uint32_t color_rgb = sample_material_color(
+                    obj_model.texcoords, materials[center_face->material],
+                    u, v, w,
+                    center_face->t[0], center_face->t[1], center_face->t[2]);
+                size_t cell = static_cast<size_t>(gy) * total_voxel_x + gx;
+                raster.hit_face[cell] = static_cast<int32_t>(center_face - obj_model.faces.data());
+                raster.color[cell] = color_rgb;
+            }
+        }
+    }, cancel);
+
+    // 2. 按行优先顺序串行收集样本，保证采样池顺序与单线程一致（使用全局调色板时不需要采样）
+    //    先按材质编号分组，再按材质名整批交给调色板管理器
+    if (!palette_manager) return;
+    std::vector<std::vector<uint32_t>> colors_by_material(materials.size());
+    for (size_t cell = 0; cell < raster.hit_face.size(); ++cell) {
+        if (raster.hit_face[cell] >= 0) {
+            colors_by_material[obj_model.faces[raster.hit_face[cell]].material].push_back(raster.color[cell]);
+        }
+    }
+    for (size_t id = 0; id < materials.size(); ++id) {
+        palette_manager->collect_samples(*materials[id].name, colors_by_material[id]);
+    }
+}
+
+// ==========================================================================================
+// 开始：用于创建边缘模型的代码块
+// ==========================================================================================
+
+// 辅助函数：检查一条边是否与XY轴对齐（即水平或垂直）
+bool is_edge_aligned(const Edge& edge, const std::vector<Vec3>& vertices) {
+    const Vec3& start = vertices[edge.start_index];
+    const Vec3& end = vertices[edge.end_index];
+    
+    const float ALIGNMENT_TOLERANCE = 1e-4f; // 用于容忍浮点数误差
+    bool is_horizontal = std::abs(start.y - end.y) < ALIGNMENT_TOLERANCE;
+    bool is_vertical = std::abs(start.x - end.x) < ALIGNMENT_TOLERANCE;
+    
+    return is_horizontal || is_vertical;
+}
+
+// 辅助函数：返回轮廓边所属面的材质编号（未找到时为 -1）
+// 注意：这个实现假设一个边只属于一个面（即轮廓边），对于内部边可能不准确
+int find_material_for_edge(const ObjModel& obj_model, const EdgeFaceRef& edge_face) {
+    return edge_face.face >= 0 ? obj_model.faces[edge_face.face].material : -1;
+}
+
+// 修改 collect_samples_from_edges，传递原始材质名
+void collect_samples_from_edges(
+    const ObjModel& obj_model,
+    const std::vector<Edge>& boundary_edges, // 只传入轮廓边
+    const EdgeFaceIndex& edge_faces,
+    const MaterialTable& materials,
+    float voxel_size,
+    PaletteManager& palette_manager,
+    const CancelFlag* cancel)
+{
+    Logger::info(Message::get("START_EDGE_SAMPLING"));
+
+    std::vector<std::vector<uint32_t>> colors_by_material(materials.size());
+    for (const auto& edge : boundary_edges) {
+        throw_if_cancelled(cancel);
+        // 1. 确定这条边使用的材质
+        const EdgeFaceRef edge_face = edge_faces.find(edge);
+        int material_id = find_material_for_edge(obj_model, edge_face);
+        if (material_id < 0) continue;
+        const ResolvedMaterial& material = materials[material_id];
+        if (!material.mtl) continue;
+
+        // 2. 获取物理标签
+        if (!material.profile || material.profile->td_note.empty()) continue;
+
+        // 3. 获取边的顶点和UV坐标
+        const Vec3& start_pos = obj_model.vertices[edge.start_index];
+        const Vec3& end_pos = obj_model.vertices[edge.end_index];
+
+        // 对应的UV索引由轮廓边索引给出
+        const int uv_start_index = edge_face.uv_start;
+        const int uv_end_index = edge_face.uv_end;
+
+        // 4. 沿着边进行插值采样
+        int num_samples = calc_voxel_strip_placement(edge.length, voxel_size).voxel_count;
+
+        auto& colors = colors_by_material[material_id];
+        for (int i = 0; i < num_samples; ++i) {
+            float t = (i + 0.5f) / num_samples;
+            // 这里我们只用两个端点的UV，等价于重心坐标(u, v, w) = (1-t, t, 0)，第三个UV索引不用
+            colors.push_back(sample_material_color(
+                obj_model.texcoords, material,
+                1.0f - t, t, 0.0f,
+                uv_start_index, uv_end_index, 0));
+        }
+    }
+    for (size_t id = 0; id < materials.size(); ++id) {
+        palette_manager.collect_samples(*materials[id].name, colors_by_material[id]);
+    }
+}
+
+/**
+ * @brief 为单个边缘段创建体素条模型.
+ * * 该函数负责对一条（可能被分割过的）短边进行体素化。它会沿着边进行纹理插值采样，
+ * 然后使用全局的PaletteManager来查询每个采样点对应的、已量化且带有正确材质的颜色索引。
+ * * @param obj_model 完整的OBJ模型数据.
+ * @param segment 当前要处理的短边段.
+ * @param original_edge 未被分割的原始长边，用于正确的UV插值.
+ * @param voxel_size 体素的世界尺寸.
+ * @param min_x, min_y 世界坐标的最小边界，用于坐标转换.
+ * @param edge_faces 轮廓边 -> 所属面与UV索引.
+ * @param materials 按材质编号预先解析的材质表.
+ * @param palette_manager 全局调色板和材质管理器.
+ * @param edge_group_index 原始长边的唯一ID，用于命名.
+ * @return 包含一个或多个为该边段生成的SubModel的向量.
+ */
+// 修改 create_edge_models，传递原始材质名
+std::vector<SubModel> create_edge_models(
+    const ObjModel& obj_model,
+    const Edge& segment,
+    const Edge& original_edge,
+    float voxel_size, float min_x, float min_y,
+    const EdgeFaceIndex& edge_faces,
+    const MaterialTable& materials,
+    const PaletteManager& palette_manager,
+    int edge_group_index,
+    int segment_index // 新增
+) {
+    std::vector<SubModel> subModels;
+
+    // 1. 确定材质、纹理和物理标签 ($TD_note)
+    const EdgeFaceRef original_face = edge_faces.find(original_edge);
+    int material_id = find_material_for_edge(obj_model, original_face);
+    if (material_id < 0 || !materials[material_id].mtl) return subModels; // 边没有有效材质
+    const ResolvedMaterial& material = materials[material_id];
+    if (!material.profile) return subModels; // 材质没有物理分类
+
+
+    // 2. 获取原始长边的顶点和UV坐标
+    const Vec3& orig_start_pos = obj_model.vertices[original_edge.start_index];
+    const Vec3& seg_start_pos = obj_model.vertices[segment.start_index];
+
+    const int uv_start_index = original_face.uv_start;
+    const int uv_end_index = original_face.uv_end;
+
+
+    // 3. 计算当前短边段在原始长边上的起止比例 (t_start, t_end)
+    float dist_from_start = std::sqrt(pow(seg_start_pos.x - orig_start_pos.x, 2) + pow(seg_start_pos.y - orig_start_pos.y, 2));
+    float t_start = (original_edge.length > 1e-6) ? (dist_from_start / original_edge.length) : 0.0f;
+    float t_end = (original_edge.length > 1e-6) ? ((dist_from_start + segment.length) / original_edge.length) : 1.0f;
+    t_start = std::max(0.0f, std::min(1.0f, t_start));
+    t_end = std::max(0.0f, std::min(1.0f, t_end));
+
+    // 4. 计算体素条长度和中心偏移
+    VoxelStripPlacement placement = calc_voxel_strip_placement(segment.length, voxel_size);
+    const int palette_material = palette_manager.material_id(*material.name); // 整条边共用同一材质
+    int totalVoxels = placement.voxel_count;
+
+    // 我们将把体素条分割成不超过MAX_VOX_SIZE的块
+    int numSubModels = (totalVoxels + MAX_VOX_SIZE - 1) / MAX_VOX_SIZE;
+
+    for (int i = 0; i < numSubModels; ++i) {
+        int startVoxelOffset = i * MAX_VOX_SIZE;
+        int subLength = std::min(MAX_VOX_SIZE, totalVoxels - startVoxelOffset);
+        if (subLength <= 0) continue;
+
+        uint8_t* voxelData = (uint8_t*)malloc(subLength);
+        if (!voxelData) continue;
+        
+        // 为体素条中的每个体素进行UV插值和颜色采样
+        for (int j = 0; j < subLength; ++j) {
+            float t_local = (float)(startVoxelOffset + j + 0.5f) / (float)totalVoxels;
+            float t_global = t_start + t_local * (t_end - t_start);
+
+            // 插值UV索引和权重
+            // 这里我们只用两个端点的UV，等价于重心坐标(u, v, w) = (1-t, t, 0)
+            float u = 1.0f - t_global;
+            float v = t_global;
+            float w = 0.0f;
+            uint32_t color_rgb = sample_material_color(
+                obj_model.texcoords, material,
+                u, v, w,
+                uv_start_index, uv_end_index, 0); // 第三个UV索引不用
+            voxelData[j] = palette_manager.get_final_index(color_rgb, palette_material);
+        }
+        
+        // 5. 组装SubModel
+        ogt_vox_model* model = (ogt_vox_model*)malloc(sizeof(ogt_vox_model));
+        if (!model) {
+            free(voxelData);
+            continue;
+        }
+        memset(model, 0, sizeof(ogt_vox_model));
+        model->size_x = subLength;
+        model->size_y = 1;
+        model->size_z = 1;
+        model->voxel_data = voxelData;
+
+        SubModel sub;
+        sub.model.reset(model);
+
+        // 设置变换、名称和其他属性
+        sub.isEdge = true;
+        char name_buffer[64];
+        sprintf(name_buffer, "edge_%d_seg_%d", edge_group_index, i);
+        sub.name = name_buffer;
+        
+        sub.edgeInfo.startPos = obj_model.vertices[segment.start_index];
+        sub.edgeInfo.endPos = obj_model.vertices[segment.end_index];
+        sub.edgeInfo.length = segment.length;
+
+        // === 计算分段体素条的精确中心 ===
+        // 1. 分段方向单位向量
+        Vec3 dir = {
+            sub.edgeInfo.endPos.x - sub.edgeInfo.startPos.x,
+            sub.edgeInfo.endPos.y - sub.edgeInfo.startPos.y,
+            0.0f
+        };
+        float len = std::sqrt(dir.x * dir.x + dir.y * dir.y);
+        if (len > 1e-6f) {
+            dir.x /= len;
+            dir.y /= len;
+        }
+        // 2. 法线
+        // --- 修复：使用依赖于面的法线，而不是固定的左手法则法线 ---
+        // 首先找到这条边属于哪个面（分割出的新顶点不属于任何面，此时使用兜底法线）
+        const int segment_face = edge_faces.find(segment).face;
+        const Face* parent_face = (segment_face >= 0) ? &obj_model.faces[segment_face] : nullptr;
+        // 如果找到了所属面，则计算正确的、依赖于面朝向的法线
+        Vec3 normal = (parent_face) ? 
+                      get_edge_polygon_outer_normal(segment, *parent_face, obj_model.vertices) :
+                      get_edge_outer_normal(segment, obj_model); // 兜底
+
+        // 计算本分块中心在分段上的t
+        float center_offset = (float)startVoxelOffset + subLength / 2.0f;
+        float t_center = center_offset / (float)totalVoxels;
+
+        // 3. 分段体素条中心点
+        Vec3 seg_center = {
+            sub.edgeInfo.startPos.x + (sub.edgeInfo.endPos.x - sub.edgeInfo.startPos.x) * t_center,
+            sub.edgeInfo.startPos.y + (sub.edgeInfo.endPos.y - sub.edgeInfo.startPos.y) * t_center,
+            sub.edgeInfo.startPos.z + (sub.edgeInfo.endPos.z - sub.edgeInfo.startPos.z) * t_center
+        };
+
+        // --- 修复：偏移量修正，以消除拼接边上的棱和缝隙 ---
+        // 边体素条沿边的外向法线方向移动，补偿体素条宽度
+        float offset = voxel_size * EDGE_OFFSET_MULTIPLIER;
+        Vec3 offset_mid = {
+            seg_center.x + placement.offset_along_edge * dir.x + normal.x * offset,
+            seg_center.y + placement.offset_along_edge * dir.y + normal.y * offset,
+            seg_center.z
+        };
+
+        sub.transform = ogt_vox_transform_get_identity();
+        sub.transform.m30 = (offset_mid.x - min_x) / voxel_size;
+        sub.transform.m31 = (offset_mid.y - min_y) / voxel_size;
+        sub.transform.m32 = 0.0f;
+
+        subModels.push_back(std::move(sub));
+    }
+
+    return subModels;
+}
+
+// ==========================================================================================
+// 结束：用于创建边缘模型的代码块
+// ==========================================================================================
+
+// 第三遍：创建最终的子模型
+// 修改 create_final_models，传递原始材质名
+std::vector<SubModel> create_final_models(
+    ObjModel& obj_model,
+    const MaterialTable& materials,
+    float voxel_size,
+    const PaletteManager& palette_manager,
+    const std::vector<Edge>& boundary_edges, // 新增参数
+    const EdgeFaceIndex& edge_faces,
+    const SurfaceRaster& raster,
+    int threads,
+    const CancelFlag* cancel
+)
+{
+    std::vector<SubModel> allSubModels;
+
+    // 1. 计算边界盒
+    float min_x = FLT_MAX, max_x = -FLT_MAX, min_y = FLT_MAX, max_y = -FLT_MAX;
+    for (const auto& vertex : obj_model.vertices) {
+        min_x = std::min(min_x, vertex.x); max_x = std::max(max_x, vertex.x);
+        min_y = std::min(min_y, vertex.y); max_y = std::max(max_y, vertex.y);
+    }
+    min_x -= voxel_size; min_y -= voxel_size;
+    max_x += voxel_size; max_y += voxel_size;
+
+    int total_voxel_x = calc_voxel_strip_length((max_x - min_x) , voxel_size);
+    int total_voxel_y = calc_voxel_strip_length((max_y - min_y) , voxel_size);
+
+    // 2. 创建平面子模型
+    int numSubModelsX = (total_voxel_x + MAX_VOX_SIZE - 1) / MAX_VOX_SIZE;
+    int numSubModelsY = (total_voxel_y + MAX_VOX_SIZE - 1) / MAX_VOX_SIZE;
+
+    // --- 核心修复：由轮廓边串成有序顶点环，用于凹多边形检测 ---
+    // --- 修改：支持多个轮廓环（孔洞、分离的岛），每个环都从剩余编号最小的未使用边开始追踪 ---
+    std::vector<std::vector<Vec3>> boundary_loops;
+    if (!boundary_edges.empty()) {
+        const std::vector<Edge>& sorted_edges = boundary_edges;
+        std::vector<bool> used(sorted_edges.size(), false);
+        std::unordered_map<int, std::vector<size_t>> vertex_to_edges; // 顶点 -> 相连的边（编号升序）
+        for (size_t j = 0; j < sorted_edges.size(); ++j) {
+            vertex_to_edges[sorted_edges[j].start_index].push_back(j);
+            if (sorted_edges[j].end_index != sorted_edges[j].start_index) {
+                vertex_to_edges[sorted_edges[j].end_index].push_back(j);
+            }
+        }
+
+        for (size_t first = 0; first < sorted_edges.size(); ++first) {
+            if (used[first]) continue;
+            std::vector<Vec3> loop;
+            loop.push_back(obj_model.vertices[sorted_edges[first].start_index]);
+            int current_vertex_idx = sorted_edges[first].end_index;
+            used[first] = true;
+
+            while (true) {
+                bool found_next = false;
+                for (size_t j : vertex_to_edges[current_vertex_idx]) {
+                    if (used[j]) continue;
+                    loop.push_back(obj_model.vertices[current_vertex_idx]);
+                    current_vertex_idx = (sorted_edges[j].start_index == current_vertex_idx) ? sorted_edges[j].end_index : sorted_edges[j].start_index;
+                    used[j] = true;
+                    found_next = true;
+                    break;
+                }
+                if (!found_next) break; // 当前环已闭合（或无法继续）
+            }
+            boundary_loops.push_back(std::move(loop));
+        }
+    }
+    // 如果无法从轮廓边构建多边形，则退回到使用所有顶点（旧的、不准确的方法）
+    if (boundary_loops.empty()) {
+        boundary_loops.push_back(obj_model.vertices);
+    }
+
+    // --- 新增：预先计算每一行体素中心的扫描线交点，逐单元判断时只需一次二分查找 ---
+    std::vector<std::vector<float>> row_crossings(total_voxel_y);
+    for (int gy = 0; gy < total_voxel_y; ++gy) {
+        row_crossings[gy] = compute_scanline_crossings(voxel_cell_center(min_y, gy, voxel_size), boundary_loops);
+    }
+
+    // --- 新增：修剪阶段的预计算。只有距离体素中心不超过查询半径的边才可能导致越界 ---
+    const float voxel_bounding_radius = voxel_size * 0.70710678118f; // sqrt(2)/2
+    const float TRIM_EPSILON = 0.03f; // 容忍误差
+    const float trim_query_radius = voxel_bounding_radius + voxel_size * EDGE_OFFSET_MULTIPLIER + TRIM_EPSILON;
+    BoundaryEdgeGrid edge_grid(obj_model, boundary_edges, edge_faces, trim_query_radius * 2.0f);
+
+    // --- 修改：每个材质在调色板中的编号只解析一次，按面的材质编号查表 ---
+    std::vector<int> palette_material(materials.size());
+    for (size_t id = 0; id < materials.size(); ++id) {
+        palette_material[id] = palette_manager.material_id(*materials[id].name);
+    }
+
+    // --- 修改：各子模型（瓦片）相互独立，按 --threads 并行光栅化，结果按瓦片序号（行优先）合并以保证输出确定 ---
+    size_t num_tiles = static_cast<size_t>(numSubModelsX) * numSubModelsY;
+    std::vector<SubModel> tile_models(num_tiles);
+    parallel_for(num_tiles, threads, [&](size_t tile_index) {
+        int subX = static_cast<int>(tile_index % numSubModelsX);
+        int subY = static_cast<int>(tile_index / numSubModelsX);
+        std::vector<int> nearby_edges; // 每个瓦片独立的候选边缓冲区
+        int startX = subX * MAX_VOX_SIZE;
+        int startY = subY * MAX_VOX_SIZE;
+        int subSizeX = std::min(MAX_VOX_SIZE, total_voxel_x - startX);
+        int subSizeY = std::min(MAX_VOX_SIZE, total_voxel_y - startY);
+
+        std::vector<uint8_t> tempVoxelData(subSizeX * subSizeY, 0);
+        bool has_solid_voxel = false;
+
+        for (int vy = 0; vy < subSizeY; ++vy) {
+            for (int vx = 0; vx < subSizeX; ++vx) {
+                float cx = voxel_cell_center(min_x, startX + vx, voxel_size);
+                float cy = voxel_cell_center(min_y, startY + vy, voxel_size);
+                size_t raster_cell = static_cast<size_t>(startY + vy) * raster.size_x + (startX + vx);
+
+                const Face* hit_face = nullptr;
+                // --- 核心修复：使用正确的轮廓多边形进行内部判断（按行预计算的扫描线交点） ---
+                if (is_inside_scanline(cx, row_crossings[startY + vy]) && raster.hit_face[raster_cell] >= 0) {
+                    // 复用采样阶段找到的三角形（用于颜色和材质）
+                    hit_face = &obj_model.faces[raster.hit_face[raster_cell]];
+                }
+                
+                // === 核心修复：实现高精度修剪逻辑 ===
+                bool skip = false;
+                if (hit_face) {
+                    // 1. 只遍历体素附近的轮廓边，寻找任何一个导致“越界”的有效边
+                    //    遮挡边必然与“中心->垂点”线段相交，因此也一定在同一批候选边中
+                    edge_grid.query(cx, cy, trim_query_radius, nearby_edges);
+                    for (int edge_id : nearby_edges) {
+                        const auto& edge = edge_grid.edges[edge_id];
+
+                        // a. 检查垂点是否在边上
+                        if (edge.len2 < 1e-10f) continue; // 边长为0
+                        float t = ((cx - edge.x1) * edge.dx + (cy - edge.y1) * edge.dy) / edge.len2;
+                        if (t < 0.0f || t > 1.0f) {
+                            continue; // 垂点在延长线上，此边无效
+                        }
+                        float proj_x = edge.x1 + t * edge.dx;
+                        float proj_y = edge.y1 + t * edge.dy;
+                        float to_proj_x = proj_x - cx, to_proj_y = proj_y - cy;
+                        if (to_proj_x * to_proj_x + to_proj_y * to_proj_y > trim_query_radius * trim_query_radius) {
+                            continue; // 超出查询半径，不可能导致越界
+                        }
+
+                        // b. 检查视线是否被遮挡
+                        bool is_occluded = false;
+                        for (int other_id : nearby_edges) {
+                            if (other_id == edge_id) continue; // 不与自身比较
+                            const auto& other_edge = edge_grid.edges[other_id];
+                            // 简单的线段相交测试
+                            auto cross_product = [](float x1, float y1, float x2, float y2) { return x1*y2 - x2*y1; };
+                            float d1 = cross_product(other_edge.dx, other_edge.dy, cx-other_edge.x1, cy-other_edge.y1);
+                            float d2 = cross_product(other_edge.dx, other_edge.dy, proj_x-other_edge.x1, proj_y-other_edge.y1);
+                            float d3 = cross_product(proj_x-cx, proj_y-cy, other_edge.x1-cx, other_edge.y1-cy);
+                            float d4 = cross_product(proj_x-cx, proj_y-cy, other_edge.x2-cx, other_edge.y2-cy);
+                            if (d1 * d2 < 0 && d3 * d4 < 0) {
+                                is_occluded = true;
+                                break;
+                            }
+                        }
+                        if (is_occluded) {
+                            continue; // 视线被遮挡，此边无效
+                        }
+
+                        // c. 计算到虚拟边界的有符号距离并判断是否越界（所属面与外法线已预计算）
+                        if (!edge.has_parent_face) continue;
+
+                        const Vec3& normal = edge.outer_normal;
+                        Vec3 vec_to_center = {cx - proj_x, cy - proj_y, 0.0f};
+                        float signed_dist = vec_to_center.x * normal.x + vec_to_center.y * normal.y;
+                        float dist_to_virtual_edge = signed_dist - (voxel_size * EDGE_OFFSET_MULTIPLIER) - TRIM_EPSILON;
+
+                        if (dist_to_virtual_edge + voxel_bounding_radius > 0) {
+                            skip = true; // 发现越界，立即判定修剪并跳出循环
+                            break;
+                        }
+                    }
+                }
+
+                if (hit_face && !skip) {
+                    // 颜色已在采样阶段求出，这里只查找调色板索引
+                    uint8_t final_index = palette_manager.get_final_index(raster.color[raster_cell], palette_material[hit_face->material]);
+                    if (final_index != 0) {
+                        tempVoxelData[vx + vy * subSizeX] = final_index;
+                        has_solid_voxel = true;
+                    }
+                }
+            }
+        }
+
+        if (has_solid_voxel) {
+            int min_vx = subSizeX, max_vx = -1, min_vy = subSizeY, max_vy = -1;
+            for (int vy = 0; vy < subSizeY; ++vy) {
+                for (int vx = 0; vx < subSizeX; ++vx) {
+                    if (tempVoxelData[vx + vy * subSizeX] != 0) {
+                        min_vx = std::min(min_vx, vx); max_vx = std::max(max_vx, vx);
+                        min_vy = std::min(min_vy, vy); max_vy = std::max(max_vy, vy);
+                    }
+                }
+            }
+
+            int finalSizeX = max_vx - min_vx + 1;
+            int finalSizeY = max_vy - min_vy + 1;
+
+            ogt_vox_model* model = (ogt_vox_model*)malloc(sizeof(ogt_vox_model));
+            if (!model) {
+                Logger::error(Message::get("CANNOT_ALLOC_MODEL"));
+                return;
+            }
+            memset(model, 0, sizeof(ogt_vox_model));
+            model->size_x = finalSizeX;
+            model->size_y = finalSizeY;
+            model->size_z = 1;
+
+            uint8_t* writable_voxel_data = (uint8_t*)malloc((size_t)finalSizeX * finalSizeY * 1);
+            if (!writable_voxel_data) {
+                Logger::error(Message::get("CANNOT_ALLOC_VOXEL"));
+                free(model);
+                return;
+            }
+
+            for (int vy = 0; vy < finalSizeY; ++vy) {
+                for (int vx = 0; vx < finalSizeX; ++vx) {
+                    writable_voxel_data[vx + vy * finalSizeX] = tempVoxelData[(min_vx + vx) + (min_vy + vy) * subSizeX];
+                }
+            }
+
+            model->voxel_data = writable_voxel_data;
+
+            SubModel sub;
+            sub.model.reset(model);
+
+            // 计算子模型的旋转中心和全局位置
+            int pivotX = std::floor(finalSizeX / 2.0f);
+            int pivotY = std::floor(finalSizeY / 2.0f);
+
+            sub.transform = ogt_vox_transform_get_identity();
+            sub.transform.m30 = static_cast<float>(startX + min_vx + pivotX);
+            sub.transform.m31 = static_cast<float>(startY + min_vy + pivotY);
+
+            sub.name = "plane_" + std::to_string(subX) + "_" + std::to_string(subY);
+            sub.isEdge = false;
+            tile_models[tile_index] = std::move(sub);
+        }
+    }, cancel);
+    for (auto& sub : tile_models) {
+        if (sub.model) allSubModels.push_back(std::move(sub));
+    }
+
+    Logger::info(Message::get("PLANE_MODEL_DONE", { {"count", std::to_string(allSubModels.size())} }));
+
+    return allSubModels;
+}
+
+// 生成包含NOTE和MATL的VOX场景，文件内容写入 out_buffer
+bool build_vox_scene_with_notes_and_materials(
+    const std::vector<SubModel>& subModels, 
+    const ogt_vox_palette& palette,
+    const std::map<uint8_t, std::string>& notes,
+    const std::map<uint8_t, ogt_vox_matl>& materials,
+    std::vector<uint8_t>& out_buffer) 
+{
+    if (subModels.empty()) {
+        Logger::error(Message::get("CANNOT_SAVE_EMPTY_SCENE"));
+        return false;
+    }
+
+    ogt_vox_scene scene;
+    memset(&scene, 0, sizeof(scene));
+
+    std::vector<const ogt_vox_model*> model_pointers;
+    std::vector<ogt_vox_instance>     scene_instances;
+    std::vector<ogt_vox_layer>        scene_layers;
+    std::vector<ogt_vox_group>        scene_groups;
+    std::vector<std::string>          instance_name_storage;
+    std::vector<std::string>          notes_storage;
+    std::vector<const char*>          color_name_pointers;
+
+    // 1. 填充模型数据
+    scene.num_models = subModels.size();
+    model_pointers.reserve(scene.num_models);
+    for (const auto& sub_model : subModels) {
+        model_pointers.push_back(sub_model.model.get());
+    }
+    scene.models = model_pointers.data();
+
+    // 2. 填充实例数据
+    scene.num_instances = subModels.size();
+    scene_instances.resize(scene.num_instances);
+    instance_name_storage.reserve(scene.num_instances);
+    for (size_t i = 0; i < scene.num_instances; ++i) {
+        instance_name_storage.push_back(subModels[i].name);
+        
+        ogt_vox_instance& instance = scene_instances[i];
+        
+        instance.model_index = i;
+        instance.transform = subModels[i].transform;
+        instance.layer_index = 0;
+        instance.group_index = 0;
+        instance.name = instance_name_storage.back().c_str();
+        instance.hidden = false;
+        memset(&instance.transform_anim, 0, sizeof(instance.transform_anim));
+        memset(&instance.model_anim, 0, sizeof(instance.model_anim));
+    }
+    scene.instances = scene_instances.data();
+
+    // 3. 填充调色板
+    scene.palette = palette;
+
+    // 4. 填充材质数据
+    for (const auto& pair : materials) {
+        uint8_t palette_index = pair.first;
+        // 跳过所有保留色
+        if (!is_reserved_palette_index(palette_index)) {
+            scene.materials.matl[palette_index] = pair.second;
+        }
+    }
+
+    // 5. 填充颜色名称 (NOTE块)
+    if (!notes.empty()) {
+        // --- 第1步: 预分配内存，并按“反向”顺序填充所有字符串 ---
+        // 这是为了匹配 ogt_vox 库或Teardown的“反向写入”行为。
+        // 首先清空，然后预分配内存，以避免循环中的内存重分配（这是上次修复的关键）。
+        notes_storage.clear();
+        notes_storage.reserve(32);
+
+        // 使用原始的“反向”循环 (31 -> 0)，这才是符合库要求的正确顺序。
+        for (int group = 31; group >= 0; group--) {
+            std::string note_for_group;
+            // 在该组的8个调色板索引中寻找一个有效的note
+            for (int i = 1; i <= 8; i++) {
+                int palette_index = group * 8 + i;
+                if (palette_index > 255) continue;
+
+                if (is_reserved_palette_index(palette_index)) {
+                    continue;
+                }
+
+                auto it = notes.find((uint8_t)palette_index);
+                if (it != notes.end() && !it->second.empty()) {
+                    note_for_group = it->second;
+                    break; // 找到即可，该组共用一个note
+                }
+            }
+            // 依次将 group 31, 30, ..., 0 的note推入vector
+            notes_storage.push_back(note_for_group);
+        }
+
+        // 经过上一步，notes_storage[0] 存的是 group 31 的note, 
+        // notes_storage[1] 是 group 30 的note, ..., notes_storage[31] 是 group 0 的note。
+        // 这正是库所期望的“颠倒的”顺序。
+
+        // --- 第2步: 在所有字符串的内存地址都稳定后，安全地获取它们的指针 ---
+        color_name_pointers.clear();
+        color_name_pointers.reserve(32);
+        for (const auto& note_str : notes_storage) {
+            color_name_pointers.push_back(note_str.c_str());
+        }
+
+        // --- 第3步: 将最终结果赋给scene ---
+        // 库会反向处理这个列表，将 color_name_pointers[31] (第0组的note) 作为文件中的第一个note。
+        scene.num_color_names = color_name_pointers.size();
+        scene.color_names = color_name_pointers.data();
+
+        // 为了避免混淆，可以移除或修改循环内的打印语句，因为它的打印顺序与最终文件的逻辑顺序是相反的。
+    }
+
+    // 6. 填充层数据
+    scene_layers.resize(1);
+    scene_layers[0].name = "default_layer";
+    scene_layers[0].hidden = false;
+    memset(&scene_layers[0].color, 0, sizeof(scene_layers[0].color));
+    scene.num_layers = scene_layers.size();
+    scene.layers = scene_layers.data();
+
+    // 7. 填充组数据
+    scene_groups.resize(1);
+    scene_groups[0].name = "default_group";
+    scene_groups[0].hidden = false;
+    scene_groups[0].layer_index = 0;
+    scene_groups[0].parent_group_index = k_invalid_group_index;
+    scene_groups[0].transform = ogt_vox_transform_get_identity();
+    memset(&scene_groups[0].transform_anim, 0, sizeof(scene_groups[0].transform_anim));
+    scene.num_groups = scene_groups.size();
+    scene.groups = scene_groups.data();
+
+    // 8. 创建场景并复制到输出缓冲区
+    uint32_t buffer_size = 0;
+    uint8_t* buffer = ogt_vox_write_scene(&scene, &buffer_size);
+    if (!buffer) {
+        Logger::error(Message::get("CANNOT_GEN_VOX_SCENE"));
+        return false;
+    }
+    out_buffer.assign(buffer, buffer + buffer_size);
+    ogt_vox_free(buffer);
+    return true;
+}
+
+// 将VOX文件内容写入磁盘
+bool save_vox_buffer(const std::filesystem::path& out_path, const std::vector<uint8_t>& buffer) {
+    FILE* f = nullptr;
+    #ifdef _WIN32
+        f = _wfopen(out_path.wstring().c_str(), L"wb");
+    #else
+        f = fopen(out_path.string().c_str(), "wb");
+    #endif
+    if (!f) {
+        Logger::error(Message::get("CANNOT_CREATE_OUTPUT", { {"filename", out_path.generic_string()} })); // <-- 修改
+        return false;
+    }
+    
+    fwrite(buffer.data(), 1, buffer.size(), f);
+    fclose(f);
+    
+    Logger::info(Message::get("SAVE_VOX_SUCCESS", { {"filename", out_path.generic_string()} })); // <-- 修改
+    return true;
+}
+
+// 单个表面的体素化结果：VOX文件内容与XML节点树
+struct VoxelizeOutput {
+    std::vector<uint8_t> vox_bytes;
+    XmlNode xml_root;
+};
+
+// --- 新增：全局调色板的采样结果：所有表面的样本，以及量化时需要的材质分类与MTL材质 ---
+struct PaletteSamples {
+    PaletteManager samples;
+    std::map<std::string, MaterialProfile> profiles;
+    std::map<std::string, MtlMaterial> materials;
+};
+
+// 体素化已加载的表面模型，结果保存在内存中，成功返回 true
+// mesh_path 用于定位MTL（材质分类的缓存键），vox_file_path 为XML中引用的VOX路径
+// sample_into 不为空时只执行采样阶段，样本累积到其中（用于构建全局调色板），不生成模型
+bool voxelize_model(ObjModel& obj_model, const std::filesystem::path& mesh_path, const std::string& texture_dir,
+                    const std::string& vox_file_path, const std::string& group_pos, const std::string& group_rot,
+                    const CommandLineArgs& args, AssetCache& cache, VoxelizeOutput& output,
+                    PaletteSamples* sample_into = nullptr) {
+    throw_if_cancelled(cache.cancel);
+    // 3. 材质分析
+    Logger::info(Message::get("PHASE_1_ANALYZE_MATERIAL"));
+
+    // --- 修改：传递新的参数给 classify_materials ---
+    // 批处理模式下，同一个MTL的分类结果只计算一次
+    std::string profile_key = obj_model.mtl_filename.empty() ? std::string() :
+        (mesh_path.parent_path() / obj_model.mtl_filename).lexically_normal().generic_string();
+    auto profile_it = cache.profiles.find(profile_key);
+    if (profile_it == cache.profiles.end()) {
+        profile_it = cache.profiles.emplace(profile_key, classify_materials(obj_model.materials, args.material_maps, args.material_properties)).first;
+    }
+    const auto& material_profiles = profile_it->second;
+
+    // 4. 加载所有用到的纹理图片（纹理目录由调用方确定）
+    const int threads = resolve_thread_count(args.threads);
+    TextureMap texture_map = load_all_textures(obj_model, texture_dir, &cache, threads);
+    // --- 新增：按面的材质编号预先解析纹理、兜底颜色和物理分类 ---
+    const MaterialTable materials = resolve_materials(obj_model, texture_map, material_profiles);
+
+    // 6. 初始化调色板管理器
+    // --- 新增：指定了全局调色板时直接使用（同一个MTL只载入一次），不再单独采样与量化 ---
+    std::shared_ptr<const PaletteManager> fixed_palette;
+    if (!args.palette_file.empty() && !sample_into) {
+        auto fixed_it = cache.fixed_palettes.find(profile_key);
+        if (fixed_it == cache.fixed_palettes.end()) {
+            auto loaded = std::make_shared<PaletteManager>();
+            if (!loaded->load_fixed(std::filesystem::u8path(args.palette_file), material_profiles)) {
+                Logger::warn(Message::get("PALETTE_FALLBACK"));
+                loaded.reset();
+            }
+            fixed_it = cache.fixed_palettes.emplace(profile_key, std::move(loaded)).first;
+        }
+        fixed_palette = fixed_it->second;
+    }
+    PaletteManager local_palette;
+    PaletteManager& sampler = sample_into ? sample_into->samples : local_palette;
+    const PaletteManager& palette_manager = fixed_palette ? *fixed_palette : local_palette;
+
+    // 7. 全局采样阶段 (第一遍)
+    Logger::info(Message::get("PHASE_2_GLOBAL_SAMPLING"));
+    float min_x = FLT_MAX, max_x = -FLT_MAX, min_y = FLT_MAX, max_y = -FLT_MAX;
+    for (const auto& vertex : obj_model.vertices) {
+        min_x = std::min(min_x, vertex.x); max_x = std::max(max_x, vertex.x);
+        min_y = std::min(min_y, vertex.y); max_y = std::max(max_y, vertex.y);
+    }
+    min_x -= args.voxel_size; min_y -= args.voxel_size;
+    max_x += args.voxel_size; max_y += args.voxel_size;
+    int total_voxel_x = calc_voxel_strip_length((max_x - min_x) , args.voxel_size);
+    int total_voxel_y = calc_voxel_strip_length((max_y - min_y) , args.voxel_size);
+
+    // 7.1 从平面采样
+    // 采样阶段的光栅化结果（命中面与颜色）保存在 surface_raster 中，建模阶段直接复用
+    TriangleGrid triangle_grid(obj_model);
+    SurfaceRaster surface_raster;
+    collect_samples_from_model(obj_model, materials, args.voxel_size, fixed_palette ? nullptr : &sampler, min_x, min_y, total_voxel_x, total_voxel_y, triangle_grid, threads, surface_raster, cache.cancel);
+    
+    // 7.2 << 新增：识别轮廓边 >>
+    std::map<std::pair<int, int>, int> edge_counts;
+    for (const auto& edge : obj_model.original_edges) {
+        std::pair<int, int> key = {std::min(edge.start_index, edge.end_index), std::max(edge.start_index, edge.end_index)};
+        edge_counts[key]++;
+    }
+    std::vector<Edge> boundary_edges;
+    for (const auto& edge : obj_model.original_edges) {
+        std::pair<int, int> key = {std::min(edge.start_index, edge.end_index), std::max(edge.start_index, edge.end_index)};
+        if (edge_counts[key] == 1) {
+            Edge e = edge;
+            e.is_aligned = is_edge_aligned(edge, obj_model.vertices);
+            boundary_edges.push_back(e);
+        }
+    }
+    Logger::info(Message::get("FOUND_EDGES", { {"total_edges", std::to_string(obj_model.original_edges.size())}, {"boundary_edges", std::to_string(boundary_edges.size())} }));
+    // --- 新增：轮廓边 -> 所属面与UV索引只建立一次，边采样、修剪和边体素条共用 ---
+    const EdgeFaceIndex edge_faces(obj_model, boundary_edges);
+    
+    if (!fixed_palette) {
+        // 7.3 << 新增：从轮廓边采样 >>
+        collect_samples_from_edges(obj_model, boundary_edges, edge_faces, materials, args.voxel_size, sampler, cache.cancel);
+        if (sample_into) {
+            if (sample_into->profiles.empty()) {
+                sample_into->profiles = material_profiles;
+                sample_into->materials = obj_model.materials;
+            }
+            return true;
+        }
+
+        // 8. 量化阶段 (第二遍)
+        Logger::info(Message::get("PHASE_3_COLOR_QUANTIZATION"));
+        local_palette.process_and_quantize(material_profiles, obj_model.materials, args);
+    }
+
+    // 9. 创建最终模型 (第三遍)
+    throw_if_cancelled(cache.cancel);
+    Logger::info(Message::get("PHASE_4_CREATE_FINAL_MODEL"));
+
+    // 9.1 创建平面模型
+    std::vector<SubModel> allSubModels = create_final_models(obj_model, materials, args.voxel_size, palette_manager, boundary_edges, edge_faces, surface_raster, threads, cache.cancel);
+
+    // 9.2 << 新增：创建边缘模型 >>
+    // --- 修改：先串行分割所有边（分割会向 obj_model 追加顶点），再并行生成各分段的体素条，按原顺序合并 ---
+    struct EdgeSegmentJob {
+        const Edge* edge;
+        Edge segment;
+        int edge_group_index;
+        int segment_index;
+    };
+    std::vector<EdgeSegmentJob> segment_jobs;
+    int edge_group_index = 0;
+    // (这里的 boundary_edges 是第2步中已经识别出的轮廓边)
+    for (const auto& edge : boundary_edges) {
+        /*
+         平面的轴对齐边在体素化后可能存在误差，仍旧需要边体素条来完善视觉效果
+        */
+        // if (is_edge_aligned(edge, obj_model.vertices)) {
+        //      continue;
+        // }
+
+        std::vector<Edge> segments = split_single_edge(edge, obj_model, args.voxel_size);
+
+        for (size_t seg_idx = 0; seg_idx < segments.size(); ++seg_idx) {
+            segment_jobs.push_back({ &edge, segments[seg_idx], edge_group_index, static_cast<int>(seg_idx) }); // 传递唯一的segment_index
+        }
+        edge_group_index++;
+    }
+
+    std::vector<std::vector<SubModel>> segment_models(segment_jobs.size());
+    parallel_for(segment_jobs.size(), threads, [&](size_t job_index) {
+        const auto& seg_job = segment_jobs[job_index];
+        segment_models[job_index] = create_edge_models(
+            obj_model, seg_job.segment, *seg_job.edge, args.voxel_size, min_x, min_y,
+            edge_faces, materials, palette_manager,
+            seg_job.edge_group_index,
+            seg_job.segment_index
+        );
+    }, cache.cancel);
+
+    std::vector<SubModel> edgeSubModels;
+    for (auto& models : segment_models) {
+        edgeSubModels.insert(edgeSubModels.end(),
+                         std::make_move_iterator(models.begin()),
+                         std::make_move_iterator(models.end()));
+    }
+    Logger::info(Message::get("EDGE_MODEL_DONE", { {"count", std::to_string(edgeSubModels.size())} }));
+
+    // 9.3 合并所有子模型
+    allSubModels.insert(allSubModels.end(),
+                        std::make_move_iterator(edgeSubModels.begin()),
+                        std::make_move_iterator(edgeSubModels.end()));
+
+    if (allSubModels.empty()) {
+        Logger::error(Message::get("NO_VALID_SUBMODEL"));
+        return false;
+    }
+    
+    // 10. 生成VOX场景与XML
+    auto final_palette = palette_manager.get_palette();
+    auto final_notes = palette_manager.get_notes();
+    auto final_materials = palette_manager.get_materials();
+
+    // === 新增：计算所有SubModel的世界坐标包围盒中心 ===
+    // === 修改：用原始模型顶点的重心作为中心 ===
+    float sum_x = 0.0f, sum_y = 0.0f;
+    int vertex_count = static_cast<int>(obj_model.vertices.size());
+    for (const auto& v : obj_model.vertices) {
+        sum_x += v.x;
+        sum_y += v.y;
+    }
+    float center_x = (vertex_count > 0) ? (sum_x / vertex_count) : 0.0f;
+    float center_y = (vertex_count > 0) ? (sum_y / vertex_count) : 0.0f;
+
+    // 10.1 生成VOX文件内容
+    if (!build_vox_scene_with_notes_and_materials(allSubModels, final_palette, final_notes, final_materials, output.vox_bytes)) {
+        Logger::error(Message::get("SAVE_VOX_FAIL"));
+        return false;
+    }
+
+    // 10.2 构造XmlNode树
+    output.xml_root = XmlNode{
+        "group",
+        {{"name", "obj_model"}, {"pos", group_pos}, {"rot", group_rot}},
+        [&]{
+            std::vector<XmlNode> vox_nodes;
+            // --- 新增：计算缩放比例 ---
+            float scale_value = args.voxel_size / 0.1f;
+            std::string scale_str = std::to_string(scale_value);
+
+            for (const auto& sub : allSubModels) {
+                float world_x = min_x + sub.transform.m30 * args.voxel_size;
+                float world_y = min_y + sub.transform.m31 * args.voxel_size;
+                // The Z coordinate is not directly in the transform for 2D planes,
+                // but it's stored in edgeInfo for edges. For planes, we assume Z=0.
+                float world_z = sub.isEdge ? sub.edgeInfo.startPos.z : 0.0f;
+
+                // === 新增：应用中心偏移 ===
+                float posX = world_x - center_x;
+                float posY = world_z; // Editor's vertical axis (Y) should be OBJ's Z
+                float posZ = -(world_y - center_y); // Editor's Z is the negative of OBJ's Y
+                if (sub.isEdge) {
+                    float edgeAngle = calculate_edge_angle(sub.edgeInfo.startPos, sub.edgeInfo.endPos);
+                    vox_nodes.push_back(XmlNode{
+                        "vox",
+                        {
+                            {"pos", std::to_string(posX) + " " + std::to_string(posY) + " " + std::to_string(posZ)},
+                            {"rot", "0 " + std::to_string(-edgeAngle) + " 0"},
+                            {"scale", scale_str},
+                            {"file", vox_file_path},
+                            {"object", sub.name}
+                        },
+                        {}
+                    });
+                } else {
+                    vox_nodes.push_back(XmlNode{
+                        "vox",
+                        {
+                            {"pos", std::to_string(posX) + " " + std::to_string(posY) + " " + std::to_string(posZ)},
+                            {"rot", "0 0 0"},
+                            {"scale", scale_str},
+                            {"file", vox_file_path},
+                            {"object", sub.name}
+                        },
+                        {}
+                    });
+                }
+            }
+            return vox_nodes;
+        }()
+    };
+    return true;
+}
+
+// 体素化单个表面文件并写出 .vox 和 .xml，成功返回0
+int voxelize_surface(const SurfaceJob& job, const CommandLineArgs& args, AssetCache& cache) {
+    // 2. Parse OBJ file
+    ObjModel obj_model;
+    // Use std::filesystem::path to handle the UTF-8 string correctly
+    if (!load_surface_mesh(std::filesystem::path(job.input_file), obj_model, &cache)) {
+        return 1;
+    }
+
+    std::filesystem::path output_path(job.output_file);
+    if (output_path.empty()) {
+        std::filesystem::path input_path(job.input_file);
+        output_path = input_path.parent_path() / (input_path.stem().string() + ".vox");
+    }
+    std::string vox_file_path = "MOD/vox/" + output_path.filename().string();
+
+    VoxelizeOutput output;
+    if (!voxelize_model(obj_model, std::filesystem::path(job.input_file), find_texture_directory(job.input_file, args),
+                        vox_file_path, job.group_pos, job.group_rot, args, cache, output)) {
+        return 1;
+    }
+
+    // 新增：自动创建输出目录
+    auto out_dir = output_path.parent_path();
+    if (!out_dir.empty() && !std::filesystem::exists(out_dir)) {
+        std::error_code ec;
+        std::filesystem::create_directories(out_dir, ec);
+        if (ec) {
+            Logger::error_id("CANNOT_CREATE_OUTPUT_DIR", { {"dirname", out_dir.generic_string()} }); // <-- 修改
+            return 1;
+        }
+    }
+
+    if (!save_vox_buffer(output_path, output.vox_bytes)) {
+        Logger::error(Message::get("SAVE_VOX_FAIL"));
+        return 1;
+    }
+
+    std::filesystem::path xml_path = output_path;
+    xml_path.replace_extension(".xml");
+
+    // 生成XML文件
+    if (generate_xml_from_tree(xml_path.string(), output.xml_root)) {
+        Logger::info(Message::get("SAVE_XML_SUCCESS", { {"filename", xml_path.generic_string()} })); // <-- 修改
+    } else {
+        Logger::error(Message::get("CANNOT_GEN_XML"));
+    }
+    return 0;
+}
+
+// --- 新增：体素化会话，供命令行程序与动态库接口共用 ---
+struct VoxelizerSession::Impl {
+    CommandLineArgs args;
+    // 已解码纹理的磁盘缓存，由多个 polyvox 进程/会话共享
+    TextureCache texture_cache;
+    AssetCache cache;
+    PaletteSamples palette_samples; // 全局调色板的采样结果（sample_mesh 累积）
+    CancelFlag cancel_flag;
+
+    explicit Impl(const CommandLineArgs& session_args)
+        : args(session_args),
+          texture_cache(std::filesystem::u8path(session_args.texture_cache_dir),
+                        static_cast<uint64_t>(std::max(session_args.texture_cache_size_mb, 0)) * 1024 * 1024) {
+        if (texture_cache.enabled()) cache.texture_cache = &texture_cache;
+        cache.cancel = &cancel_flag;
+    }
+};
+
+VoxelizerSession::VoxelizerSession(const CommandLineArgs& args) : impl(std::make_unique<Impl>(args)) {}
+
+VoxelizerSession::~VoxelizerSession() = default;
+
+const CommandLineArgs& VoxelizerSession::args() const { return impl->args; }
+
+void VoxelizerSession::cancel() { impl->cancel_flag.cancel(); }
+
+int VoxelizerSession::voxelize_file(const SurfaceJob& job) {
+    return voxelize_surface(job, impl->args, impl->cache);
+}
+
+// 内存中的表面网格转换为模型；mesh_path 为纹理目录下的虚拟文件名：MTL按绝对路径或相对纹理目录解析，日志中也能区分各个表面
+static bool load_mesh_model(const SurfaceMesh& mesh, const std::filesystem::path& mesh_path, AssetCache& cache, ObjModel& obj_model) {
+    obj_model.mtl_filename = mesh.mtl_path;
+    if (!fill_model_from_mesh(mesh, obj_model)) {
+        Logger::error(Message::get("INVALID_MESH_FILE", { {"filename", mesh_path.generic_string()} }));
+        return false;
+    }
+    return finalize_loaded_model(mesh_path, obj_model, &cache);
+}
+
+bool VoxelizerSession::voxelize_mesh(const SurfaceMesh& mesh, const std::string& vox_name,
+                                     const std::string& group_pos, const std::string& group_rot,
+                                     std::vector<uint8_t>& vox_bytes, std::string& xml_text) {
+    std::filesystem::path mesh_path = std::filesystem::u8path(mesh.texture_dir) / std::filesystem::u8path(vox_name);
+    ObjModel obj_model;
+    if (!load_mesh_model(mesh, mesh_path, impl->cache, obj_model)) {
+        return false;
+    }
+
+    VoxelizeOutput output;
+    if (!voxelize_model(obj_model, mesh_path, mesh.texture_dir, "MOD/vox/" + vox_name,
+                        group_pos, group_rot, impl->args, impl->cache, output)) {
+        return false;
+    }
+    vox_bytes = std::move(output.vox_bytes);
+    xml_text = generate_xml_string(output.xml_root);
+    return true;
+}
+
+bool VoxelizerSession::sample_mesh(const SurfaceMesh& mesh, const std::string& vox_name) {
+    std::filesystem::path mesh_path = std::filesystem::u8path(mesh.texture_dir) / std::filesystem::u8path(vox_name);
+    ObjModel obj_model;
+    if (!load_mesh_model(mesh, mesh_path, impl->cache, obj_model)) {
+        return false;
+    }
+    VoxelizeOutput output;
+    return voxelize_model(obj_model, mesh_path, mesh.texture_dir, "MOD/vox/" + vox_name,
+                          "0.0 0.0 0.0", "0.0 0.0 0.0", impl->args, impl->cache, output, &impl->palette_samples);
+}
+
+bool VoxelizerSession::sample_file(const SurfaceJob& job) {
+    std::filesystem::path mesh_path(job.input_file);
+    ObjModel obj_model;
+    if (!load_surface_mesh(mesh_path, obj_model, &impl->cache)) {
+        return false;
+    }
+    VoxelizeOutput output;
+    return voxelize_model(obj_model, mesh_path, find_texture_directory(job.input_file, impl->args),
+                          "MOD/vox/" + mesh_path.stem().string() + ".vox", "0.0 0.0 0.0", "0.0 0.0 0.0",
+                          impl->args, impl->cache, output, &impl->palette_samples);
+}
+
+bool VoxelizerSession::save_palette(const std::string& palette_path) {
+    throw_if_cancelled(&impl->cancel_flag);
+    PaletteSamples& samples = impl->palette_samples;
+    size_t material_count = samples.samples.sampled_material_count();
+    if (material_count == 0) {
+        Logger::warn(Message::get("SAMPLE_POOL_EMPTY"));
+        return false;
+    }
+    if (material_count > MAX_PALETTE_MATERIALS) {
+        Logger::warn(Message::get("PALETTE_TOO_MANY_MATERIALS", { {"count", std::to_string(material_count)}, {"limit", std::to_string(MAX_PALETTE_MATERIALS)} }));
+        return false;
+    }
+    Logger::info(Message::get("PHASE_3_COLOR_QUANTIZATION"));
+    samples.samples.process_and_quantize(samples.profiles, samples.materials, impl->args);
+    return samples.samples.save_fixed(std::filesystem::u8path(palette_path));
+}
@@ -0,0 +1,69 @@
+#pragma once
+#include <cstdint>
+#include <memory>
+#include <string>
+#include <vector>
+#include "local/command_line.h"
+
+// 单个表面的体素化任务
+struct SurfaceJob {
+    std::string input_file;
+    std::string output_file;
+    std::string group_pos = "0.0 0.0 0.0"; // 写入XML根group节点的变换
+    std::string group_rot = "0.0 0.0 0.0";
+};
+
+// 内存中的表面网格，布局与 .pvm 文件一致；数组由调用方持有，只在调用期间读取
+struct SurfaceMesh {
+    const float* positions = nullptr;    // 顶点 [vertex_count*3]
+    uint32_t vertex_count = 0;
+    const float* uvs = nullptr;          // UV [uv_count*2]
+    uint32_t uv_count = 0;
+    const uint32_t* face_v = nullptr;    // 顶点索引 [face_count*3]
+    const uint32_t* face_vt = nullptr;   // UV索引 [face_count*3]，0xFFFFFFFF 表示没有UV
+    const uint16_t* face_mat = nullptr;  // 材质编号 [face_count]，0xFFFF 表示没有材质
+    uint32_t face_count = 0;
+    std::vector<std::string> material_names;
+    std::string mtl_path;     // MTL文件路径，为空表示没有材质库
+    std::string texture_dir;  // 纹理查找目录
+};
+
+// 体素化会话：持有参数以及在多个表面之间共享的MTL、材质分类和纹理缓存
+// 同一个会话同一时间只能在一个线程中使用，不同会话之间互不影响
+class VoxelizerSession {
+public:
+    explicit VoxelizerSession(const CommandLineArgs& args);
+    ~VoxelizerSession();
+    VoxelizerSession(const VoxelizerSession&) = delete;
+    VoxelizerSession& operator=(const VoxelizerSession&) = delete;
+
+    const CommandLineArgs& args() const;
+
+    // --- 新增：取消正在运行的体素化，可在任意线程中调用 ---
+    // 运行中的调用在下一行/瓦片/边分段开始前抛出 OperationCancelled，之后对该会话的调用也都会失败
+    void cancel();
+
+    // 读取表面网格文件（.obj/.pvm），写出 .vox 和 .xml，成功返回0
+    int voxelize_file(const SurfaceJob& job);
+
+    // 体素化内存中的表面网格，VOX文件内容与XML文本直接返回，不读写任何中间文件
+    // vox_name 为XML中引用的VOX文件名（不含目录）
+    bool voxelize_mesh(const SurfaceMesh& mesh, const std::string& vox_name,
+                       const std::string& group_pos, const std::string& group_rot,
+                       std::vector<uint8_t>& vox_bytes, std::string& xml_text);
+
+    // --- 新增：全局调色板 ---
+    // 对表面网格执行与体素化相同的采样，样本累积在会话中
+    bool sample_mesh(const SurfaceMesh& mesh, const std::string& vox_name);
+
+    // 读取表面网格文件（.obj/.pvm）并采样，与 sample_mesh 相同
+    bool sample_file(const SurfaceJob& job);
+
+    // 对累积的所有样本量化一次，写出全局调色板文件（--palette 读取的格式）
+    // 没有样本或材质数超过一个调色板的容量时返回 false
+    bool save_palette(const std::string& palette_path);
+
+private:
+    struct Impl;
+    std::unique_ptr<Impl> impl;
+};